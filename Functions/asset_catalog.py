@@ -0,0 +1,142 @@
+"""
+
+In-process catalog of the (Asset Code, Price Type) pairs in time_series
+
+The catalog holds min/max date and row count for every series and is
+loaded once with a single grouped query. Validation in `read_data`
+becomes a dict lookup instead of a SELECT DISTINCT over the whole
+table.
+
+The catalog is refreshed when the table level max date or row count
+changes. That check runs at most once every `REFRESH_INTERVAL` seconds,
+or straight away when an unknown series is requested.
+"""
+import threading
+
+import time
+
+from collections import namedtuple
+
+from typing import Tuple
+
+import pandas as pd
+
+from Functions.connection_pool import pooled_connection
+
+# Seconds between checks of the table max date / row count
+REFRESH_INTERVAL = 300
+
+CatalogEntry = namedtuple('CatalogEntry',
+                          ['min_date', 'max_date', 'row_count'])
+
+_catalog = {}
+_fingerprint = None
+_last_check = 0.0
+_lock = threading.Lock()
+
+_sql_catalog = ''' SELECT Asset_code, price_type,
+                   MIN(Date) min_date, MAX(Date) max_date,
+                   COUNT(*) row_count
+                   FROM time_series
+                   GROUP BY Asset_code, price_type '''
+
+_sql_fingerprint = ''' SELECT MAX(Date) max_date, COUNT(*) row_count
+                       FROM time_series '''
+
+
+def _read_fingerprint(conn) -> tuple:
+    df = pd.read_sql(_sql_fingerprint, conn)
+    return str(df['max_date'].values[0]), int(df['row_count'].values[0])
+
+
+def _load(conn) -> dict:
+    df = pd.read_sql(_sql_catalog, conn)
+    min_dates = pd.to_datetime(df['min_date'])
+    max_dates = pd.to_datetime(df['max_date'])
+
+    return {(code, price_type): CatalogEntry(min_date, max_date,
+                                             int(row_count))
+            for code, price_type, min_date, max_date, row_count in
+            zip(df['Asset_code'], df['price_type'], min_dates,
+                max_dates, df['row_count'])}
+
+
+def refresh_catalog(force: bool = False) -> bool:
+    """
+    :param force: reload even if the table fingerprint is unchanged
+    :return: True if the catalog was (re)loaded
+    """
+    global _catalog, _fingerprint, _last_check
+
+    with _lock:
+        with pooled_connection() as conn:
+            fingerprint = _read_fingerprint(conn)
+            _last_check = time.monotonic()
+
+            if not force and fingerprint == _fingerprint:
+                return False
+
+            _catalog = _load(conn)
+            _fingerprint = fingerprint
+
+    return True
+
+
+def lookup_asset(code: str, price_type: str) -> CatalogEntry:
+    """
+    :param code: Asset Code String
+    :param price_type: Price Type String
+    :return: CatalogEntry with min/max date and row count
+    """
+    if _fingerprint is None or \
+            time.monotonic() - _last_check > REFRESH_INTERVAL:
+        refresh_catalog()
+
+    entry = _catalog.get((code, price_type))
+
+    # Series may have been added since last refresh
+    if entry is None and refresh_catalog():
+        entry = _catalog.get((code, price_type))
+
+    if entry is None:
+        raise ValueError("code or Price Type does not exists in DB")
+
+    return entry
+
+
+def update_entry(code: str, price_type: str,
+                 data_frame: pd.DataFrame) -> CatalogEntry:
+    """
+    Re-sync one catalog entry from a freshly read (date sorted) frame.
+
+    :param code: Asset Code String
+    :param price_type: Price Type String
+    :param data_frame: Pandas DataFrame with full history
+    :return: CatalogEntry
+    """
+    entry = CatalogEntry(data_frame['Date'].iloc[0],
+                         data_frame['Date'].iloc[-1],
+                         data_frame.shape[0])
+    with _lock:
+        _catalog[(code, price_type)] = entry
+
+    return entry
+
+
+def frame_bounds(data_frame: pd.DataFrame) -> Tuple[pd.Timestamp,
+                                                    pd.Timestamp]:
+    """
+    Inception and Latest date of a frame returned by `read_data`. Uses
+    the catalog entry attached to the frame (also for date windows of
+    the series) while the frame still has the rows it was read with,
+    otherwise falls back to scanning the Date column.
+
+    :param data_frame: Pandas DataFrame
+    :return: (min_date, max_date)
+    """
+    entry = data_frame.attrs.get('catalog')
+    if entry is not None and \
+            data_frame.attrs.get('rows') == data_frame.shape[0]:
+        return entry.min_date, entry.max_date
+
+    return data_frame.Date.min(), data_frame.Date.max()
@@ -0,0 +1,201 @@
+"""
+
+Shared, bounded pool of database connections
+
+All readers (`read_data`) and the proxy writers check connections out
+of the pools below instead of calling `create_connection` /
+`odbc_engine` for every query.
+
+- 'engine' pool wraps `create_connection` (used with `pd.read_sql`
+    and `DataFrame.to_sql`)
+- 'odbc' pool wraps `odbc_engine` (used with cursors)
+
+Both come from Functions/db_backend.py, which picks SQL Server
+(db_connection) or the local SQLite database.
+
+Connections idle for longer than `HEALTH_CHECK_INTERVAL` seconds are
+pinged before being handed out again and replaced if the ping fails.
+`pool_stats` reports how many connections were opened vs reused.
+"""
+import threading
+
+import time
+
+from collections import deque
+
+from contextlib import contextmanager
+
+from typing import Callable, Union
+
+import pandas as pd
+
+from Functions.db_backend import create_connection, odbc_engine
+
+# Maximum connections (idle + checked out) held per pool
+POOL_SIZE = 4
+
+# Seconds to wait for a free connection before raising
+CHECKOUT_TIMEOUT = 30
+
+# Idle seconds after which a connection is pinged before reuse
+HEALTH_CHECK_INTERVAL = 60
+
+HEALTH_CHECK_SQL = 'SELECT 1 AS ok'
+
+
+def _ping(conn) -> bool:
+    """
+    :param conn: DBAPI connection or SQLAlchemy engine
+    :return: True if a trivial query succeeds
+    """
+    try:
+        if hasattr(conn, 'cursor'):
+            conn.cursor().execute(HEALTH_CHECK_SQL).fetchall()
+        else:
+            pd.read_sql(HEALTH_CHECK_SQL, conn)
+        return True
+    except (Exception,):
+        return False
+
+
+def _close(conn):
+    # Engines are disposed, DBAPI connections closed
+    try:
+        if hasattr(conn, 'dispose'):
+            conn.dispose()
+        elif hasattr(conn, 'close'):
+            conn.close()
+    except (Exception,):
+        pass
+
+
+class ConnectionPool:
+    """
+    Thread-safe bounded pool around a connection factory.
+    """
+
+    def __init__(self, factory: Callable, max_size: int = POOL_SIZE,
+                 timeout: Union[int, float] = CHECKOUT_TIMEOUT,
+                 health_check_interval: Union[int, float] =
+                 HEALTH_CHECK_INTERVAL):
+        self.factory = factory
+        self.max_size = max_size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self._idle = deque()
+        self._size = 0
+        self._cond = threading.Condition()
+        self.stats = {'opened': 0, 'reused': 0, 'discarded': 0}
+
+    def checkout(self):
+        """
+        :return: connection, reused from the idle list when possible
+        """
+        deadline = time.monotonic() + self.timeout
+        with self._cond:
+            while True:
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    # Reserve a slot, open outside the lock
+                    self._size += 1
+                    conn = last_used = None
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError('ERROR: No database connection '
+                                       'available in pool')
+                self._cond.wait(remaining)
+
+        if conn is not None:
+            stale = (time.monotonic() - last_used >
+                     self.health_check_interval)
+            if not stale or _ping(conn):
+                with self._cond:
+                    self.stats['reused'] += 1
+                return conn
+
+            # Failed health check, replace with a fresh connection
+            _close(conn)
+            with self._cond:
+                self.stats['discarded'] += 1
+
+        try:
+            conn = self.factory()
+        except (Exception,):
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+
+        with self._cond:
+            self.stats['opened'] += 1
+        return conn
+
+    def release(self, conn, discard: bool = False):
+        """
+        :param conn: connection obtained from `checkout`
+        :param discard: close the connection instead of reusing it
+        """
+        with self._cond:
+            if discard:
+                self._size -= 1
+                self.stats['discarded'] += 1
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+        if discard:
+            _close(conn)
+
+    @contextmanager
+    def connection(self):
+        conn = self.checkout()
+        try:
+            yield conn
+        except (Exception,):
+            # Connection state unknown after a failure, do not reuse
+            self.release(conn, discard=not _ping(conn))
+            raise
+        else:
+            self.release(conn)
+
+    def close_all(self):
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+            self._cond.notify_all()
+
+        for conn, _ in idle:
+            _close(conn)
+
+
+_POOLS = {'engine': ConnectionPool(lambda: create_connection()),
+          'odbc': ConnectionPool(lambda: odbc_engine())}
+
+
+def pooled_connection(kind: str = 'engine'):
+    """
+    :param kind: 'engine' (create_connection) or 'odbc' (odbc_engine)
+    :return: context manager yielding a pooled connection
+    """
+    if kind not in _POOLS:
+        raise ValueError('ERROR: Unknown connection pool ' + kind)
+
+    return _POOLS[kind].connection()
+
+
+def pool_stats() -> dict:
+    """
+    :return: opened/reused/discarded counters and size per pool
+    """
+    return {kind: dict(pool.stats, size=pool._size,
+                       idle=len(pool._idle))
+            for kind, pool in _POOLS.items()}
+
+
+def close_pools():
+    for pool in _POOLS.values():
+        pool.close_all()
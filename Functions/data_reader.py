@@ -1,41 +1,368 @@
+import os
+
+from collections import namedtuple
+
+from typing import Tuple, Union
+
+import numpy as np
+
 import pandas as pd
 
-from db_connection import create_connection
+from Functions.asset_catalog import lookup_asset, update_entry
+
+from Functions.connection_pool import pooled_connection
+
+from Functions.date_parser import resolve_window
+
+from Functions.local_mirror import mirror_entry, read_mirror
+
+from Functions.series_cache import get_series, get_window, \
+    peek_series, put_series, put_window, to_frame
+
+# Maximum (Asset Code, Price Type) pairs fetched per bulk query
+BULK_CHUNK_SIZE = 50
+
+# 'db' reads SQL Server, 'mirror' the local memory-mapped mirror
+READ_BACKENDS = ('db', 'mirror')
+_read_backend = os.environ.get('TS_READ_BACKEND', 'db')
+
+# Series of read_data_many: segment i of dates/prices is
+# [offsets[i], offsets[i + 1]) and belongs to pairs[i]
+SeriesGroup = namedtuple('SeriesGroup',
+                         ['pairs', 'dates', 'prices', 'offsets',
+                          'entries'])
+
+
+def _window_sql(code_column: str, price_type_column: str,
+                start: Union[pd.Timestamp, None],
+                end: Union[pd.Timestamp, None]) -> str:
+    # Window filter, lower bound includes the as-of row before start
+    window_sql = ''
+    if start is not None:
+        start = f"'{start:%Y-%m-%d}'"
+        window_sql += f''' and Date >= COALESCE(
+                            (SELECT MAX(t.Date) FROM time_series t
+                             WHERE t.Asset_code = {code_column}
+                             and t.price_type = {price_type_column}
+                             and t.Date <= {start}), {start})'''
+    if end is not None:
+        window_sql += f" and Date <= '{end:%Y-%m-%d}'"
+
+    return window_sql
+
+
+def _slice_window(dates: np.ndarray, start: Union[pd.Timestamp, None],
+                  end: Union[pd.Timestamp, None]) -> Tuple[int, int]:
+    # Positions of the window in sorted dates, including as-of row
+    lo = 0 if start is None else max(
+        np.searchsorted(dates, np.datetime64(start, 'ns'), 'right') - 1,
+        0)
+    hi = len(dates) if end is None else \
+        np.searchsorted(dates, np.datetime64(end, 'ns'), 'right')
+
+    return lo, hi
+
+
+def set_read_backend(backend: str):
+    """
+    :param backend: 'db' or 'mirror' (see Functions/local_mirror.py)
+    """
+    global _read_backend
+
+    if backend not in READ_BACKENDS:
+        raise ValueError('ERROR: Unknown read backend ' + backend)
+
+    _read_backend = backend
+
 
+def _read_mirror_frame(code: str, price_type: str,
+                       start: Union[pd.Timestamp, None],
+                       end: Union[pd.Timestamp, None]) -> pd.DataFrame:
+    # Raises ValueError if the series is not mirrored
+    dates, prices = read_mirror((code, price_type))
+    lo, hi = _slice_window(dates, start, end)
 
-def read_data(code: str, price_type: str) -> pd.DataFrame:
+    data_frame = pd.DataFrame({'Date': dates[lo:hi],
+                               'Price': prices[lo:hi]}, copy=False)
+
+    # Inception / Latest for parse_dates
+    data_frame.attrs['catalog'] = mirror_entry(dates)
+    data_frame.attrs['rows'] = data_frame.shape[0]
+
+    return data_frame
+
+
+def read_data(code: str, price_type: str,
+              start: Union[str, pd.Timestamp, None] = None,
+              end: Union[str, pd.Timestamp, None] = None) -> pd.DataFrame:
     """
     :param code: Asset Code String
     :param price_type: Price Type String
+    :param start: optional window start, the last row on or before it
+                  is included
+    :param end: optional window end (inclusive)
     :return: Pandas DataFrame
     """
+    start = None if start is None else pd.Timestamp(start)
+    end = None if end is None else pd.Timestamp(end)
+
+    if _read_backend == 'mirror':
+        return _read_mirror_frame(code, price_type, start, end)
+
+    # Check if passed code and PriceType is available in DB. Raises
+    # ValueError if not available
+    entry = lookup_asset(code, price_type)
+
+    # Serve from cache while the series version is unchanged, windows
+    # also from a cached window covering them
+    version = (entry.max_date, entry.row_count)
+    cached = get_series(code, price_type, version)
+    full = cached is not None
+    window = start is not None or end is not None
+    if cached is None and window:
+        cached = get_window(code, price_type, version, start, end)
+
+    if cached is None:
+        # Check out a pooled connection with DB
+        with pooled_connection() as conn:
+
+            # Read data for specific code and Price. Return resulting
+            # dataframe
+            read_data_sql = f''' SELECT Date, Price
+                                FROM time_series
+                                WHERE Asset_code = '{code}'
+                                and price_type = '{price_type}'
+                                {_window_sql(f"'{code}'",
+                                             f"'{price_type}'",
+                                             start, end)}
+                                ORDER BY Date ASC  '''
+            data_frame = pd.read_sql(read_data_sql, conn)
+            data_frame['Date'] = pd.to_datetime(data_frame['Date'],
+                                                format='%Y-%m-%d')
+
+        if window:
+            # Window cached on its own, later windows inside it are
+            # sliced from it
+            cached = put_window(code, price_type, version, start, end,
+                                data_frame)
+        else:
+            # Catalog entry is stale if rows were added since last
+            # refresh
+            if entry.row_count != data_frame.shape[0] and \
+                    data_frame.shape[0] > 0:
+                entry = update_entry(code, price_type, data_frame)
+
+            cached = put_series(code, price_type,
+                                (entry.max_date, entry.row_count),
+                                data_frame)
+            full = True
+
+    lo, hi = _slice_window(cached.dates, start, end)
+    data_frame = to_frame(cached, lo, hi)
+
+    # Inception / Latest for parse_dates
+    data_frame.attrs['catalog'] = entry
+    data_frame.attrs['rows'] = data_frame.shape[0]
+
+    # Cached series (and row offset) for indexes kept with the cache
+    if full:
+        data_frame.attrs['series'] = (code, price_type, cached.version,
+                                      lo)
+
+    return data_frame
+
 
-    # Create Connection with DB
-    conn = create_connection()
+def _asof_date(code: str, price_type: str, version: tuple,
+               date: pd.Timestamp) -> pd.Timestamp:
+    # Last available Date on or before date, from a cached window
+    # holding it or a single indexed lookup
+    cached = get_window(code, price_type, version, date, date)
+    if cached is not None:
+        lo, hi = _slice_window(cached.dates, date, date)
+        return pd.Timestamp(cached.dates[lo]) if lo < hi and \
+            cached.dates[lo] <= np.datetime64(date, 'ns') else pd.NaT
 
-    # Get available codes and PriceType from db
-    sql_distinct_code = ''' SELECT DISTINCT(CONCAT(Asset_code, ' - ',
-    price_type)) [code] FROM time_series'''
+    with pooled_connection() as conn:
+        asof_sql = f''' SELECT MAX(Date) max_date
+                       FROM time_series
+                       WHERE Asset_code = '{code}'
+                       and price_type = '{price_type}'
+                       and Date <= '{date:%Y-%m-%d}' '''
+        asof_date = pd.read_sql(asof_sql, conn)['max_date'].values[0]
 
-    df_distinct_code = pd.read_sql(sql_distinct_code, conn)
+    return pd.Timestamp(asof_date) if asof_date is not None else pd.NaT
 
-    # Check if passed code and PriceType is available in DB
-    if code + ' - ' + price_type in df_distinct_code.code.values:
-        # Read data for specific code and Price. Return resulting
-        # dataframe
 
-        read_data_sql = f''' SELECT Date, Price
+def read_data_window(code: str, price_type: str, period_start: list,
+                     period_end: list,
+                     to_latest: bool = False) -> pd.DataFrame:
+    """
+    Read only the rows parse_dates needs for the passed periods.
+
+    :param code: Asset Code String
+    :param price_type: Price Type String
+    :param period_start: list of Period Start
+    :param period_end: list of Period End
+    :param to_latest: keep all data after the window start (e.g.
+                      drawdown recovery is not bound by Period End)
+    :return: Pandas DataFrame
+    """
+    # Mirrored series are memory-mapped, the full history is free
+    if _read_backend == 'mirror':
+        return read_data(code, price_type)
+
+    entry = lookup_asset(code, price_type)
+
+    # A cached full history is already a zero copy read, otherwise
+    # only the window (and its as-of row) is fetched
+    version = (entry.max_date, entry.row_count)
+    if peek_series(code, price_type, version):
+        return read_data(code, price_type)
+
+    start, end = resolve_window(
+        period_start, period_end, entry.min_date, entry.max_date,
+        lambda date: _asof_date(code, price_type, version, date))
+
+    return read_data(code, price_type, start,
+                     None if to_latest else end)
+
+
+def asset_pairs(asset_code: list, price_type: Union[str, list]) -> list:
+    """
+    :param asset_code: list of Asset Code str
+    :param price_type: Price Type str or list (one per Asset Code)
+    :return: list of (Asset Code, Price Type)
+    """
+    if isinstance(price_type, str):
+        price_type = [price_type] * len(asset_code)
+
+    if len(price_type) != len(asset_code):
+        raise ValueError('ERROR: Ensure all passed list are '
+                         'of same length!')
+
+    return list(zip(asset_code, price_type))
+
+
+def read_data_many(pairs: list, start: Union[str, None] = None,
+                   end: Union[str, None] = None) -> SeriesGroup:
+    """
+    :param pairs: list of (Asset Code, Price Type)
+    :param start: optional window start, the last row on or before it
+                  is included
+    :param end: optional window end (inclusive)
+    :return: SeriesGroup
+    """
+    start = None if start is None else pd.Timestamp(start)
+    end = None if end is None else pd.Timestamp(end)
+
+    series = {}
+    entries = {}
+    if _read_backend == 'mirror':
+        # Mirrored series are sliced like cached ones, no DB access
+        for pair in pairs:
+            series[pair] = read_mirror(pair)
+            entries[pair] = mirror_entry(series[pair][0])
+    else:
+        # Validate all pairs first. Raises ValueError if not available
+        entries = {pair: lookup_asset(*pair) for pair in pairs}
+
+        for pair, entry in entries.items():
+            version = (entry.max_date, entry.row_count)
+            cached = get_series(pair[0], pair[1], version)
+            if cached is None and (start is not None or end is not None):
+                cached = get_window(pair[0], pair[1], version, start,
+                                    end)
+            if cached is not None:
+                series[pair] = cached.dates, cached.prices
+
+    # Full history is fetched unless a window is passed, both cached
+    window_sql = _window_sql('time_series.Asset_code',
+                             'time_series.price_type', start, end)
+
+    missing = [pair for pair in entries if pair not in series]
+    for chunk_start in range(0, len(missing), BULK_CHUNK_SIZE):
+        chunk = missing[chunk_start:chunk_start + BULK_CHUNK_SIZE]
+        pairs_sql = ' or '.join(
+            f"(Asset_code = '{code}' and price_type = '{price_type}')"
+            for code, price_type in chunk)
+
+        read_data_sql = f''' SELECT Asset_code, price_type, Date, Price
                             FROM time_series
-                            WHERE Asset_code = '{code}'
-                            and price_type = '{price_type}'
-                            ORDER BY Date ASC  '''
-        data_frame = pd.read_sql(read_data_sql, conn)
+                            WHERE ({pairs_sql}){window_sql}
+                            ORDER BY Asset_code, price_type, Date ASC '''
+
+        with pooled_connection() as conn:
+            data_frame = pd.read_sql(read_data_sql, conn)
         data_frame['Date'] = pd.to_datetime(data_frame['Date'],
                                             format='%Y-%m-%d')
-        # return df
 
-    # Raise error if not available
-    else:
-        raise ValueError("code or Price Type does not exists in DB")
+        groups = data_frame.groupby(['Asset_code', 'price_type'],
+                                    sort=False).indices
+        for pair in chunk:
+            pair_df = data_frame.iloc[groups.get(pair, [])]
+            entry = entries[pair]
+            if window_sql:
+                cached = put_window(pair[0], pair[1],
+                                    (entry.max_date, entry.row_count),
+                                    start, end, pair_df)
+                series[pair] = cached.dates, cached.prices
+                continue
+
+            if entry.row_count != pair_df.shape[0] and \
+                    pair_df.shape[0] > 0:
+                entry = entries[pair] = update_entry(pair[0], pair[1],
+                                                     pair_df)
+            cached = put_series(pair[0], pair[1],
+                                (entry.max_date, entry.row_count),
+                                pair_df)
+            series[pair] = cached.dates, cached.prices
+
+    # Pack into shared arrays, slicing cached series to the window
+    dates_list = []
+    prices_list = []
+    offsets = np.zeros(len(pairs) + 1, dtype=np.int64)
+    for i, pair in enumerate(pairs):
+        dates, prices = series[pair]
+        lo, hi = _slice_window(dates, start, end)
+        dates_list.append(dates[lo:hi])
+        prices_list.append(prices[lo:hi])
+        offsets[i + 1] = offsets[i] + hi - lo
+
+    return SeriesGroup(list(pairs),
+                       np.concatenate(dates_list) if dates_list else
+                       np.empty(0, dtype='datetime64[ns]'),
+                       np.concatenate(prices_list) if prices_list else
+                       np.empty(0, dtype=np.float64),
+                       offsets, [entries[pair] for pair in pairs])
+
+
+def group_frame(group: SeriesGroup, i: int) -> pd.DataFrame:
+    """
+    :param group: SeriesGroup from read_data_many
+    :param i: position of the pair in group.pairs
+    :return: Pandas DataFrame as returned by read_data
+    """
+    lo, hi = group.offsets[i], group.offsets[i + 1]
+    data_frame = pd.DataFrame({'Date': group.dates[lo:hi],
+                               'Price': group.prices[lo:hi]}, copy=False)
+
+    # Inception / Latest for parse_dates
+    data_frame.attrs['catalog'] = group.entries[i]
+    data_frame.attrs['rows'] = data_frame.shape[0]
 
     return data_frame
+
+
+def read_frames_many(asset_code: list,
+                     price_type: Union[str, list]) -> dict:
+    """
+    :param asset_code: list of Asset Code str
+    :param price_type: Price Type str or list (one per Asset Code)
+    :return: dict of 'Asset Code - Price Type' to (code, price type,
+             Pandas DataFrame)
+    """
+    group = read_data_many(asset_pairs(asset_code, price_type))
+
+    return {code + ' - ' + price_type: (code, price_type,
+                                        group_frame(group, i))
+            for i, (code, price_type) in enumerate(group.pairs)}
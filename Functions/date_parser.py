@@ -1,97 +1,439 @@
-import re
+from collections import namedtuple
 
-from typing import Union
+from typing import Callable, Tuple, Union
+
+import numpy as np
 
 import pandas as pd
 
 from dateutil.parser import parse
 
-from dateutil.relativedelta import relativedelta
+from Functions.asset_catalog import frame_bounds
 
+from Functions.tenor import Tenor, parse_tenor, tenor_delta, tenor_shift
 
-def parse_dates(period_start: str, period_end: Union[str, None],
-                data_frame: pd.DataFrame) -> Union[pd.Timestamp,
-                                                   str]:
+
+ResolvedDates = namedtuple('ResolvedDates',
+                           ['start_date', 'end_date', 'lo', 'hi'])
+
+BatchDates = namedtuple('BatchDates',
+                        ['start_date', 'end_date', 'lo', 'hi', 'error'])
+
+NAT = np.iinfo(np.int64).min
+
+DAY_NS = 86400 * 10 ** 9
+
+
+def date_index(data_frame: pd.DataFrame) -> np.ndarray:
+    """
+    :param data_frame: Pandas DataFrame sorted by Date
+    :return: int64 (ns) view of the Date column for searchsorted
+    """
+    index = data_frame['Date'].to_numpy(dtype='datetime64[ns]') \
+        .view(np.int64)
+
+    # Frames from read_data are ordered by Date, others are checked
+    if data_frame.attrs.get('rows') != data_frame.shape[0] and \
+            np.any(index[1:] < index[:-1]):
+        raise ValueError('ERROR: Date column is not sorted')
+
+    return index
+
+
+def _asof(index: np.ndarray, date: pd.Timestamp) -> int:
+    # Position of the last Date on or before date, -1 if none
+    if pd.isnull(date):
+        return -1
+
+    return int(np.searchsorted(index, pd.Timestamp(date).value,
+                               side='right')) - 1
+
+
+def resolve_dates(period_start: str, period_end: Union[str, None],
+                  data_frame: pd.DataFrame,
+                  index: Union[np.ndarray, None] = None) -> ResolvedDates:
     """
+    Resolve a period pair with binary searches on the sorted Date
+    index. Rows lo:hi of the frame are the rows from Start to End date.
 
     :param period_start: Date String
     :param period_end: Date String
-    :param data_frame: Pandas DataFrame
-    :return: Pandas Timestamp
+    :param data_frame: Pandas DataFrame sorted by Date
+    :param index: `date_index` of the frame, built when not passed
+    :return: ResolvedDates, dates are error strings and positions None
+             when the pair cannot be resolved
     """
 
-    # allowed offsets D: Daily, M: Monthly, W: Weekly, Y: Yearly
-    offset_chars = set('DWQMY')
+    index = date_index(data_frame) if index is None else index
+
+    # Inception and Latest dates, from the asset catalog when available
+    min_date, max_date = frame_bounds(data_frame)
 
     # Parse and deal with Period End Date as Period Start
     # depends on Period End
     try:
         if period_end == 'Latest':
-            end_date = data_frame.Date.max()
-        elif any((c in offset_chars) for c in period_end):
-            end_date = data_frame.Date.max()
-            value = int(re.findall(r'\d+', period_end)[0])
-            if 'D' in period_end:
-                end_date = end_date - relativedelta(days=value)
-            elif 'W' in period_end:
-                end_date = end_date - relativedelta(weeks=value)
-            elif 'M' in period_end:
-                end_date = end_date - relativedelta(months=value)
-            elif 'Q' in period_end:
-                end_date = end_date - relativedelta(months=3*value)
-            else:
-                end_date = end_date - relativedelta(years=value)
+            end_date = max_date
         else:
-            end_date = pd.Timestamp(parse(period_end, fuzzy=False))
+            end_date = _period_date(period_end, max_date)
 
     except (Exception,):
-        start_date = 'ERROR: Period End date is not correct'
-        end_date = 'ERROR: Period End date is not correct'
-        return start_date, end_date
+        error = 'ERROR: Period End date is not correct'
+        return ResolvedDates(error, error, None, None)
 
     # check if price on end date exists else use last available price
-    if end_date not in data_frame.Date.values:
-        if max(data_frame.Date.values) < end_date:
-            start_date = 'ERROR: No data found on or after end date'
-            end_date = 'ERROR: No data found on or after end date'
-            return start_date, end_date
+    end_pos = _asof(index, end_date)
+    if end_pos < 0 or index[end_pos] != end_date.value:
+        if max_date < end_date:
+            error = 'ERROR: No data found on or after end date'
+            return ResolvedDates(error, error, None, None)
         else:
-            end_date = data_frame.loc[data_frame['Date'] <= end_date,
-                                      'Date'].max()
+            end_date = pd.Timestamp(index[end_pos]) if end_pos >= 0 \
+                else pd.NaT
 
     # Parse and deal with Period Start Date
     try:
         if period_start == 'Inception':
-            start_date = data_frame.Date.min()
-        elif any((c in offset_chars) for c in period_start):
-            start_date = end_date
-            value = int(re.findall(r'\d+', period_start)[0])
-            if 'D' in period_start:
-                start_date = start_date - relativedelta(days=value)
-            elif 'W' in period_start:
-                start_date = start_date - relativedelta(weeks=value)
-            elif 'M' in period_start:
-                start_date = start_date - relativedelta(months=value)
-            elif 'Q' in period_start:
-                start_date = start_date - relativedelta(months=3*value)
-            else:
-                start_date = start_date - relativedelta(years=value)
+            start_date = min_date
         else:
-            start_date = pd.Timestamp(parse(period_start, fuzzy=False))
+            start_date = _period_date(period_start, end_date)
 
     except (Exception,):
-        start_date = 'ERROR: Period Start date is not correct'
-        end_date = 'ERROR: Period Start date is not correct'
-        return start_date, end_date
+        error = 'ERROR: Period Start date is not correct'
+        return ResolvedDates(error, error, None, None)
 
     # check if price on start date exists else use previous available
     # price
-    if start_date not in data_frame.Date.values:
-        start_date = data_frame.loc[data_frame['Date']
-                                    <= start_date, 'Date'].max()
+    start_pos = _asof(index, start_date)
+    if start_pos < 0:
+        start_date = pd.NaT
+    elif index[start_pos] != start_date.value:
+        start_date = pd.Timestamp(index[start_pos])
 
     if start_date >= end_date:
-        start_date = 'ERROR: Period Start date is greater than End date'
-        end_date = 'ERROR: Period Start date is greater than End date'
+        error = 'ERROR: Period Start date is greater than End date'
+        return ResolvedDates(error, error, None, None)
+
+    # No rows match a missing Start or End date
+    if pd.isnull(start_date) or pd.isnull(end_date):
+        return ResolvedDates(start_date, end_date, 0, 0)
+
+    # First row of the start date (duplicates) to last row of end date
+    lo = int(np.searchsorted(index, start_date.value, side='left'))
+
+    return ResolvedDates(start_date, end_date, lo, end_pos + 1)
+
+
+def parse_dates(period_start: str, period_end: Union[str, None],
+                data_frame: pd.DataFrame) -> Union[pd.Timestamp,
+                                                   str]:
+    """
+
+    :param period_start: Date String
+    :param period_end: Date String
+    :param data_frame: Pandas DataFrame
+    :return: Pandas Timestamp
+    """
+    resolved = resolve_dates(period_start, period_end, data_frame)
+
+    return resolved.start_date, resolved.end_date
+
+
+def shift_date(date: pd.Timestamp,
+               offset: Union[str, Tenor]) -> pd.Timestamp:
+    """
+    :param date: Pandas Timestamp
+    :param offset: tenor string D/W/M/Q/Y e.g. '3M' or Tenor
+    :return: date moved back by the offset
+    """
+    tenor = parse_tenor(offset) if isinstance(offset, str) else offset
+    if tenor is None:
+        raise ValueError('ERROR: Offset is not a tenor ' + offset)
+
+    return date - tenor_delta(tenor)
+
+
+def _period_date(spec: str, base: pd.Timestamp) -> pd.Timestamp:
+    # Tenors are offsets back from base, anything else an exact date
+    tenor = parse_tenor(spec)
+    if tenor is None:
+        return pd.Timestamp(parse(spec, fuzzy=False))
+
+    return shift_date(base, tenor)
+
+
+def resolve_window(period_start: list, period_end: list,
+                   min_date: pd.Timestamp, max_date: pd.Timestamp,
+                   asof: Callable) -> Tuple[Union[pd.Timestamp, None],
+                                            Union[pd.Timestamp, None]]:
+    """
+    Smallest Date window parse_dates needs for all period pairs,
+    resolved against the catalog min/max date without reading prices.
+    The window start is a calendar date, the reader must also return
+    the last row on or before it (as-of row).
+
+    :param period_start: list of Period Start
+    :param period_end: list of Period End
+    :param min_date: Inception date of the series
+    :param max_date: Latest date of the series
+    :param asof: function returning the last available Date on or
+                 before a given date
+    :return: (start, end), None where no bound is required
+    """
+
+    starts = []
+    ends = []
+    for period_start_val, period_end_val in zip(period_start, period_end):
+        period_end_val = 'Latest' if period_end_val is None \
+            else period_end_val
+
+        # Pairs which fail to parse return an error without any data
+        try:
+            if period_end_val == 'Latest':
+                end_date = max_date
+            else:
+                end_date = _period_date(period_end_val, max_date)
+
+            if period_start_val is None:
+                continue
+            elif period_start_val == 'Inception':
+                start_date = min_date
+            elif parse_tenor(period_start_val) is not None:
+                # Offset applies to the as-of End date
+                asof_end = max_date if end_date == max_date \
+                    else asof(end_date)
+                if pd.isnull(asof_end):
+                    continue
+                start_date = shift_date(asof_end, period_start_val)
+            else:
+                start_date = pd.Timestamp(parse(period_start_val,
+                                                fuzzy=False))
+
+        except (Exception,):
+            continue
+
+        starts.append(min(start_date, end_date))
+        ends.append(min(end_date, max_date))
+
+    if not starts:
+        return None, None
+
+    start = min(starts)
+    end = max(ends)
+
+    return (None if start <= min_date else start,
+            None if end >= max_date else end)
+
+
+def _parse_spec(spec: str, anchor: str) -> tuple:
+    """
+    :param spec: Period Start / End string
+    :param anchor: 'Inception' or 'Latest'
+    :return: ('anchor', None), ('offset', (months, days)) or
+             ('date', ns), raises if the spec does not parse
+    """
+    if spec == anchor:
+        return 'anchor', None
+
+    tenor = parse_tenor(spec)
+    if tenor is None:
+        return 'date', pd.Timestamp(parse(spec, fuzzy=False)).value
+
+    return 'offset', tenor_shift(tenor)
+
+
+def _parse_specs(specs: list, anchor: str) -> tuple:
+    # Each distinct spec is parsed once
+    n = len(specs)
+    kind = np.zeros(n, dtype=np.int8)
+    value = np.full(n, NAT, dtype=np.int64)
+    months = np.zeros(n, dtype=np.int64)
+    days = np.zeros(n, dtype=np.int64)
+    ok = np.ones(n, dtype=bool)
+
+    kinds = {'anchor': 0, 'offset': 1, 'date': 2}
+    memo = {}
+    for i, spec in enumerate(specs):
+        key = (type(spec), spec) if isinstance(spec, str) else i
+        if key not in memo:
+            try:
+                memo[key] = _parse_spec(spec, anchor)
+            except (Exception,):
+                memo[key] = None
+
+        parsed = memo[key]
+        if parsed is None:
+            ok[i] = False
+            continue
+
+        kind[i] = kinds[parsed[0]]
+        if parsed[0] == 'offset':
+            months[i], days[i] = parsed[1]
+        elif parsed[0] == 'date':
+            value[i] = parsed[1]
+
+    return kind, value, months, days, ok
+
+
+def shift_dates(dates: np.ndarray, months: np.ndarray,
+                days: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Vectorised `shift_date`, months are moved back with the day
+    clipped to the month end like relativedelta.
+
+    :param dates: int64 (ns) dates
+    :param months: months to move back
+    :param days: days to move back
+    :return: (shifted int64 (ns) dates, mask of in bound results)
+    """
+    dates = dates.view('datetime64[ns]')
+    day = dates.astype('datetime64[D]')
+    time_of_day = (dates - day).astype(np.int64)
+    month = day.astype('datetime64[M]')
+    day_of_month = (day - month).astype(np.int64)
+
+    month = month - months.astype('timedelta64[M]')
+    month_days = ((month + 1).astype('datetime64[D]') -
+                  month.astype('datetime64[D]')).astype(np.int64)
+    day = month.astype('datetime64[D]') + \
+        np.minimum(day_of_month, month_days - 1) - days
+
+    # Out of the nanosecond Timestamp range, as relativedelta raises
+    lo_day, hi_day = pd.Timestamp.min.value // DAY_NS, \
+        pd.Timestamp.max.value // DAY_NS
+    day = day.astype(np.int64)
+    ok = (day >= lo_day) & (day <= hi_day)
+    shifted = np.clip(day, lo_day, hi_day) * DAY_NS + time_of_day
+    ok &= (shifted >= pd.Timestamp.min.value) & \
+        (shifted <= pd.Timestamp.max.value)
+
+    return np.where(ok, shifted, NAT), ok
+
+
+def parse_dates_batch(period_start: list, period_end: list,
+                      dates: np.ndarray,
+                      bounds: Union[tuple, None] = None) -> BatchDates:
+    """
+    `resolve_dates` for a whole list of period pairs at once. Distinct
+    specs are parsed once, offsets are applied with datetime64 month /
+    day arithmetic and all as-of lookups are one searchsorted.
+
+    :param period_start: list of Period Start
+    :param period_end: list of Period End
+    :param dates: sorted Date values (datetime64 or `date_index`)
+    :param bounds: (min_date, max_date), defaults to first / last date
+    :return: BatchDates of arrays, start/end dates as datetime64[ns]
+             (NaT where missing), rows lo:hi, and error strings (None
+             where the pair resolved)
+    """
+    index = np.asarray(dates)
+    if index.dtype != np.int64:
+        index = index.astype('datetime64[ns]', copy=False).view(np.int64)
+
+    if bounds is None:
+        bounds = (index[0], index[-1])
+    min_ns, max_ns = (pd.Timestamp(b).value for b in bounds)
+
+    n = len(period_start)
+    error = np.full(n, None, dtype=object)
+
+    def _fail(mask, message):
+        mask = mask & (error == None)  # noqa: E711
+        error[mask] = message
+        return mask
+
+    def _asof_many(values):
+        pos = np.searchsorted(index, values, side='right') - 1
+        found = (pos >= 0) & (values != NAT)
+        asof = np.where(found, index[np.maximum(pos, 0)], NAT) \
+            if index.size else np.full(len(values), NAT)
+        return pos, found, asof
+
+    # Parse and deal with Period End Date
+    kind, end_ns, months, days, ok = _parse_specs(period_end, 'Latest')
+    end_ns[kind == 0] = max_ns
+    offset = ok & (kind == 1)
+    shifted, in_bounds = shift_dates(np.full(n, max_ns), months, days)
+    end_ns = np.where(offset, shifted, end_ns)
+    _fail(~ok | (offset & ~in_bounds),
+          'ERROR: Period End date is not correct')
+
+    # check if price on end date exists else use last available price
+    pos, found, asof = _asof_many(end_ns)
+    exact = found & (asof == end_ns)
+    _fail(~exact & (end_ns > max_ns),
+          'ERROR: No data found on or after end date')
+    end_ns = np.where(exact, end_ns, asof)
+
+    # Parse and deal with Period Start Date, offsets from the End date
+    kind, start_ns, months, days, ok = _parse_specs(period_start,
+                                                    'Inception')
+    start_ns[kind == 0] = min_ns
+    offset = ok & (kind == 1)
+    shifted, in_bounds = shift_dates(end_ns, months, days)
+    start_ns = np.where(offset, shifted, start_ns)
+    _fail(~ok | (offset & (~in_bounds | (end_ns == NAT))),
+          'ERROR: Period Start date is not correct')
+
+    # check if price on start date exists else use previous available
+    # price
+    _, _, start_ns = _asof_many(start_ns)
+
+    valid = (start_ns != NAT) & (end_ns != NAT)
+    _fail(valid & (start_ns >= end_ns),
+          'ERROR: Period Start date is greater than End date')
+
+    # Rows of each window, empty for errors and missing dates
+    valid &= error == None  # noqa: E711
+    lo = np.where(valid, np.searchsorted(index, start_ns, side='left'), 0)
+    hi = np.where(valid, np.searchsorted(index, end_ns, side='right'), 0)
+
+    failed = error != None  # noqa: E711
+    start_ns[failed] = NAT
+    end_ns[failed] = NAT
+
+    return BatchDates(start_ns.view('datetime64[ns]'),
+                      end_ns.view('datetime64[ns]'), lo, hi, error)
+
+
+def batch_pair(batch: BatchDates, i: int) -> ResolvedDates:
+    """
+    :param batch: BatchDates from `parse_dates_batch`
+    :param i: position of the period pair
+    :return: ResolvedDates as returned by `resolve_dates`
+    """
+    if batch.error[i] is not None:
+        return ResolvedDates(batch.error[i], batch.error[i], None, None)
+
+    return ResolvedDates(pd.Timestamp(batch.start_date[i]),
+                         pd.Timestamp(batch.end_date[i]),
+                         int(batch.lo[i]), int(batch.hi[i]))
+
+
+def resolve_batch(period_start: list, period_end: list,
+                  data_frame: pd.DataFrame) -> BatchDates:
+    """
+    :param period_start: list of Period Start
+    :param period_end: list of Period End, None defaults to Latest
+    :param data_frame: Pandas DataFrame sorted by Date
+    :return: BatchDates of the frame, see `parse_dates_batch`
+    """
+    period_end = ['Latest' if period_end_val is None else period_end_val
+                  for period_end_val in period_end]
+
+    return parse_dates_batch(period_start, period_end,
+                             date_index(data_frame),
+                             frame_bounds(data_frame))
+
+
+def resolve_dates_many(period_start: list, period_end: list,
+                       data_frame: pd.DataFrame) -> list:
+    """
+    :param period_start: list of Period Start
+    :param period_end: list of Period End, None defaults to Latest
+    :param data_frame: Pandas DataFrame sorted by Date
+    :return: list of ResolvedDates, one per period pair
+    """
+    batch = resolve_batch(period_start, period_end, data_frame)
 
-    return start_date, end_date
+    return [batch_pair(batch, i) for i in range(len(period_start))]
@@ -0,0 +1,235 @@
+"""
+
+Pluggable database backends behind create_connection / odbc_engine
+
+- 'mssql' (default) delegates to the deployment's `db_connection`
+    module (SQL Server through pyodbc)
+- 'sqlite' uses a local SQLite file seeded from Data/, so the whole
+    pipeline can run and be benchmarked off-network
+
+The backend is picked with the TS_DB_BACKEND environment variable.
+Further backends can be added with `register_backend`.
+
+Build the SQLite database with
+
+    python -m Functions.db_backend [path]
+
+Seeding:
+
+- time_series: Data/time_series.xlsx (Asset Time Series sheet, as in
+    clean_data.py) plus the level 1 series of Data/Proxy_Level_1.csv
+- time_series_proxy_220122: Data/Proxy_Level_1.csv,
+    Data/Proxy_Level_2.csv and the C1-C5 case files
+- dependency_graph: derived from the proxy series, every series at
+    level 1 and 2 is sourced from itself (Source_Type / Source_Price
+    NULL)
+"""
+import os
+
+import sqlite3
+
+import sys
+
+from datetime import datetime
+
+from typing import Callable
+
+import pandas as pd
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(
+    os.path.abspath(__file__))), 'Data')
+
+SQLITE_PATH = os.environ.get('TS_SQLITE_PATH',
+                             os.path.join(DATA_DIR, 'time_series.sqlite'))
+
+RAW_FILE = 'time_series.xlsx'
+
+PROXY_FILES = ['Proxy_Level_1.csv', 'Proxy_Level_2.csv',
+               'C1_Raw+ExtendGTRFromPR.csv',
+               'C2_Raw+ExtendNTRFromPR+GTR.csv',
+               'C3_NTRFromPR+GTR.csv', 'C4_NTRFromPR+GTR.csv',
+               'C5_NTRFromPR+GTR.csv']
+
+_schema_sql = [
+    ''' CREATE TABLE IF NOT EXISTS time_series (
+            Asset_code TEXT NOT NULL,
+            price_type TEXT NOT NULL,
+            Date DATE NOT NULL,
+            Price REAL) ''',
+    ''' CREATE INDEX IF NOT EXISTS ix_time_series
+            ON time_series (Asset_code, price_type, Date) ''',
+    ''' CREATE TABLE IF NOT EXISTS time_series_proxy_220122 (
+            Asset_Code TEXT NOT NULL,
+            Price_Type TEXT NOT NULL,
+            Date DATE NOT NULL,
+            Price REAL,
+            Proxy_Level INTEGER,
+            Proxy_Name TEXT) ''',
+    ''' CREATE INDEX IF NOT EXISTS ix_time_series_proxy_220122
+            ON time_series_proxy_220122
+            (Asset_Code, Price_Type, Proxy_Level, Date) ''',
+    ''' CREATE TABLE IF NOT EXISTS dependency_graph (
+            Asset_Type TEXT NOT NULL,
+            Price_Type TEXT NOT NULL,
+            Source_Type TEXT,
+            Source_Price TEXT,
+            Proxy_Level INTEGER) ''',
+]
+
+# DATE columns come back as datetime like they do from SQL Server
+sqlite3.register_converter(
+    'DATE', lambda value: datetime.strptime(value[:10].decode(),
+                                            '%Y-%m-%d'))
+
+
+def _sqlite_connection() -> sqlite3.Connection:
+    # Shared across pool threads, access is serialised by checkout
+    return sqlite3.connect(SQLITE_PATH, check_same_thread=False,
+                           detect_types=sqlite3.PARSE_DECLTYPES)
+
+
+def _mssql_connection():
+    from db_connection import create_connection
+    return create_connection()
+
+
+def _mssql_odbc():
+    from db_connection import odbc_engine
+    return odbc_engine()
+
+
+_backends = {'mssql': (_mssql_connection, _mssql_odbc),
+             'sqlite': (_sqlite_connection, _sqlite_connection)}
+
+
+def register_backend(name: str, connection_factory: Callable,
+                     odbc_factory: Callable):
+    """
+    :param name: backend name used in TS_DB_BACKEND
+    :param connection_factory: returns a connection usable with
+                               pd.read_sql / DataFrame.to_sql
+    :param odbc_factory: returns a DBAPI connection (cursor)
+    """
+    _backends[name] = (connection_factory, odbc_factory)
+
+
+def _backend():
+    name = os.environ.get('TS_DB_BACKEND', 'mssql')
+    if name not in _backends:
+        raise ValueError('ERROR: Unknown database backend ' + name)
+
+    return _backends[name]
+
+
+def create_connection():
+    return _backend()[0]()
+
+
+def odbc_engine():
+    return _backend()[1]()
+
+
+def _read_raw(data_dir: str) -> pd.DataFrame:
+    # Wide sheet: row 0 Asset Code, row 1 Price Type, data from row 3
+    df = pd.read_excel(os.path.join(data_dir, RAW_FILE), header=None)
+
+    data = df.iloc[3:, ] \
+        .set_index(0).rename_axis('Date') \
+        .T \
+        .set_index(pd.MultiIndex.from_arrays(df.iloc[:2, 1:].values,
+                                             names=['Asset_code',
+                                                    'price_type'])) \
+        .T \
+        .stack(level=[0, 1]) \
+        .rename('Price') \
+        .reset_index()
+
+    return data[['Asset_code', 'price_type', 'Date', 'Price']]
+
+
+def _read_proxy(data_dir: str) -> pd.DataFrame:
+    frames = []
+    for file_name in PROXY_FILES:
+        df = pd.read_csv(os.path.join(data_dir, file_name),
+                         encoding='utf-8-sig', na_values=['NULL'])
+        day_first = '/' in str(df['Date'].iloc[0])
+        df['Date'] = pd.to_datetime(df['Date'],
+                                    format='%d/%m/%Y' if day_first
+                                    else '%Y-%m-%d')
+        frames.append(df[['Asset_Code', 'Price_Type', 'Date', 'Price',
+                          'Proxy_Level', 'Proxy_Name']])
+
+    return pd.concat(frames).drop_duplicates(
+        ['Asset_Code', 'Price_Type', 'Proxy_Level', 'Date'])
+
+
+def build_sqlite_db(path: str = None, data_dir: str = DATA_DIR) -> dict:
+    """
+    Create (or recreate) the SQLite database and bulk-load Data/.
+
+    :param path: SQLite file, defaults to SQLITE_PATH
+    :param data_dir: directory holding the seed files
+    :return: dict of table to rows loaded
+    """
+    path = SQLITE_PATH if path is None else path
+
+    proxy = _read_proxy(data_dir)
+
+    level_one = proxy[proxy['Proxy_Level'] == 1] \
+        .rename(columns={'Asset_Code': 'Asset_code',
+                         'Price_Type': 'price_type'})
+    raw = pd.concat([_read_raw(data_dir),
+                     level_one[['Asset_code', 'price_type', 'Date',
+                                'Price']]]) \
+        .drop_duplicates(['Asset_code', 'price_type', 'Date']) \
+        .sort_values(['Asset_code', 'price_type', 'Date'])
+
+    series = pd.concat([
+        raw[['Asset_code', 'price_type']].drop_duplicates()
+            .set_axis(['Asset_Type', 'Price_Type'], axis=1),
+        proxy[['Asset_Code', 'Price_Type']].drop_duplicates()
+            .set_axis(['Asset_Type', 'Price_Type'], axis=1)
+    ]).drop_duplicates()
+    dependency = pd.concat([series.assign(Proxy_Level=level)
+                            for level in (1, 2)])
+    dependency['Source_Type'] = None
+    dependency['Source_Price'] = None
+
+    # Dates stored as ISO text so string bounds compare correctly
+    for df in (raw, proxy):
+        df['Date'] = pd.to_datetime(df['Date']).dt.strftime('%Y-%m-%d')
+
+    if os.path.exists(path):
+        os.remove(path)
+
+    conn = sqlite3.connect(path)
+    try:
+        for sql in _schema_sql:
+            conn.execute(sql)
+
+        conn.executemany('INSERT INTO time_series VALUES (?, ?, ?, ?)',
+                         raw.itertuples(index=False))
+        conn.executemany('INSERT INTO time_series_proxy_220122 '
+                         'VALUES (?, ?, ?, ?, ?, ?)',
+                         proxy.astype(object)
+                         .where(proxy.notna(), None)
+                         .itertuples(index=False))
+        conn.executemany('INSERT INTO dependency_graph VALUES '
+                         '(?, ?, ?, ?, ?)',
+                         dependency[['Asset_Type', 'Price_Type',
+                                     'Source_Type', 'Source_Price',
+                                     'Proxy_Level']]
+                         .itertuples(index=False))
+        conn.commit()
+    finally:
+        conn.close()
+
+    return {'time_series': raw.shape[0],
+            'time_series_proxy_220122': proxy.shape[0],
+            'dependency_graph': dependency.shape[0]}
+
+
+if __name__ == '__main__':
+    rows = build_sqlite_db(sys.argv[1] if len(sys.argv) > 1 else None)
+    for table_name, count in rows.items():
+        print(f'{table_name}: {count} rows')
@@ -0,0 +1,658 @@
+"""
+
+Drawdown engine
+
+Array kernels behind `get_historical_drawdowns`. The pandas chain of
+tuple cummax, groupby, merge and self join is replaced by a few O(n)
+NumPy passes (one compiled loop with Numba, see Functions/kernels.py)
+over the Price array of the rows from Period Start up to the latest
+date:
+
+- cum_returns: (1 + pct_change).cumprod(), NaN on the first row
+- previous_peak: running maximum of cum_returns
+- peak_pos: row of that maximum, the latest row on ties as with the
+    (Cum_Returns, Date) tuple cummax, -1 on the first row
+- next_peak_pos: first row after peak_pos setting a new peak, -1 when
+    the peak is not regained yet
+- peak_price: Price on peak_pos
+- drawdown: cum_returns / previous_peak - 1
+
+Dates are expected sorted and unique and prices positive.
+
+`drawdown_recoveries` turns next_peak_pos into the calendar and
+trading day recoveries of every row at once.
+
+`drawdown_table` adds the episodes of the rows: one per peak followed
+by negative drawdowns, with its trough (a grouped minimum), depth and
+recovery, in date order. `top_episodes` answers the (Period End, Rank)
+queries of a window from the episodes: completed episodes are the
+prefix with the trough up to Period End (binary search), only the
+episode still running at Period End is scanned and the deepest ones
+are picked with `argpartition`, no sort of the rows.
+
+`underwater_chunks` streams the drawdown of every row (underwater
+curve), the rows since its peak and its episode in fixed size chunks,
+carrying the running state from chunk to chunk.
+
+`drawdown_range_table` is a sparse table over the whole series for
+arbitrary windows: the deepest drawdown of any rows comes from
+O(log n) blocks (`window_max_drawdown`). It takes O(n log n) memory,
+16 bytes per row and level (about 320 MB for a million rows), so it
+is only built for period queries.
+
+`rolling_max_drawdowns` gives the windows of a rolling series in O(n)
+memory instead. The rows are cut in blocks as long as the shortest
+window and every row keeps the (max, min, peak, trough) of the rows
+from its block start and up to its block end, prefix and suffix scans
+of the same combination as the sparse table. A window is then the
+suffix of its first block, the whole blocks in between (a sparse
+table over the blocks only) and the prefix of its last block.
+"""
+from collections import namedtuple
+
+from typing import Union
+
+import numpy as np
+
+from Functions.kernels import drawdown_kernel
+
+DrawdownArrays = namedtuple('DrawdownArrays',
+                            ['cum_returns', 'previous_peak', 'peak_pos',
+                             'next_peak_pos', 'peak_price', 'drawdown'])
+
+# Episodes in date order: peak row, trough row (first row of the
+# lowest drawdown), depth, row regaining the peak (-1 if none) and
+# whether the lowest drawdown is reached on several rows
+DrawdownEpisodes = namedtuple('DrawdownEpisodes',
+                              ['peak_pos', 'trough_pos', 'depth',
+                               'recovery_pos', 'tied'])
+
+DrawdownTable = namedtuple('DrawdownTable', ['arrays', 'episodes'])
+
+# Calendar and trading days from every row to the next peak after its
+# peak, -1 when the peak is not regained yet
+RecoveryDays = namedtuple('RecoveryDays', ['calendar', 'trading'])
+
+# Deepest episodes of a window, deepest first, and the number of
+# episodes in the window. exact is False where tied drawdowns make the
+# rank depend on the sort order (callers then sort the rows)
+TopEpisodes = namedtuple('TopEpisodes',
+                         ['peak_pos', 'trough_pos', 'depth', 'exact',
+                          'total'])
+
+# Episodes selected per window by default, ranks are usually 1 to 5
+TOP_COUNT = 5
+
+# Rows start:start + len(drawdown) of the underwater curve: drawdown
+# (NaN on the first row), rows since the peak (0 when not under water)
+# and episode number in date order (-1 when not under water)
+UnderwaterArrays = namedtuple('UnderwaterArrays',
+                              ['start', 'drawdown', 'duration',
+                               'episode'])
+
+# Rows per chunk of the underwater curve
+UNDERWATER_CHUNK = 1 << 16
+
+# Rows (and windows) per chunk of the block scans of the rolling
+# drawdowns
+SCAN_CHUNK = 1 << 16
+
+# Sparse table over a series: per level k and row i, for the rows
+# i:i + 2 ** k the row of the highest price (latest on ties), of the
+# lowest price (first on ties) and the peak / trough rows of the
+# deepest drawdown
+DrawdownRangeTable = namedtuple('DrawdownRangeTable',
+                                ['prices', 'max_pos', 'min_pos',
+                                 'peak_pos', 'trough_pos'])
+
+# Deepest drawdown of a window, exact is False when near ties make the
+# result depend on rounding (callers then use the rows)
+RankedEpisode = namedtuple('RankedEpisode',
+                           ['peak_pos', 'trough_pos', 'depth', 'exact'])
+
+# Relative difference below which prices or depths count as tied for
+# the range queries (cumulative returns drift from price ratios by far
+# less)
+RANGE_TOLERANCE = 1e-9
+
+
+def drawdown_arrays(prices: np.ndarray) -> DrawdownArrays:
+    """
+    :param prices: Price array from Period Start to the latest date
+    :return: DrawdownArrays of the rows
+    """
+    prices = np.asarray(prices, dtype=np.float64)
+    rows = np.arange(len(prices))
+
+    # Cumulative returns as pct_change().cumprod(), first row NaN, and
+    # the running maximum and its row, from one pass over the rows
+    cum_returns, previous_peak, peak_pos, drawdown = \
+        drawdown_kernel(prices)
+
+    # Next peak after the peak of every row
+    new_peak = np.zeros(len(prices), dtype=bool)
+    new_peak[1:] = peak_pos[1:] == rows[1:]
+    peaks = rows[new_peak]
+    next_peak_pos = np.full(len(prices), -1)
+    if peaks.size:
+        following = np.searchsorted(peaks, peak_pos, side='right')
+        found = (peak_pos >= 0) & (following < peaks.size)
+        next_peak_pos[found] = peaks[following[found]]
+
+    peak_price = np.where(peak_pos >= 0, prices[np.maximum(peak_pos, 0)],
+                          np.nan)
+
+    return DrawdownArrays(cum_returns, previous_peak, peak_pos,
+                          next_peak_pos, peak_price, drawdown)
+
+
+def drawdown_episodes(arrays: DrawdownArrays) -> DrawdownEpisodes:
+    """
+    :param arrays: DrawdownArrays of the rows
+    :return: DrawdownEpisodes of the rows
+    """
+    rows = np.flatnonzero(arrays.drawdown < 0)
+    drawdown = arrays.drawdown[rows]
+    peak = arrays.peak_pos[rows]
+
+    # Rows of an episode share their peak and are consecutive
+    first = np.ones(len(rows), dtype=bool)
+    first[1:] = peak[1:] != peak[:-1]
+    starts = np.flatnonzero(first)
+    episode = np.cumsum(first) - 1
+
+    depth = np.minimum.reduceat(drawdown, starts) if rows.size \
+        else drawdown
+    lowest = np.flatnonzero(drawdown == depth[episode])
+    _, first_lowest = np.unique(episode[lowest], return_index=True)
+    trough = rows[lowest[first_lowest]]
+    tied = np.bincount(episode[lowest], minlength=len(starts)) > 1
+
+    return DrawdownEpisodes(peak[starts], trough, depth,
+                            arrays.next_peak_pos[trough], tied)
+
+
+def drawdown_table(prices: np.ndarray) -> DrawdownTable:
+    """
+    :param prices: Price array from Period Start to the latest date
+    :return: read-only DrawdownTable of the rows
+    """
+    arrays = drawdown_arrays(prices)
+    episodes = drawdown_episodes(arrays)
+    for values in arrays + episodes:
+        values.flags.writeable = False
+
+    return DrawdownTable(arrays, episodes)
+
+
+def drawdown_recoveries(arrays: DrawdownArrays,
+                        dates: np.ndarray) -> RecoveryDays:
+    """
+    :param arrays: DrawdownArrays of the rows
+    :param dates: datetime64 Date array of the rows
+    :return: RecoveryDays of the rows as int32 arrays, the Recovery
+             Days of a drawdown are those of its trough row
+    """
+    rows = np.arange(len(dates))
+    recovered = arrays.next_peak_pos >= 0
+    recovery = np.where(recovered, arrays.next_peak_pos, rows)
+
+    # Both counts from the same positions, floored to whole days
+    calendar = (dates[recovery] - dates) // np.timedelta64(1, 'D')
+    trading = recovery - rows
+
+    return RecoveryDays(
+        np.where(recovered, calendar, -1).astype(np.int32),
+        np.where(recovered, trading, -1).astype(np.int32))
+
+
+def underwater_chunks(prices: np.ndarray,
+                      chunk_size: int = UNDERWATER_CHUNK,
+                      compact: bool = False):
+    """
+    :param prices: Price array from Period Start
+    :param chunk_size: rows per chunk
+    :param compact: float32 / int32 arrays instead of float64 / int64
+    :return: generator of UnderwaterArrays, the same values as
+             `drawdown_arrays` and `drawdown_episodes` of all the rows
+    """
+    if chunk_size < 1:
+        raise ValueError('ERROR: Chunk size must be at least 1')
+
+    prices = np.asarray(prices, dtype=np.float64)
+    float_type, int_type = (np.float32, np.int32) if compact else \
+        (np.float64, np.int64)
+
+    # State after the previous chunk, the running products and maxima
+    # continue from it exactly as over the whole array
+    cum_return, peak_value, peak_row = 1.0, -np.inf, -1
+    under_water, episodes = False, 0
+    for start in range(0, len(prices), chunk_size):
+        stop = min(start + chunk_size, len(prices))
+        rows = np.arange(start, stop)
+
+        # First row of the prices has no return
+        first = max(start, 1)
+        with np.errstate(all='ignore'):
+            cum_returns = np.cumprod(np.concatenate(
+                ([cum_return], 1 + (prices[first:stop] /
+                                    prices[first - 1:stop - 1] - 1))))
+            previous_peak = np.maximum.accumulate(
+                np.concatenate(([peak_value], cum_returns[1:])))
+            new_peak = cum_returns >= previous_peak
+            peak_pos = np.maximum.accumulate(np.concatenate(
+                ([peak_row], np.where(new_peak[1:], rows[first - start:],
+                                      -1))))
+            drawdown = cum_returns / previous_peak - 1.0
+
+        cum_return, peak_value, peak_row = \
+            cum_returns[-1], previous_peak[-1], peak_pos[-1]
+        if first > start:
+            drawdown[0] = np.nan
+        else:
+            drawdown, peak_pos = drawdown[1:], peak_pos[1:]
+
+        # Episodes are the runs of rows under water
+        under = drawdown < 0
+        begins = under & ~np.concatenate(([under_water], under[:-1]))
+        episode = episodes + np.cumsum(begins) - 1
+        under_water, episodes = under[-1], episode[-1] + 1
+
+        yield UnderwaterArrays(
+            start, drawdown.astype(float_type),
+            np.where(under, rows - peak_pos, 0).astype(int_type),
+            np.where(under, episode, -1).astype(int_type))
+
+
+def top_episodes(table: DrawdownTable, end: int,
+                 count: int = TOP_COUNT) -> TopEpisodes:
+    """
+    :param table: DrawdownTable of the rows from Period Start
+    :param end: last row of the window (Period End)
+    :param count: number of episodes to select
+    :return: TopEpisodes of the rows :end + 1
+    """
+    arrays, episodes = table
+
+    # Episodes with their trough in the window
+    complete = int(np.searchsorted(episodes.trough_pos, end,
+                                   side='right'))
+    peak = episodes.peak_pos[:complete]
+    trough = episodes.trough_pos[:complete]
+    depth = episodes.depth[:complete]
+    tied = episodes.tied[:complete]
+
+    # Episode still running at end, lowest point within the window
+    current = arrays.peak_pos[end] if end >= 0 else -1
+    if current >= 0 and arrays.drawdown[end] < 0 and \
+            (complete == 0 or peak[-1] != current):
+        window = arrays.drawdown[current + 1:end + 1]
+        lowest = window.min()
+        peak = np.append(peak, current)
+        trough = np.append(trough, current + 1 + window.argmin())
+        depth = np.append(depth, lowest)
+        tied = np.append(tied, (window == lowest).sum() > 1)
+
+    # One more than asked tells whether the last one is tied
+    selected = min(count + 1, len(depth))
+    order = np.argpartition(depth, selected - 1)[:selected] \
+        if selected < len(depth) else np.arange(len(depth))
+    order = order[np.argsort(depth[order], kind='stable')]
+
+    # Rank selection depends on the sort order of tied drawdowns
+    ranked = depth[order]
+    exact = ~tied[order]
+    exact[1:] &= ranked[1:] != ranked[:-1]
+    exact[:-1] &= ranked[:-1] != ranked[1:]
+
+    order = order[:count]
+    return TopEpisodes(peak[order], trough[order], ranked[:count],
+                       exact[:count], len(depth))
+
+
+def _combine(prices: np.ndarray, left: tuple, right: tuple) -> tuple:
+    # (max row, min row, peak row, trough row) of two adjacent blocks,
+    # the deepest drawdown is in the left, in the right or from the
+    # left maximum to the right minimum. Equally deep drawdowns resolve
+    # to the earliest trough, so any grouping of the blocks gives the
+    # same rows
+    left_max, left_min, left_peak, left_trough = left
+    right_max, right_min, right_peak, right_trough = right
+
+    max_pos = np.where(prices[right_max] >= prices[left_max], right_max,
+                       left_max)
+    min_pos = np.where(prices[right_min] < prices[left_min], right_min,
+                       left_min)
+
+    depth = prices[left_trough] / prices[left_peak]
+    right_depth = prices[right_trough] / prices[right_peak]
+    cross_depth = prices[right_min] / prices[left_max]
+
+    use_right = right_depth < depth
+    peak = np.where(use_right, right_peak, left_peak)
+    trough = np.where(use_right, right_trough, left_trough)
+    depth = np.minimum(depth, right_depth)
+
+    use_cross = (cross_depth < depth) | \
+        ((cross_depth == depth) & use_right & (right_min < right_trough))
+    peak = np.where(use_cross, left_max, peak)
+    trough = np.where(use_cross, right_min, trough)
+
+    return max_pos, min_pos, peak, trough
+
+
+def _range_levels(prices: np.ndarray, base: tuple) -> list:
+    # Levels of the sparse table over the blocks of base, level k
+    # combining 2 ** k consecutive blocks
+    size = len(base[0])
+    levels = [base]
+    width = 1
+    while 2 * width <= size:
+        previous = levels[-1]
+        left = tuple(values[:size - 2 * width + 1]
+                     for values in previous)
+        right = tuple(values[width:size - width + 1]
+                      for values in previous)
+        levels.append(tuple(values.astype(np.int32) for values in
+                            _combine(prices, left, right)))
+        width *= 2
+
+    return levels
+
+
+def drawdown_range_table(prices: np.ndarray) -> DrawdownRangeTable:
+    """
+    :param prices: Price array of a series
+    :return: read-only DrawdownRangeTable of the series
+    """
+    prices = np.asarray(prices, dtype=np.float64).copy()
+    rows = np.arange(len(prices), dtype=np.int32)
+
+    levels = _range_levels(prices, (rows, rows, rows, rows))
+
+    for values in (prices,) + tuple(rows for level in levels
+                                    for rows in level):
+        values.flags.writeable = False
+
+    return DrawdownRangeTable(prices, *zip(*levels))
+
+
+def _range_extreme(table: DrawdownRangeTable, lo: int, hi: int,
+                   highest: bool) -> int:
+    # Latest row of the highest / first row of the lowest price of
+    # rows lo:hi from two overlapping blocks
+    level = (hi - lo).bit_length() - 1
+    if highest:
+        left = table.max_pos[level][lo]
+        right = table.max_pos[level][hi - (1 << level)]
+        return int(right if table.prices[right] >= table.prices[left]
+                   else left)
+
+    left = table.min_pos[level][lo]
+    right = table.min_pos[level][hi - (1 << level)]
+    return int(left if table.prices[left] <= table.prices[right]
+               else right)
+
+
+def range_max_drawdown(table: DrawdownRangeTable, lo: int,
+                       hi: int) -> tuple:
+    """
+    :param table: DrawdownRangeTable of the series
+    :param lo: first row
+    :param hi: end row (exclusive), hi > lo
+    :return: (peak row, trough row) of the deepest drawdown of the rows
+             lo:hi, from O(log n) blocks
+    """
+    prices = table.prices
+    lo, hi = int(lo), int(hi)
+
+    # Running maximum and deepest drawdown of the blocks so far, as
+    # `_combine` on single rows
+    max_pos = peak = trough = None
+    while lo < hi:
+        level = (hi - lo).bit_length() - 1
+        block_peak = int(table.peak_pos[level][lo])
+        block_trough = int(table.trough_pos[level][lo])
+        block_min = int(table.min_pos[level][lo])
+        use_block = peak is None or \
+            prices[block_trough] / prices[block_peak] < \
+            prices[trough] / prices[peak]
+        if use_block:
+            peak, trough = block_peak, block_trough
+        if max_pos is not None:
+            cross_depth = prices[block_min] / prices[max_pos]
+            depth = prices[trough] / prices[peak]
+            if cross_depth < depth or (cross_depth == depth and use_block
+                                       and block_min < block_trough):
+                peak, trough = max_pos, block_min
+
+        block_max = int(table.max_pos[level][lo])
+        if max_pos is None or prices[block_max] >= prices[max_pos]:
+            max_pos = block_max
+        lo += 1 << level
+
+    return peak, trough
+
+
+def _window_blocks(table: DrawdownRangeTable, lo: np.ndarray,
+                   hi: np.ndarray) -> tuple:
+    # (max, min, peak, trough) rows of the blocks lo:hi of every window
+    # and whether it has any, blocks of 2 ** level taken where the rest
+    # of the window is that long, from the largest down, so blocks come
+    # in row order
+    prices = table.prices
+    result = tuple(np.zeros(len(lo), dtype=np.int64) for _ in range(4))
+    found = np.zeros(len(lo), dtype=bool)
+    start = lo.copy()
+    for level in range(len(table.max_pos) - 1, -1, -1):
+        take = np.flatnonzero(hi - start >= 1 << level)
+        if not take.size:
+            continue
+
+        block = tuple(values[level][start[take]] for values in table[1:])
+        combined = _combine(prices, tuple(values[take]
+                                          for values in result), block)
+        for values, single, merged in zip(result, block, combined):
+            values[take] = np.where(found[take], merged, single)
+
+        found[take] = True
+        start[take] += 1 << level
+
+    return result, found
+
+
+def _deepest(prices: np.ndarray, result: tuple,
+             found: np.ndarray) -> tuple:
+    # (peak rows, trough rows, depths), -1 rows and NaN depths for
+    # windows without a drawdown
+    peak, trough = result[2], result[3]
+    depth = prices[trough] / prices[peak] - 1.0
+    drawdown = found & (depth < 0)
+
+    return np.where(drawdown, peak, -1), np.where(drawdown, trough, -1), \
+        np.where(drawdown, depth, np.nan)
+
+
+def _block_scans(prices: np.ndarray, size: int) -> tuple:
+    # (max, min, peak, trough) rows of every row's block from its start
+    # up to the row (prefix) and from the row up to its end (suffix),
+    # by doubling: after the pass of width w every row holds its last
+    # (first) 2 * w rows of the block. Whole blocks are scanned
+    # SCAN_CHUNK rows at a time to bound the temporaries
+    rows = np.arange(len(prices), dtype=np.int32)
+    prefix = tuple(rows.copy() for _ in range(4))
+    suffix = tuple(rows.copy() for _ in range(4))
+
+    chunk = -(-SCAN_CHUNK // size) * size
+    for start in range(0, len(prices), chunk):
+        stop = min(start + chunk, len(prices))
+        before = rows[start:stop] % size
+        after = np.minimum(rows[start:stop] - before + size,
+                           len(prices)) - 1 - rows[start:stop]
+        chunk_prefix = tuple(values[start:stop] for values in prefix)
+        chunk_suffix = tuple(values[start:stop] for values in suffix)
+
+        width = 1
+        while width < size:
+            # Both sides are gathered before any row is updated
+            take = np.flatnonzero(before >= width)
+            combined = _combine(prices, tuple(values[take - width]
+                                              for values in chunk_prefix),
+                                tuple(values[take]
+                                      for values in chunk_prefix))
+            for values, merged in zip(chunk_prefix, combined):
+                values[take] = merged
+
+            take = np.flatnonzero(after >= width)
+            combined = _combine(prices, tuple(values[take]
+                                              for values in chunk_suffix),
+                                tuple(values[take + width]
+                                      for values in chunk_suffix))
+            for values, merged in zip(chunk_suffix, combined):
+                values[take] = merged
+
+            width *= 2
+
+    return prefix, suffix
+
+
+def _block_windows(prices: np.ndarray, size: int, scans: tuple,
+                   table: Union[DrawdownRangeTable, None],
+                   lo: np.ndarray, hi: np.ndarray) -> tuple:
+    # (max, min, peak, trough) rows of the non empty windows lo:hi from
+    # the block scans and the sparse table over the whole blocks
+    prefix, suffix = scans
+    first, last = lo // size, (hi - 1) // size
+    result = tuple(values[lo].astype(np.int64) for values in suffix)
+
+    # Whole blocks between the first and the last block
+    between = np.flatnonzero(last - first >= 2)
+    if between.size:
+        inner, _ = _window_blocks(table, first[between] + 1,
+                                  last[between])
+        combined = _combine(prices, tuple(values[between]
+                                          for values in result), inner)
+        for values, merged in zip(result, combined):
+            values[between] = merged
+
+    # Prefix of the last block
+    take = np.flatnonzero(last > first)
+    combined = _combine(prices, tuple(values[take] for values in result),
+                        tuple(values[hi[take] - 1] for values in prefix))
+    for values, merged in zip(result, combined):
+        values[take] = merged
+
+    return result
+
+
+def rolling_max_drawdowns(prices: np.ndarray, lo: np.ndarray,
+                          hi: np.ndarray) -> tuple:
+    """
+    Deepest drawdown of the windows of a rolling series in O(n) memory,
+    same rows as `range_max_drawdown` on the sparse table of the series.
+
+    :param prices: Price array of a series
+    :param lo: first row of each window
+    :param hi: end row of each window (exclusive)
+    :return: (peak rows, trough rows, depths) of the windows, -1 rows
+             and NaN depths for windows without a drawdown
+    """
+    prices = np.asarray(prices, dtype=np.float64)
+    lo = np.asarray(lo, dtype=np.int64)
+    hi = np.asarray(hi, dtype=np.int64)
+
+    peak = np.full(len(lo), -1, dtype=np.int64)
+    trough = peak.copy()
+    depth = np.full(len(lo), np.nan)
+
+    windows = np.flatnonzero(hi > lo)
+    if not windows.size:
+        return peak, trough, depth
+
+    # Windows never fit in a block without starting on its first row
+    size = int((hi - lo)[windows].min())
+    scans = _block_scans(prices, size)
+
+    table = None
+    if ((hi[windows] - 1) // size - lo[windows] // size >= 2).any():
+        ends = np.minimum(np.arange(size, len(prices) + size, size),
+                          len(prices)) - 1
+        table = DrawdownRangeTable(
+            prices, *zip(*_range_levels(
+                prices, tuple(values[ends] for values in scans[0]))))
+
+    for start in range(0, len(windows), SCAN_CHUNK):
+        take = windows[start:start + SCAN_CHUNK]
+        result = _block_windows(prices, size, scans, table, lo[take],
+                                hi[take])
+        peak[take], trough[take], depth[take] = _deepest(
+            prices, result, np.ones(len(take), dtype=bool))
+
+    return peak, trough, depth
+
+
+def window_max_drawdown(table: DrawdownRangeTable, lo: int,
+                        hi: int) -> Union[RankedEpisode, None]:
+    """
+    Deepest drawdown of the rows lo:hi measured from the running
+    maximum of the prices from lo, as ranked first by
+    `get_historical_drawdowns` for Period Start row lo - 1.
+
+    :param table: DrawdownRangeTable of the series
+    :param lo: first row
+    :param hi: end row (exclusive)
+    :return: RankedEpisode, None if the rows have no drawdown. exact is
+             False when another peak, trough or episode comes within
+             RANGE_TOLERANCE, or the depth is that close to a 6 decimal
+             rounding boundary, as the cumulative returns of
+             `get_historical_drawdowns` may then pick differently
+    """
+    lo, hi = int(lo), int(hi)
+    if hi - lo < 2:
+        return None
+
+    prices = table.prices
+    peak, trough = range_max_drawdown(table, lo, hi)
+    depth = prices[trough] / prices[peak] - 1.0
+    if depth >= 0:
+        return None
+
+    def near(a, b):
+        return abs(a - b) <= RANGE_TOLERANCE * abs(b)
+
+    # Other rows as high as the peak before the trough
+    exact = depth < -RANGE_TOLERANCE
+    for a, b in [(lo, peak), (peak + 1, trough + 1)]:
+        exact &= a >= b or \
+            not near(prices[_range_extreme(table, a, b, True)],
+                     prices[peak])
+
+    # First row regaining the peak ends the episode
+    regained = prices[peak] * (1 - RANGE_TOLERANCE)
+    first, end = trough + 1, hi
+    while first < end:
+        middle = (first + end) // 2
+        if prices[_range_extreme(table, trough + 1, middle + 1,
+                                 True)] < regained:
+            first = middle + 1
+        else:
+            end = middle
+
+    # Other rows of the episode as low as the trough
+    for a, b in [(peak + 1, trough), (trough + 1, end)]:
+        exact &= a >= b or \
+            not near(prices[_range_extreme(table, a, b, False)],
+                     prices[trough])
+
+    # Other episodes as deep
+    for a, b in [(lo, peak), (end, hi)]:
+        if b - a >= 2:
+            other_peak, other_trough = range_max_drawdown(table, a, b)
+            exact &= prices[other_trough] / prices[other_peak] - 1.0 > \
+                depth + 2 * RANGE_TOLERANCE
+
+    # Rounding of the performance
+    exact &= np.round(depth - RANGE_TOLERANCE, 6) == \
+        np.round(depth + RANGE_TOLERANCE, 6)
+
+    return RankedEpisode(peak, trough, depth, bool(exact))
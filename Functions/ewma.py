@@ -0,0 +1,186 @@
+"""
+
+EWMA engine for the Lambda volatilities
+
+The most recent value of a window gets weight (1 - lambda), the one
+before (1 - lambda) * lambda and so on, and the window result is
+
+    sum(weight * value) / sum(weight)
+
+Windows sharing an end date differ only in how many values they take
+going back from it, so all of them come out of one backward cumulative
+sum. `ewma_window_means` groups any list of windows by end date and
+runs one pass per end date, or one compiled loop over the windows with
+Numba (see Functions/kernels.py). Either way a window costs its length.
+
+When the windows together cover more values than the series holds
+(a rolling series of windows), the sums slide instead. With
+S(t) = lambda * S(t - 1) + x(t - 1) the EWMA sum of every value before
+t, a window lo:hi sums to
+
+    S(hi) - lambda ** (hi - lo) * S(lo)
+
+which for a fixed length w is the recursive update dropping x(t - w)
+with weight lambda ** w. S is built in blocks short enough for
+lambda ** -k not to overflow, each block one cumulative sum of
+lambda ** -k * x rescaled by lambda ** k onto the block start, so the
+whole series costs O(n) and every window two lookups. Windows whose
+worst case rounding error exceeds SLIDING_TOLERANCE (short windows
+after large values, non finite values) keep the per-window pass.
+
+Weight vectors and their running sums are cached per Lambda and grown
+as longer windows are requested.
+"""
+import threading
+
+from typing import Tuple
+
+import numpy as np
+
+from Functions.kernels import ewma_kernel
+
+EPS = np.finfo(np.float64).eps
+
+# Largest relative rounding error accepted from the sliding sums
+SLIDING_TOLERANCE = 1e-11
+
+# Decay over a block of the sliding sums, lambda ** -k <= e ** 32
+BLOCK_DECAY = 32.0
+
+_weights = {}
+_lock = threading.Lock()
+
+
+def ewma_weights(lambda_factor: float, length: int) -> \
+        Tuple[np.ndarray, np.ndarray]:
+    """
+    :param lambda_factor: decay factor Lambda
+    :param length: number of weights
+    :return: read-only (weights, running sums of the weights), most
+             recent value first
+    """
+    cached = _weights.get(lambda_factor)
+    if cached is None or len(cached[0]) < length:
+        with _lock:
+            cached = _weights.get(lambda_factor)
+            if cached is None or len(cached[0]) < length:
+                # Grow to the next power of two, earlier weights are
+                # unchanged as every weight is computed on its own
+                size = 1 << max(int(length) - 1, 0).bit_length()
+                weights = (1 - lambda_factor) * lambda_factor ** \
+                    np.arange(size)
+                sums = np.cumsum(weights)
+                weights.flags.writeable = False
+                sums.flags.writeable = False
+                cached = _weights[lambda_factor] = (weights, sums)
+
+    return cached[0][:length], cached[1][:length]
+
+
+def ewma_means(values: np.ndarray, end: int, counts: np.ndarray,
+               lambda_factor: float) -> np.ndarray:
+    """
+    :param values: series values, oldest first
+    :param end: position after the most recent value of the windows
+    :param counts: number of values in each window, all ending at end
+    :param lambda_factor: decay factor Lambda
+    :return: EWMA of each window, NaN for empty windows
+    """
+    counts = np.asarray(counts, dtype=np.int64)
+    return ewma_window_means(values, end - counts,
+                             np.full(len(counts), end), lambda_factor)
+
+
+def ewma_window_means(values: np.ndarray, lo: np.ndarray, hi: np.ndarray,
+                      lambda_factor: float) -> np.ndarray:
+    """
+    :param values: series values, oldest first
+    :param lo: first position of each window
+    :param hi: end position of each window (exclusive)
+    :param lambda_factor: decay factor Lambda
+    :return: EWMA of values[lo:hi] for every window
+    """
+    lo = np.asarray(lo, dtype=np.int64)
+    hi = np.asarray(hi, dtype=np.int64)
+
+    weights, weight_sums = ewma_weights(
+        lambda_factor, int((hi - lo).max(initial=0)))
+
+    if 0 < lambda_factor < 1 and \
+            int(np.maximum(hi - lo, 0).sum()) > len(values):
+        means = ewma_sliding_means(values, lo, hi, lambda_factor,
+                                   weight_sums)
+        redo = np.flatnonzero(np.isnan(means))
+        means[redo] = ewma_kernel(values, lo[redo], hi[redo], weights,
+                                  weight_sums)
+        return means
+
+    return ewma_kernel(values, lo, hi, weights, weight_sums)
+
+
+def _sliding_sums(values: np.ndarray, lambda_factor: float,
+                  size: int) -> np.ndarray:
+    # sums[t] = lambda * sums[t - 1] + values[t - 1], in blocks of size
+    powers = lambda_factor ** np.arange(size + 1)
+    inverse = lambda_factor ** -np.arange(size)
+
+    sums = np.zeros(len(values) + 1)
+    for start in range(0, len(values), size):
+        block = values[start:start + size]
+        count = len(block)
+        sums[start + 1:start + count + 1] = \
+            powers[1:count + 1] * sums[start] + \
+            powers[:count] * np.cumsum(inverse[:count] * block)
+
+    return sums
+
+
+def ewma_sliding_means(values: np.ndarray, lo: np.ndarray, hi: np.ndarray,
+                       lambda_factor: float,
+                       weight_sums: np.ndarray) -> np.ndarray:
+    """
+    :param values: series values, oldest first
+    :param lo: first position of each window
+    :param hi: end position of each window (exclusive)
+    :param lambda_factor: decay factor Lambda, 0 < Lambda < 1
+    :param weight_sums: running sums of the weights, at least as many as
+                        the longest window
+    :return: EWMA of values[lo:hi] for every window from the sliding
+             sums, NaN for empty windows and where the rounding error
+             may exceed SLIDING_TOLERANCE
+    """
+    values = np.asarray(values, dtype=np.float64)
+    lo = np.asarray(lo, dtype=np.int64)
+    hi = np.asarray(hi, dtype=np.int64)
+
+    finite = np.isfinite(values)
+    size = max(min(int(BLOCK_DECAY / -np.log(lambda_factor)),
+                   len(values)), 1)
+
+    sums = _sliding_sums(np.where(finite, values, 0.0), lambda_factor,
+                         size)
+    absolute = sums if (values[finite] >= 0).all() else \
+        _sliding_sums(np.abs(np.where(finite, values, 0.0)),
+                      lambda_factor, size)
+
+    count = np.maximum(hi - lo, 0)
+    with np.errstate(all='ignore'):
+        decay = lambda_factor ** count
+        total = sums[hi] - decay * sums[lo]
+
+        # Every sum is off by at most gamma(size + 4) of the absolute
+        # sums of its blocks, the carries decaying by lambda ** size
+        factor = (size + 4) * EPS / \
+            ((1 - (size + 4) * EPS) * (1 - lambda_factor ** size))
+        error = factor * (absolute[hi] + decay * absolute[lo]) + \
+            EPS * (abs(sums[hi]) + 2 * decay * abs(sums[lo]))
+
+        means = total * (1 - lambda_factor) / \
+            weight_sums[np.maximum(count - 1, 0)]
+        precise = (count > 0) & (error <= SLIDING_TOLERANCE * abs(total))
+
+    if not finite.all():
+        missing = np.concatenate([[0], np.cumsum(~finite)])
+        precise &= missing[hi] == missing[lo]
+
+    return np.where(precise, means, np.nan)
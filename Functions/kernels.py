@@ -0,0 +1,202 @@
+"""
+
+Sequential kernels with optional Numba compilation
+
+Drawdown peak tracking, the EWMA window sums and the running product
+of the proxy price extension are loops over the rows. With Numba
+installed each loop is compiled on first use and cached to disk
+(`cache=True`, next to this file in __pycache__), so later processes
+load the machine code instead of compiling again. Without Numba, or
+with TS_KERNEL_JIT=0, the same results come from vectorized NumPy.
+
+Drawdowns of series long enough for `parallel_scan` take the vectorized
+path either way, with the running maxima scanned in parallel blocks
+(see Functions/parallel_scan.py), each block by the compiled
+`_maximum_loop` with Numba. The running product stays one serial pass.
+
+Both paths do the same floating point operations in the same order
+(np.cumprod, np.cumsum and np.maximum.accumulate are sequential, the
+loops are compiled without fastmath), so results match bit for bit.
+KERNEL_TOLERANCE documents the largest relative difference accepted
+between them, for compilers fusing a multiply and an add of the EWMA
+sums into one rounding.
+"""
+import os
+
+import numpy as np
+
+from Functions.parallel_scan import parallel_scan, running_maximum
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+# Numba kernels are used when installed unless disabled
+JIT = njit is not None and os.environ.get('TS_KERNEL_JIT', '1') != '0'
+
+# Largest relative difference between the compiled and NumPy kernels
+KERNEL_TOLERANCE = 1e-12
+
+
+def _compile(func):
+    # Compiled on first call with NumPy division semantics (inf / NaN
+    # instead of ZeroDivisionError), None without Numba
+    return njit(cache=True, nogil=True, error_model='numpy')(func) \
+        if JIT else None
+
+
+def _drawdown_loop(prices):
+    size = len(prices)
+    cum_returns = np.full(size, np.nan)
+    previous_peak = np.full(size, np.nan)
+    peak_pos = np.full(size, -1, dtype=np.int64)
+    drawdown = np.full(size, np.nan)
+
+    product, peak, row = 1.0, -np.inf, -1
+    for i in range(1, size):
+        product *= 1 + (prices[i] / prices[i - 1] - 1)
+
+        # NaN stays the peak once reached, as np.maximum.accumulate
+        if np.isnan(peak) or np.isnan(product):
+            peak = np.nan
+        elif product > peak:
+            peak = product
+        if product >= peak:
+            row = i
+
+        cum_returns[i] = product
+        previous_peak[i] = peak
+        peak_pos[i] = row
+        drawdown[i] = product / peak - 1.0
+
+    return cum_returns, previous_peak, peak_pos, drawdown
+
+
+def _maximum_loop(values, out):
+    # np.maximum.accumulate, NaN stays the maximum once reached
+    peak = -np.inf
+    for i in range(len(values)):
+        if np.isnan(peak) or np.isnan(values[i]):
+            peak = np.nan
+        elif values[i] > peak:
+            peak = values[i]
+        out[i] = peak
+
+
+def _ewma_loop(values, lo, hi, weights, weight_sums):
+    means = np.full(len(lo), np.nan)
+    for i in range(len(lo)):
+        count = hi[i] - lo[i]
+        if count > 0:
+            total = 0.0
+            for k in range(count):
+                total += weights[k] * values[hi[i] - 1 - k]
+            means[i] = total / weight_sums[count - 1]
+
+    return means
+
+
+def _cumprod_loop(values):
+    products = np.empty(len(values))
+    product = 1.0
+    for i in range(len(values)):
+        if np.isnan(values[i]):
+            products[i] = np.nan
+        else:
+            product *= values[i]
+            products[i] = product
+
+    return products
+
+
+_drawdown_jit = _compile(_drawdown_loop)
+_maximum_jit = _compile(_maximum_loop)
+_ewma_jit = _compile(_ewma_loop)
+_cumprod_jit = _compile(_cumprod_loop)
+
+
+def drawdown_kernel(prices: np.ndarray) -> tuple:
+    """
+    :param prices: float64 Price array
+    :return: (cum_returns, previous_peak, peak_pos, drawdown) as in
+             `drawdown_arrays`: cumulative returns and their running
+             maximum, NaN on the first row, row of the maximum (latest
+             on ties, -1 on the first row) and drawdown
+    """
+    prices = np.ascontiguousarray(prices, dtype=np.float64)
+    if _drawdown_jit is not None and not parallel_scan(len(prices)):
+        return _drawdown_jit(prices)
+
+    cum_returns = np.full(len(prices), np.nan)
+    previous_peak = np.full(len(prices), np.nan)
+    with np.errstate(all='ignore'):
+        cum_returns[1:] = np.cumprod(1 + (prices[1:] / prices[:-1] - 1))
+        previous_peak[1:] = running_maximum(cum_returns[1:],
+                                            _maximum_jit)
+
+        drawdown = cum_returns / previous_peak - 1.0
+
+    # Rows reaching the running maximum, the running argmax is the
+    # latest of them
+    new_peak = np.zeros(len(prices), dtype=bool)
+    new_peak[1:] = cum_returns[1:] >= previous_peak[1:]
+    peak_pos = running_maximum(
+        np.where(new_peak, np.arange(len(prices)), -1))
+
+    return cum_returns, previous_peak, peak_pos, drawdown
+
+
+def ewma_kernel(values: np.ndarray, lo: np.ndarray, hi: np.ndarray,
+                weights: np.ndarray,
+                weight_sums: np.ndarray) -> np.ndarray:
+    """
+    :param values: series values, oldest first
+    :param lo: first position of each window
+    :param hi: end position of each window (exclusive)
+    :param weights: EWMA weights, most recent value first, at least as
+                    many as the longest window
+    :param weight_sums: running sums of the weights
+    :return: EWMA of values[lo:hi] for every window, NaN for empty
+             windows
+    """
+    values = np.ascontiguousarray(values, dtype=np.float64)
+    lo = np.ascontiguousarray(lo, dtype=np.int64)
+    hi = np.ascontiguousarray(hi, dtype=np.int64)
+    if _ewma_jit is not None:
+        return _ewma_jit(values, lo, hi, weights, weight_sums)
+
+    means = np.full(len(lo), np.nan)
+    for end in np.unique(hi):
+        windows = np.flatnonzero(hi == end)
+        counts = end - lo[windows]
+        length = int(counts.max(initial=0))
+        if length == 0:
+            continue
+
+        # One backward pass covers every window ending at end
+        weighted = np.cumsum(weights[:length] *
+                             values[end - length:end][::-1])
+
+        filled = counts > 0
+        means[windows[filled]] = weighted[counts[filled] - 1] / \
+            weight_sums[counts[filled] - 1]
+
+    return means
+
+
+def cumprod_kernel(values: np.ndarray) -> np.ndarray:
+    """
+    :param values: float64 array
+    :return: running product skipping NaN values (NaN on their rows),
+             as pandas Series.cumprod
+    """
+    values = np.ascontiguousarray(values, dtype=np.float64)
+    if _cumprod_jit is not None:
+        return _cumprod_jit(values)
+
+    missing = np.isnan(values)
+    products = np.cumprod(np.where(missing, 1.0, values))
+    products[missing] = np.nan
+
+    return products
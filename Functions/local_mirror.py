@@ -0,0 +1,235 @@
+"""
+
+Local columnar mirror of time_series and time_series_proxy_220122
+
+Every series is stored as two raw column files, Date.bin
+(datetime64[ns]) and Price.bin (float64), and a version file holding
+the number of committed rows, under
+
+    MIRROR_DIR/<table>/<key>/
+
+where key is the quoted Asset Code and Price Type (and Proxy Level for
+the proxy table). Files are opened memory-mapped, so opening a long
+series is O(1) and pages are shared between worker processes through
+the OS page cache.
+
+`sync_mirror` only pulls rows newer than the max date already stored
+for each series and appends them to the column files, O(new rows) per
+sync. Rows become visible in one step when the version file is
+replaced, so readers never pair dates and prices of different syncs,
+and bytes already mapped by a reader are never rewritten (Windows
+refuses to replace a mapped file). Run it as
+
+    python -m Functions.local_mirror [table ...]
+"""
+import os
+
+import sys
+
+import threading
+
+from typing import Tuple, Union
+
+from urllib.parse import quote
+
+import numpy as np
+
+import pandas as pd
+
+from Functions.asset_catalog import CatalogEntry
+
+from Functions.connection_pool import pooled_connection
+
+MIRROR_DIR = os.environ.get(
+    'TS_MIRROR_DIR',
+    os.path.join(os.path.dirname(os.path.dirname(
+        os.path.abspath(__file__))), 'Data', 'mirror'))
+
+# Key columns identifying one series in each mirrored table
+MIRROR_TABLES = {
+    'time_series': ['Asset_code', 'price_type'],
+    'time_series_proxy_220122': ['Asset_Code', 'Price_Type',
+                                 'Proxy_Level'],
+}
+
+# Column files of a series and their dtype
+MIRROR_COLUMNS = {'Date': np.dtype('datetime64[ns]'),
+                  'Price': np.dtype(np.float64)}
+
+# Number of committed rows of a series
+VERSION_FILE = 'version'
+
+# Memory maps by (table, key) with their committed rows
+_maps = {}
+_lock = threading.Lock()
+
+
+def series_dir(key: tuple, table: str = 'time_series') -> str:
+    """
+    :param key: (Asset Code, Price Type[, Proxy Level])
+    :param table: mirrored table name
+    :return: directory holding the column and version files
+    """
+    return os.path.join(MIRROR_DIR, table,
+                        '__'.join(quote(str(k), safe=' ') for k in key))
+
+
+def _committed_rows(path: str) -> Union[int, None]:
+    try:
+        with open(os.path.join(path, VERSION_FILE)) as version_file:
+            return int(version_file.read())
+    except FileNotFoundError:
+        return None
+
+
+def _map_column(path: str, name: str, rows: int) -> np.ndarray:
+    # First rows of a column file, read-only
+    dtype = MIRROR_COLUMNS[name]
+    if rows == 0:
+        return np.empty(0, dtype=dtype)
+
+    return np.memmap(os.path.join(path, name + '.bin'), dtype=dtype,
+                     mode='r', shape=(rows,))
+
+
+def read_mirror(key: tuple, table: str = 'time_series') -> \
+        Tuple[np.ndarray, np.ndarray]:
+    """
+    :param key: (Asset Code, Price Type[, Proxy Level])
+    :param table: mirrored table name
+    :return: read-only memory-mapped (dates, prices)
+    """
+    path = series_dir(key, table)
+    rows = _committed_rows(path)
+    if rows is None:
+        raise ValueError("code or Price Type does not exists in DB")
+
+    # Maps are reused until a sync commits more rows
+    mapped = _maps.get((table, key))
+    if mapped is None or mapped[0] != rows:
+        with _lock:
+            mapped = (rows,) + tuple(_map_column(path, name, rows)
+                                     for name in MIRROR_COLUMNS)
+            _maps[(table, key)] = mapped
+
+    return mapped[1], mapped[2]
+
+
+def mirror_entry(dates: np.ndarray) -> CatalogEntry:
+    """
+    :param dates: sorted Date array of a mirrored series
+    :return: CatalogEntry with min/max date and row count
+    """
+    return CatalogEntry(pd.Timestamp(dates[0]), pd.Timestamp(dates[-1]),
+                        len(dates))
+
+
+def _append_mirror(key: tuple, table: str, dates: np.ndarray,
+                   prices: np.ndarray):
+    # Append after the committed rows (dropping what an interrupted
+    # sync left behind), then commit them by replacing the version file
+    path = series_dir(key, table)
+    rows = _committed_rows(path) or 0
+
+    # This process' maps are released before the files grow
+    with _lock:
+        _maps.pop((table, key), None)
+
+    os.makedirs(path, exist_ok=True)
+    for name, values in (('Date', dates), ('Price', prices)):
+        file_name = os.path.join(path, name + '.bin')
+        with open(file_name, 'r+b' if os.path.exists(file_name)
+                  else 'wb') as column_file:
+            column_file.seek(rows * MIRROR_COLUMNS[name].itemsize)
+            column_file.write(np.ascontiguousarray(
+                values, dtype=MIRROR_COLUMNS[name]).tobytes())
+            column_file.truncate()
+
+    tmp_file = os.path.join(path, VERSION_FILE + '.tmp')
+    with open(tmp_file, 'w') as version_file:
+        version_file.write(str(rows + len(dates)))
+    os.replace(tmp_file, os.path.join(path, VERSION_FILE))
+
+
+def _stored_max_date(key: tuple, table: str) -> Union[np.datetime64,
+                                                      None]:
+    try:
+        dates, _ = read_mirror(key, table)
+    except ValueError:
+        return None
+
+    return dates[-1] if len(dates) else None
+
+
+def _key_value(value):
+    # Plain Python value of a key column, integral floats (Proxy Level
+    # of a column holding NULLs) as int, NULL as None
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return None
+    if isinstance(value, (np.integer, np.floating)):
+        value = value.item()
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+
+    return value
+
+
+def sync_mirror(table: str = 'time_series') -> dict:
+    """
+    Pull rows newer than the stored max date of every series.
+
+    :param table: table to mirror, one of MIRROR_TABLES
+    :return: dict of key to number of rows appended
+    """
+    if table not in MIRROR_TABLES:
+        raise ValueError('ERROR: Table is not mirrored ' + table)
+
+    key_columns = MIRROR_TABLES[table]
+    key_sql = ', '.join(key_columns)
+
+    appended = {}
+    with pooled_connection() as conn:
+        max_dates_sql = f''' SELECT {key_sql}, MAX(Date) max_date
+                             FROM {table}
+                             GROUP BY {key_sql} '''
+        df_max = pd.read_sql(max_dates_sql, conn)
+        df_max['max_date'] = pd.to_datetime(df_max['max_date'])
+
+        for row in df_max.itertuples(index=False):
+            key = tuple(_key_value(value) for value in row[:-1])
+            stored_max = _stored_max_date(key, table)
+            if stored_max is not None and \
+                    stored_max >= np.datetime64(row.max_date, 'ns'):
+                continue
+
+            # Key values and date are bound as parameters
+            where_sql = ' and '.join(
+                f'{column} IS NULL' if value is None else f'{column} = ?'
+                for column, value in zip(key_columns, key))
+            params = [value for value in key if value is not None]
+            if stored_max is not None:
+                where_sql += ' and Date > ?'
+                params.append(f'{pd.Timestamp(stored_max):%Y-%m-%d}')
+
+            read_data_sql = f''' SELECT Date, Price
+                                FROM {table}
+                                WHERE {where_sql}
+                                ORDER BY Date ASC '''
+            data_frame = pd.read_sql(read_data_sql, conn, params=params)
+
+            dates = pd.to_datetime(data_frame['Date'],
+                                   format='%Y-%m-%d') \
+                .to_numpy(dtype='datetime64[ns]')
+            prices = data_frame['Price'].to_numpy(dtype=np.float64)
+
+            _append_mirror(key, table, dates, prices)
+            appended[key] = data_frame.shape[0]
+
+    return appended
+
+
+if __name__ == '__main__':
+    for table_name in sys.argv[1:] or list(MIRROR_TABLES):
+        rows = sync_mirror(table_name)
+        print(f'{table_name}: {len(rows)} series updated, '
+              f'{sum(rows.values())} rows appended')
@@ -16,10 +16,10 @@ Function Inputs:
 - Asset Code - STRING
 - Price Type - STRING
 - Period Start - [DATE or STRING] - Can be exact date ;
-                 an offset D/W/M/Y from Period End Date;
+                 an offset D/W/M/Q/Y from Period End Date;
                  or Inception(ie starting Oldest Price Date)
 - Period End - [DATE or STRING] - optional. Defaults to Latest Price
-               Date. Can be exact date or as an offset D/W/M/Y
+               Date. Can be exact date or as an offset D/W/M/Q/Y
                from Latest Price Date
 - Rank - [INT]
 
@@ -43,8 +43,12 @@ Comments:
 
 - Period Start/Period End/Rank accept arrays, so multiple drawdowns
     can be calculated/returned at once
+- `get_max_drawdown` answers Rank 1 of a period from a range table
+    kept with the series, `rolling_drawdowns` the worst drawdown
+    within every trailing window (e.g. 1Y) of the series and
+    `underwater_curve` the drawdown of every date in chunks of arrays
 """
-import re
+from collections import namedtuple
 
 from typing import Union
 
@@ -52,141 +56,93 @@ import pandas as pd
 
 import numpy as np
 
-from dateutil.parser import parse
+from Functions.date_parser import date_index, resolve_dates
 
-from dateutil.relativedelta import relativedelta
+from Functions.drawdown_engine import TOP_COUNT, UNDERWATER_CHUNK, \
+    DrawdownArrays, DrawdownTable, drawdown_range_table, \
+    drawdown_recoveries, drawdown_table, rolling_max_drawdowns, \
+    top_episodes, underwater_chunks, window_max_drawdown
 
-from db_connection import create_connection
+from Functions.series_cache import frame_extra
 
+from Functions.data_reader import read_data, read_data_window, \
+    read_frames_many
 
-def parse_dates(period_start: str, period_end: Union[str, None],
-                data_frame: pd.DataFrame) -> Union[pd.Timestamp,
-                                                   str]:
-    """
-
-    :param period_start: Date String
-    :param period_end: Date String
-    :param data_frame: Pandas DataFrame
-    :return: Pandas Timestamp
-    """
-
-    # allowed offsets D: Daily, M: Monthly, W: Weekly, Y: Yearly
-    offset_chars = set('DWMY')
-
-    # Parse and deal with Period End Date as Period Start
-    # depends on Period End
-    try:
-        if period_end == 'Latest':
-            end_date = data_frame.Date.max()
-        elif any((c in offset_chars) for c in period_end):
-            end_date = data_frame.Date.max()
-            value = int(re.findall(r'\d+', period_end)[0])
-            if 'D' in period_end:
-                end_date = end_date - relativedelta(days=value)
-            elif 'W' in period_end:
-                end_date = end_date - relativedelta(weeks=value)
-            elif 'M' in period_end:
-                end_date = end_date - relativedelta(months=value)
-            else:
-                end_date = end_date - relativedelta(years=value)
-        else:
-            end_date = pd.Timestamp(parse(period_end, fuzzy=False))
-
-    except (Exception,):
-        start_date = 'ERROR: Period End date is not correct'
-        end_date = 'ERROR: Period End date is not correct'
-        return start_date, end_date
-
-    # check if price on end date exists else use last available price
-    if end_date not in data_frame.Date.values:
-        if max(data_frame.Date.values) < end_date:
-            start_date = 'ERROR: No data found on or after end date'
-            end_date = 'ERROR: No data found on or after end date'
-            return start_date, end_date
-        else:
-            end_date = data_frame.loc[data_frame['Date'] <= end_date,
-                                      'Date'].max()
-
-    # Parse and deal with Period Start Date
-    try:
-        if period_start == 'Inception':
-            start_date = data_frame.Date.min()
-        elif any((c in offset_chars) for c in period_start):
-            start_date = end_date
-            value = int(re.findall(r'\d+', period_start)[0])
-            if 'D' in period_start:
-                start_date = start_date - relativedelta(days=value)
-            elif 'W' in period_start:
-                start_date = start_date - relativedelta(weeks=value)
-            elif 'M' in period_start:
-                start_date = start_date - relativedelta(months=value)
-            else:
-                start_date = start_date - relativedelta(years=value)
-        else:
-            start_date = pd.Timestamp(parse(period_start, fuzzy=False))
-
-    except (Exception,):
-        start_date = 'ERROR: Period Start date is not correct'
-        end_date = 'ERROR: Period Start date is not correct'
-        return start_date, end_date
-
-    # check if price on start date exists else use previous available
-    # price
-    if start_date not in data_frame.Date.values:
-        start_date = data_frame.loc[data_frame['Date']
-                                    <= start_date, 'Date'].max()
+from Functions.mvn_rolling_analytics import rolling_windows
 
-    return start_date, end_date
+# Underwater curve of the dates: drawdown, trading days since the peak
+# and episode number (see Functions/drawdown_engine.py)
+UnderwaterChunk = namedtuple('UnderwaterChunk',
+                             ['dates', 'drawdown', 'duration',
+                              'episode'])
 
 
-def read_data(code: str, price_type: str) -> pd.DataFrame:
+def _drawdown_table(main_df: pd.DataFrame, first: int,
+                    tables: dict) -> DrawdownTable:
     """
-    :param code: Asset Code String
-    :param price_type: Price Type String
-    :return: Pandas DataFrame
+    :param main_df: Pandas DataFrame
+    :param first: first row (Period Start)
+    :param tables: DrawdownTable already built for the frame by first
+                   row, updated
+    :return: DrawdownTable of the rows from first to the latest date
     """
+    if first not in tables:
+        # Kept with the series for Inception, built per request else
+        table, offset = frame_extra(main_df, 'drawdown_table',
+                                    drawdown_table)
+        if offset + first != 0:
+            table = drawdown_table(
+                main_df['Price'].to_numpy(dtype=np.float64)[first:])
+        tables[first] = table
 
-    # Create Connection with DB
-    conn = create_connection()
+    return tables[first]
 
-    # Get available codes and PriceType from db
-    sql_distinct_code = ''' SELECT DISTINCT(CONCAT(Asset_code, ' - ',
-    price_type)) [code] FROM time_series'''
 
-    df_distinct_code = pd.read_sql(sql_distinct_code, conn)
+def _rank_by_sort(arrays: DrawdownArrays, end: int,
+                  rank: int) -> Union[tuple, None]:
+    """
+    :param arrays: DrawdownArrays of the rows from Period Start
+    :param end: last row (Period End)
+    :param rank: Rank of drawdown
+    :return: (peak row, trough row, drawdown) of the rank-th deepest
+             drawdown sorting all rows, None if the rank is not found
+    """
+    main_df = pd.DataFrame({'Drawdown': arrays.drawdown[:end + 1],
+                            'Previous_Peak_index':
+                                arrays.peak_pos[:end + 1],
+                            'Row': np.arange(max(end + 1, 0))})
 
-    # Check if passed code and PriceType is available in DB
-    if code + ' - ' + price_type in df_distinct_code.code.values:
-        # Read data for specific code and Price. Return resulting
-        # dataframe
+    # Sort Values based on Drawdown to out desried rank
+    main_df = main_df.sort_values('Drawdown').drop_duplicates(
+        'Previous_Peak_index')
 
-        read_data_sql = f''' SELECT Date, Price
-                            FROM time_series
-                            WHERE Asset_code = '{code}'
-                            and price_type = '{price_type}'
-                            ORDER BY Date ASC  '''
-        data_frame = pd.read_sql(read_data_sql, conn)
-        data_frame['Date'] = pd.to_datetime(data_frame['Date'],
-                                            format='%Y-%m-%d')
-        # return df
+    # Remove results where draw down in 0 or NaN
+    main_df = main_df[~(main_df.Drawdown >= 0) &
+                      ~(main_df.Drawdown.isna())]
 
-    # Raise error if not available
-    else:
-        raise ValueError("code or Price Type does not exists in DB")
+    if rank > main_df.shape[0]:
+        return None
 
-    return data_frame
+    main_df = main_df.iloc[:rank, :][-1:]
+    return (main_df['Previous_Peak_index'].values[0],
+            main_df['Row'].values[0], main_df['Drawdown'].values[0])
 
 
 def get_historical_drawdowns(main_df: pd.DataFrame,
                              period_start: Union[str, None],
                              period_end: Union[str, None],
-                             rank: Union[int, None]) -> \
+                             rank: Union[int, None],
+                             tables: Union[dict, None] = None) -> \
         Union[np.datetime64, float, int, str]:
     """
     :param main_df: Pandas DataFrame
     :param period_start: Date str
     :param period_end: Date str
     :param rank: Rank of drawdown
+    :param tables: DrawdownTable by first row, RecoveryDays by
+                   ('recovery', first row) and TopEpisodes by
+                   (first row, end row) shared by the calls of one
+                   request
     :return:
     """
     # Return error when start date is None
@@ -202,8 +158,8 @@ def get_historical_drawdowns(main_df: pd.DataFrame,
     rank = 1 if rank is None else rank
 
     # main_df = read_data(code, price_type)
-    start_date, end_date = parse_dates(period_start, period_end,
-                                       main_df)
+    resolved = resolve_dates(period_start, period_end, main_df)
+    start_date = resolved.start_date
 
     if isinstance(start_date, str):
         drawdown_start = drawdown_end = drawdown_performance = \
@@ -218,137 +174,154 @@ def get_historical_drawdowns(main_df: pd.DataFrame,
         return drawdown_start, drawdown_end, \
                drawdown_performance, recovery_days
 
-    if isinstance(start_date, str):
-        drawdown_start = drawdown_end = drawdown_performance = \
-            recovery_days = end_date
-        return drawdown_start, drawdown_end, \
-               drawdown_performance, recovery_days
-
-    # Set date as df index
-    main_df = main_df.set_index('Date')
-
-    # Filter out all data after start_date as Recovery days
-    # is not bound by Period End
-    main_df = main_df[main_df.index >= start_date]
-
-    # Compute returns for Price time series
-    main_df['Returns'] = main_df['Price'].pct_change()
-
-    # Compute cumulative returns using Returns
-    main_df['Cum_Returns'] = (1 + main_df['Returns']).cumprod()
-
-    # Generate column Previous Peak to identify last peak
-    # (highest cumulative returns) from current data point.
-    main_df['Previous_Peak'] = main_df['Cum_Returns'].cummax()
-
-    # Calculate Drawdown
-    main_df['Drawdown'] = (main_df['Cum_Returns'] /
-                           main_df['Previous_Peak']) - 1.0
-
-    # Returns df with cumulative maximum applied on Cum_Returns
-    # along with Dates to find Date on which Previous Peak occurred.
-    df_cum = pd.DataFrame(
-        pd.concat([main_df.Cum_Returns, main_df.index.to_series()],
-                  axis=1)
-            .agg(tuple, axis=1)
-            .cummax()
-            .to_list(),
-        columns=["Previous_Peak", "Previous_Peak_index"],
-    )
-
-    # Previous Peak index replaced with NaT where Previous_Peak is NaN
-    df_cum[df_cum.isna().any(axis=1)] = np.nan
-
-    # Creates a group by object on Previous_Peak_index agg as list and
-    # results are shift to find the upcoming Previous
-    # Peak index (i.e. Next_PP_index) '''
-    df_grouped = (
-        df_cum.groupby("Previous_Peak_index")["Previous_Peak_index"]
-            .agg(list)
-            .str[0]
-            .shift(-1)
-    )
-
-    # With df_cum containing Previous_Peak_index apply left join
-    # with df_grouped a group by object containing Next_PP_index.
-    # Use Previous_Peak_index as a key to join from left frame
-    # Use index from df_grouped as key to perform left join.
-    # Rename columns as Previous_Peak_index and Next_PP_index
-    # respectively.
-    df_cum = df_cum.merge(
-        df_grouped, left_on="Previous_Peak_index", right_index=True,
-        how="left"
-    ).rename(
-        columns={
-            "Previous_Peak_index_x": "Previous_Peak_index",
-            "Previous_Peak_index_y": "Next_PP_index",
-        }
-    )
-
-    # Create column for Previous_Peak_index & Next_PP_index in actual
-    # df - Used for further calculations.
-    # Replaced Previous_Peak value.
-    main_df[["Previous_Peak", "Previous_Peak_index",
-             "Next_PP_index"]] = df_cum.values
-
-    # Create Column for Price on Previous Peak
-    main_df['PP_Price'] = \
-        main_df.join(main_df.drop('Previous_Peak_index', axis=1),
-                     on='Previous_Peak_index',
-                     rsuffix='_y')['Price_y'].values
-
-    # Calculate recovery days in case data is NA Recovery_Days = -1
-    main_df['Recovery_Days'] = np.where(
-        pd.isna(main_df['Next_PP_index']),
-        -1,
-        (main_df['Next_PP_index'] - main_df.index).dt.days)
-
-    # Filter out up to end_date to generate stats.
-    main_df = main_df[
-        (main_df.index >= start_date) & (main_df.index <= end_date)]
-
-    # Sort Values based on Drawdown to out desried rank
-    main_df = main_df.sort_values('Drawdown').drop_duplicates(
-        'Previous_Peak_index')
-
-    # Remove results where draw down in 0 or NaN
-    main_df = main_df[~(main_df.Drawdown >= 0) &
-                      ~(main_df.Drawdown.isna())]
+    # Rows from start_date up to the latest date as Recovery days
+    # are not bound by Period End
+    first = resolved.lo
+    dates = main_df['Date'].to_numpy()[first:]
+
+    # Drawdowns and episodes of the rows from the drawdown engine
+    tables = {} if tables is None else tables
+    table = _drawdown_table(main_df, first, tables)
+
+    # Last row up to end_date to generate stats.
+    end = resolved.hi - 1 - first
+
+    # Rank from the deepest episodes of the window, one selection
+    # shared by the ranks of the periods with the same start and end,
+    # unless tied drawdowns make it depend on the sort order
+    if isinstance(rank, (int, np.integer)) and rank >= 1:
+        top = tables.get((first, end))
+        if top is None or len(top.depth) < rank <= top.total:
+            top = tables[(first, end)] = top_episodes(
+                table, end, max(rank, TOP_COUNT))
+
+        if rank > top.total:
+            ranked = None
+        elif top.exact[rank - 1]:
+            ranked = (top.peak_pos[rank - 1], top.trough_pos[rank - 1],
+                      top.depth[rank - 1])
+        else:
+            ranked = _rank_by_sort(table.arrays, end, rank)
+    else:
+        ranked = _rank_by_sort(table.arrays, end, rank)
 
     # Check if rank is within available limits else throw exception
-    if rank <= main_df.shape[0]:
-        main_df = main_df.iloc[:rank, :][-1:]
-    else:
+    if ranked is None:
         drawdown_start = drawdown_end = drawdown_performance = \
             recovery_days = "ERROR: Required rank not found"
 
         return drawdown_start, drawdown_end, drawdown_performance, \
                recovery_days
 
+    peak, trough, depth = ranked[:3]
+
     # Function output in desired format.
-    drawdown_start = main_df['Previous_Peak_index'].values[0].astype(
-        'M8[D]')
-    drawdown_end = main_df.index.values[0].astype('M8[D]')
-    drawdown_performance = (np.round(main_df['Drawdown'].values, 6))[0]
-    recovery_days = (main_df['Recovery_Days'].values.astype(int))[0]
+    drawdown_start = dates[peak].astype('M8[D]')
+    drawdown_end = dates[trough].astype('M8[D]')
+    drawdown_performance = np.round(depth, 6)
+
+    # Calculate recovery days in case data is NA Recovery_Days = -1,
+    # for all rows once per Period Start
+    recovery = tables.get(('recovery', first))
+    if recovery is None:
+        recovery = tables[('recovery', first)] = drawdown_recoveries(
+            table.arrays, dates)
+    recovery_days = np.int64(recovery.calendar[trough])
 
     return drawdown_start, drawdown_end, drawdown_performance, \
            recovery_days
 
 
-def historical_drawdowns(asset_code: str, price_type: str,
+def get_max_drawdown(main_df: pd.DataFrame,
+                     period_start: Union[str, None],
+                     period_end: Union[str, None]) -> \
+        Union[np.datetime64, float, str]:
+    """
+    Deepest drawdown of a period from the range table kept with the
+    series, O(log n) per period instead of a pass over its rows. Same
+    result as the first three outputs of `get_historical_drawdowns` for
+    rank 1, which is used when near ties make the table ambiguous.
+
+    :param main_df: Pandas DataFrame
+    :param period_start: Date str
+    :param period_end: Date str
+    :return: Drawdown Start, Drawdown End, Drawdown Performance
+    """
+    # Return error when start date is None
+    if period_start is None:
+        drawdown_start = drawdown_end = drawdown_performance = \
+            "ERROR: Start Date is required"
+        return drawdown_start, drawdown_end, drawdown_performance
+
+    period_end = 'Latest' if period_end is None else period_end
+    resolved = resolve_dates(period_start, period_end, main_df)
+    start_date = resolved.start_date
+
+    if isinstance(start_date, str):
+        drawdown_start = drawdown_end = drawdown_performance = \
+            start_date
+        return drawdown_start, drawdown_end, drawdown_performance
+
+    if pd.isnull(start_date):
+        drawdown_start = drawdown_end = drawdown_performance = \
+            "ERROR: No data found prior to start date"
+        return drawdown_start, drawdown_end, drawdown_performance
+
+    # Period Start row has no return, the drawdowns start on the next
+    dates = main_df['Date'].to_numpy()
+    first, last = resolved.lo, resolved.hi - 1
+
+    table, offset = frame_extra(main_df, 'drawdown_range_table',
+                                drawdown_range_table)
+    ranked = window_max_drawdown(table, offset + first + 1,
+                                 offset + last + 1)
+
+    if ranked is None:
+        drawdown_start = drawdown_end = drawdown_performance = \
+            "ERROR: Required rank not found"
+        return drawdown_start, drawdown_end, drawdown_performance
+
+    if not ranked.exact:
+        return get_historical_drawdowns(main_df, period_start,
+                                        period_end, 1)[:3]
+
+    # Function output in desired format.
+    drawdown_start = dates[ranked.peak_pos - offset].astype('M8[D]')
+    drawdown_end = dates[ranked.trough_pos - offset].astype('M8[D]')
+    drawdown_performance = np.round(ranked.depth, 6)
+
+    return drawdown_start, drawdown_end, drawdown_performance
+
+
+def historical_drawdowns(asset_code: Union[str, list],
+                         price_type: Union[str, list],
                          period_start: list,
                          period_end: list,
-                         rank) -> dict:
+                         rank,
+                         main_df: Union[pd.DataFrame, None] = None
+                         ) -> dict:
     """
-    :param asset_code: Asset Code str
-    :param price_type: Price Type str
+    :param asset_code: Asset Code str or list of Asset Code
+    :param price_type: Price Type str (or list, one per Asset Code)
     :param period_start: Period Start str
     :param period_end: Period End str
     :param rank: Required Rank int
-    :return:
+    :param main_df: Pandas DataFrame already read for the asset
+    :return: result dict, or dict of result dicts keyed by
+             'Asset Code - Price Type' when a list is passed
     """
-    main_df = read_data(asset_code, price_type)
+    # Evaluate a list of assets from a single bulk read
+    if isinstance(asset_code, list):
+        return {key: historical_drawdowns(code, pt, period_start,
+                                          period_end, rank, main_df=df)
+                for key, (code, pt, df) in
+                read_frames_many(asset_code, price_type).items()}
+
+    # Only data from the earliest start is read, recovery days need
+    # everything up to the latest date
+    if main_df is None:
+        main_df = read_data_window(asset_code, price_type, period_start,
+                                   period_end, to_latest=True)
 
     list_it = iter([period_start, period_end, rank])
     list_lens = len(next(list_it))
@@ -356,6 +329,10 @@ def historical_drawdowns(asset_code: str, price_type: str,
         raise ValueError('ERROR: Ensure all passed list are '
                          'of same length!')
 
+    # Episode tables and selections shared by the periods with the
+    # same start (and end)
+    tables = {}
+
     drawdown_start_list = []
     drawdown_end_list = []
     drawdown_performance_list = []
@@ -367,7 +344,7 @@ def historical_drawdowns(asset_code: str, price_type: str,
             recovery_days = get_historical_drawdowns(main_df,
                                                      start_date,
                                                      end_date,
-                                                     rank_val)
+                                                     rank_val, tables)
             drawdown_start_list.append(drawdown_start)
             drawdown_end_list.append(drawdown_end)
             drawdown_performance_list.append(drawdown_performance)
@@ -385,3 +362,148 @@ def historical_drawdowns(asset_code: str, price_type: str,
                    'recovery_days': recovery_days_list}
 
     return result_dict
+
+
+def get_rolling_drawdowns(main_df: pd.DataFrame, window: str,
+                          step: int) -> pd.DataFrame:
+    """
+    :param main_df: Pandas DataFrame sorted by Date
+    :param window: window tenor e.g. '1Y'
+    :param step: rows between two window ends
+    :return: Pandas DataFrame, one row per window end Date
+    """
+    # Windows as in the rolling analytics, Period Start of each window
+    # is the last row on or before its end date - window
+    dates = main_df['Date'].to_numpy()
+    first, end = rolling_windows(date_index(main_df), window, step)
+
+    # Drawdowns start on the row after Period Start, the block scans
+    # keep memory O(n) where the sparse table of `get_max_drawdown`
+    # takes O(n log n)
+    peak, trough, depth = rolling_max_drawdowns(
+        main_df['Price'].to_numpy(dtype=np.float64), first + 1, end)
+
+    # NaT and NaN for windows without a drawdown
+    drawdown = peak >= 0
+    drawdown_start = np.full(len(first), np.datetime64('NaT'),
+                             dtype='M8[ns]')
+    drawdown_end = drawdown_start.copy()
+    drawdown_start[drawdown] = dates[peak[drawdown]]
+    drawdown_end[drawdown] = dates[trough[drawdown]]
+
+    return pd.DataFrame({'Date': dates[end - 1],
+                         'Start Date': dates[first],
+                         'Drawdown Start': drawdown_start,
+                         'Drawdown End': drawdown_end,
+                         'Drawdown Performance': np.round(depth, 6)})
+
+
+def rolling_drawdowns(asset_code: Union[str, list],
+                      price_type: Union[str, list],
+                      window: str = '1Y', step: int = 1,
+                      main_df: Union[pd.DataFrame, None] = None
+                      ) -> Union[pd.DataFrame, dict]:
+    """
+    Worst drawdown within every trailing window of a series, e.g. the
+    1Y maximum drawdown on every date since inception, instead of one
+    `get_historical_drawdowns` call per date. Equally deep drawdowns
+    resolve to the earliest trough, where `get_historical_drawdowns`
+    follows its sort order.
+
+    :param asset_code: Asset Code str or list of Asset Code
+    :param price_type: Price Type str (or list, one per Asset Code)
+    :param window: window tenor e.g. '1Y', as Period Start tenors
+    :param step: rows between two window ends, 1 for every date
+    :param main_df: Pandas DataFrame already read for the asset
+    :return: Pandas DataFrame with Date, Start Date, Drawdown Start,
+             Drawdown End and Drawdown Performance per window end, or
+             dict of them keyed by 'Asset Code - Price Type' when a
+             list is passed
+    """
+    # Evaluate a list of assets from a single bulk read
+    if isinstance(asset_code, list):
+        return {key: rolling_drawdowns(code, pt, window, step,
+                                       main_df=df)
+                for key, (code, pt, df) in
+                read_frames_many(asset_code, price_type).items()}
+
+    # read data, rolling windows cover the whole history
+    if main_df is None:
+        main_df = read_data(asset_code, price_type)
+
+    return get_rolling_drawdowns(main_df, window, step)
+
+
+def get_underwater_curve(main_df: pd.DataFrame,
+                         period_start: Union[str, None],
+                         period_end: Union[str, None],
+                         chunk_size: int = UNDERWATER_CHUNK,
+                         compact: bool = False):
+    """
+    :param main_df: Pandas DataFrame
+    :param period_start: Date str
+    :param period_end: Date str
+    :param chunk_size: rows per chunk
+    :param compact: float32 / int32 arrays instead of float64 / int64
+    :return: generator of UnderwaterChunk from Period Start to Period
+             End, oldest first
+    """
+    # Period checked before the first chunk is asked for
+    if period_start is None:
+        raise ValueError('ERROR: Start Date is required')
+
+    period_end = 'Latest' if period_end is None else period_end
+    resolved = resolve_dates(period_start, period_end, main_df)
+
+    if isinstance(resolved.start_date, str):
+        raise ValueError(resolved.start_date)
+
+    if pd.isnull(resolved.start_date):
+        raise ValueError('ERROR: No data found prior to start date')
+
+    first, stop = resolved.lo, resolved.hi
+    prices = main_df['Price'].to_numpy(dtype=np.float64)[first:stop]
+    dates = main_df['Date'].to_numpy()[first:stop]
+
+    return (UnderwaterChunk(dates[chunk.start:
+                                  chunk.start + len(chunk.drawdown)],
+                            chunk.drawdown, chunk.duration, chunk.episode)
+            for chunk in underwater_chunks(prices, chunk_size, compact))
+
+
+def underwater_curve(asset_code: Union[str, list],
+                     price_type: Union[str, list],
+                     period_start: str = 'Inception',
+                     period_end: Union[str, None] = None,
+                     chunk_size: int = UNDERWATER_CHUNK,
+                     compact: bool = False,
+                     main_df: Union[pd.DataFrame, None] = None):
+    """
+    Drawdown of every date (underwater curve), trading days under water
+    and episode number, in chunks of arrays so long histories can be
+    written to a file or chart without a frame per row.
+
+    :param asset_code: Asset Code str or list of Asset Code
+    :param price_type: Price Type str (or list, one per Asset Code)
+    :param period_start: Period Start str
+    :param period_end: Period End str
+    :param chunk_size: rows per chunk
+    :param compact: float32 / int32 arrays instead of float64 / int64
+    :param main_df: Pandas DataFrame already read for the asset
+    :return: generator of UnderwaterChunk, or dict of them keyed by
+             'Asset Code - Price Type' when a list is passed
+    """
+    # Evaluate a list of assets from a single bulk read
+    if isinstance(asset_code, list):
+        return {key: underwater_curve(code, pt, period_start, period_end,
+                                      chunk_size, compact, main_df=df)
+                for key, (code, pt, df) in
+                read_frames_many(asset_code, price_type).items()}
+
+    # read data, the curve is bound by Period End
+    if main_df is None:
+        main_df = read_data_window(asset_code, price_type,
+                                   [period_start], [period_end])
+
+    return get_underwater_curve(main_df, period_start, period_end,
+                                chunk_size, compact)
@@ -48,9 +48,10 @@ import pandas as pd
 
 import numpy as np
 
-from Functions.date_parser import parse_dates
+from Functions.date_parser import BatchDates, resolve_batch, \
+    resolve_dates
 
-from Functions.data_reader import read_data
+from Functions.data_reader import read_data_window, read_frames_many
 
 from Functions.normalization_parser import parse_frequency
 
@@ -59,7 +60,8 @@ def get_historical_returns(main_df: pd.DataFrame,
                            period_start: Union[str],
                            period_end: Union[str, None],
                            norm_freq: Union[str, None],
-                           comp_freq: Union[str, None]):
+                           comp_freq: Union[str, None],
+                           resolved: Union[tuple, None] = None):
     # Return error when start date is None
     if period_start is None:
         rate_of_return = "ERROR: Start Date is required"
@@ -70,8 +72,9 @@ def get_historical_returns(main_df: pd.DataFrame,
     # comp_freq = '1Y' if comp_freq is None else comp_freq
 
     # Get parsed start and end dates
-    start_date, end_date = parse_dates(period_start, period_end,
-                                       main_df)
+    start_date, end_date, lo, hi = resolve_dates(
+        period_start, period_end, main_df) if resolved is None \
+        else resolved
 
     if isinstance(start_date, str):
         rate_of_return = start_date
@@ -89,9 +92,7 @@ def get_historical_returns(main_df: pd.DataFrame,
         return rate_of_return
 
     # Filter data
-    main_df = main_df.set_index('Date')
-    main_df = main_df[(main_df.index >= start_date) &
-                      (main_df.index <= end_date)]
+    main_df = main_df.iloc[lo:hi].set_index('Date')
 
     # days diff between start and end date
     days_diff = (end_date - start_date).days
@@ -108,28 +109,133 @@ def get_historical_returns(main_df: pd.DataFrame,
     return rate_of_return
 
 
-def historical_returns(asset_code: str, price_type: str,
+def window_returns(prices: np.ndarray, first: np.ndarray,
+                   last: np.ndarray, days_diff: np.ndarray,
+                   norm_days: Union[float, None],
+                   comp_days: Union[float, None]) -> np.ndarray:
+    """
+    :param prices: Price array of a series
+    :param first: first row of each window
+    :param last: last row of each window
+    :param days_diff: days between the first and last row dates
+    :param norm_days: normalisation days, None for the plain return
+    :param comp_days: compounding days
+    :return: rate of return of every window (NaN where a normalised
+             window spans no days)
+    """
+    growth = prices[last] / prices[first]
+    with np.errstate(all='ignore'):
+        if norm_days is None:
+            rate_of_return = growth - 1
+        else:
+            rate_of_return = ((growth ** (comp_days / days_diff) - 1)
+                              * (norm_days / comp_days))
+            rate_of_return = np.where(days_diff != 0, rate_of_return,
+                                      np.nan)
+
+    return np.round(rate_of_return, 6)
+
+
+def get_historical_returns_many(main_df: pd.DataFrame,
+                                period_start: list,
+                                period_end: list,
+                                norm_freq: Union[str, None],
+                                comp_freq: Union[str, None],
+                                batch: Union[BatchDates, None] = None
+                                ) -> list:
+    """
+    `get_historical_returns` for every period pair at once. Windows are
+    resolved in one batch and the rates of return are computed for all
+    windows in one expression over the price array.
+
+    :param main_df: Pandas DataFrame sorted by Date
+    :param period_start: list of Period Start
+    :param period_end: list of Period End
+    :param norm_freq: Normalisation frequency
+    :param comp_freq: Compounding frequency
+    :param batch: `resolve_batch` of the pairs, resolved when not passed
+    :return: list of rate of return, error string or None per pair
+    """
+    batch = resolve_batch(period_start, period_end, main_df) \
+        if batch is None else batch
+
+    # Get parsed days for normalisation and compounding frequency
+    norm_days, comp_days = parse_frequency(norm_freq, comp_freq)
+
+    prices = main_df['Price'].to_numpy(dtype=np.float64)
+
+    # Windows with rows to compute on, the rest return None
+    valid = (batch.error == None) & (batch.hi > batch.lo)  # noqa: E711
+    first = np.where(valid, batch.lo, 0)
+    last = np.where(valid, batch.hi - 1, 0)
+
+    # days diff between start and end date
+    days_diff = (batch.end_date - batch.start_date) \
+        .astype('timedelta64[D]').astype(np.int64)
+
+    rate_of_return = np.full(len(period_start), np.nan)
+    if valid.any() and not isinstance(norm_days, str):
+        if norm_days is not None:
+            valid &= days_diff != 0
+        rate_of_return = window_returns(prices, first, last, days_diff,
+                                        norm_days, comp_days)
+
+    rate_of_return_list = []
+    for i, start_date in enumerate(period_start):
+        if start_date is None:
+            rate_of_return_list.append("ERROR: Start Date is required")
+        elif batch.error[i] is not None:
+            rate_of_return_list.append(batch.error[i])
+        elif np.isnat(batch.start_date[i]):
+            rate_of_return_list.append(
+                "ERROR: No data found prior to start date")
+        elif isinstance(norm_days, str) and norm_days != 'NA':
+            rate_of_return_list.append(norm_days)
+        elif not valid[i]:
+            rate_of_return_list.append(None)
+        else:
+            rate_of_return_list.append(rate_of_return[i])
+
+    return rate_of_return_list
+
+
+def historical_returns(asset_code: Union[str, list],
+                       price_type: Union[str, list],
                        currency: str, period_start: list,
                        period_end: list,
                        normalisation_freq: Union[None, str] = '1Y',
-                       compounding_freq: str = '1Y'
+                       compounding_freq: str = '1Y',
+                       main_df: Union[pd.DataFrame, None] = None
                        ) -> dict:
     """
     :param currency:
     :param normalisation_freq:
     :param compounding_freq:
-    :param asset_code: Asset Code str
-    :param price_type: Price Type str
+    :param asset_code: Asset Code str or list of Asset Code
+    :param price_type: Price Type str (or list, one per Asset Code)
     :param period_start: Period Start str
     :param period_end: Period End str
-    :return:
+    :param main_df: Pandas DataFrame already read for the asset
+    :return: result dict, or dict of result dicts keyed by
+             'Asset Code - Price Type' when a list is passed
     """
     # NotImplementedError for currency (will be removed later)
     if currency is not None:
         raise NotImplementedError('ERROR: Currency is not supported')
 
-    # read data
-    main_df = read_data(asset_code, price_type)
+    # Evaluate a list of assets from a single bulk read
+    if isinstance(asset_code, list):
+        return {key: historical_returns(code, pt, currency,
+                                        period_start, period_end,
+                                        normalisation_freq,
+                                        compounding_freq, main_df=df)
+                for key, (code, pt, df) in
+                read_frames_many(asset_code, price_type).items()}
+
+    # read data. Only the date window needed by the periods is read
+    if main_df is None:
+        main_df = read_data_window(asset_code, price_type, period_start,
+                                   period_end)
 
     list_it = iter([period_start, period_end])
     list_lens = len(next(list_it))
@@ -137,18 +243,12 @@ def historical_returns(asset_code: str, price_type: str,
         raise ValueError('ERROR: Ensure all passed list are '
                          'of same length!')
 
-    rate_of_return_list = []
-    for start_date, end_date in zip(period_start, period_end):
-        try:
-            rate_of_return = get_historical_returns(main_df,
-                                                    start_date,
-                                                    end_date,
-                                                    normalisation_freq,
-                                                    compounding_freq)
-            rate_of_return_list.append(rate_of_return)
-
-        except (Exception,):
-            rate_of_return_list.append(None)
+    # All windows are computed in one pass over the price array
+    rate_of_return_list = get_historical_returns_many(main_df,
+                                                      period_start,
+                                                      period_end,
+                                                      normalisation_freq,
+                                                      compounding_freq)
 
     result_dict = {'rate_of_return': rate_of_return_list}
 
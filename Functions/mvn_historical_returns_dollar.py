@@ -3,7 +3,8 @@ from typing import Union
 from Functions.mvn_historical_returns import historical_returns
 
 
-def historical_returns_dollar(asset_code: str, price_type: str,
+def historical_returns_dollar(asset_code: Union[str, list],
+                              price_type: Union[str, list],
                               currency: str, period_start: list,
                               period_end: list,
                               amount: Union[float, int],
@@ -20,14 +21,19 @@ def historical_returns_dollar(asset_code: str, price_type: str,
     :param normalisation_freq:
     :param compounding_freq:
     :param amount:
-    :return: results:
+    :return: results: (dict of results keyed by 'Asset Code - Price
+             Type' when a list of Asset Code is passed)
     """
     results = historical_returns(asset_code, price_type, currency,
                                  period_start, period_end,
                                  normalisation_freq, compounding_freq)
 
-    results['rate_of_return'] = [
-        round(x * amount, 6) if not isinstance(x, str) else x for x in
-        results['rate_of_return']]
+    results_list = results.values() if isinstance(asset_code, list) \
+        else [results]
+
+    for result in results_list:
+        result['rate_of_return'] = [
+            round(x * amount, 6) if not isinstance(x, str) else x for x
+            in result['rate_of_return']]
 
     return results
@@ -1,17 +1,18 @@
-from typing import Union
+from typing import Tuple, Union
 
 import pandas as pd
 
 import numpy as np
 
-from Functions.date_parser import parse_dates
+from Functions.date_parser import batch_pair, resolve_batch, resolve_dates
 
-from Functions.data_reader import read_data
+from Functions.data_reader import read_data_window, read_frames_many
 
 from Functions.mvn_historical_volatility import \
-    get_historical_volatility
+    get_historical_volatility, volatility_many
 
-from Functions.mvn_historical_returns import get_historical_returns
+from Functions.mvn_historical_returns import get_historical_returns, \
+    get_historical_returns_many
 
 
 def get_historical_sharpe_ratio(main_df: pd.DataFrame,
@@ -20,7 +21,8 @@ def get_historical_sharpe_ratio(main_df: pd.DataFrame,
                                 norm_freq: Union[None, str],
                                 comp_freq: str,
                                 lambda_factor: Union[None, float],
-                                riskfree_rate: float):
+                                riskfree_rate: float,
+                                resolved: Union[tuple, None] = None):
     # Return error when start date is None
     if period_start is None:
         sharpe_ratio, rate_of_return, volatility_val = \
@@ -31,8 +33,9 @@ def get_historical_sharpe_ratio(main_df: pd.DataFrame,
     period_end = 'Latest' if period_end is None else period_end
 
     # Get parsed start and end dates
-    start_date, end_date = parse_dates(period_start, period_end,
-                                       main_df)
+    resolved = resolve_dates(period_start, period_end, main_df) \
+        if resolved is None else resolved
+    start_date, end_date = resolved[:2]
     if isinstance(start_date, str):
         sharpe_ratio, rate_of_return, volatility_val = start_date
         return sharpe_ratio, rate_of_return, volatility_val
@@ -45,7 +48,7 @@ def get_historical_sharpe_ratio(main_df: pd.DataFrame,
     try:
         rate_of_return = get_historical_returns(main_df, period_start,
                                                 period_end, norm_freq,
-                                                comp_freq)
+                                                comp_freq, resolved)
     except (Exception,):
         rate_of_return = None
 
@@ -59,7 +62,7 @@ def get_historical_sharpe_ratio(main_df: pd.DataFrame,
 
     try:
         volatility_val = get_historical_volatility(
-            main_df, period_start, period_end, lambda_factor)
+            main_df, period_start, period_end, lambda_factor, resolved)
 
     except (Exception,):
         volatility_val = None
@@ -78,13 +81,77 @@ def get_historical_sharpe_ratio(main_df: pd.DataFrame,
     return sharpe_ratio, rate_of_return, volatility_val
 
 
-def historical_sharpe_ratio(maven_asset_code: str, price_type: str,
+def get_historical_sharpe_ratio_many(main_df: pd.DataFrame,
+                                     period_start: list,
+                                     period_end: list,
+                                     norm_freq: Union[None, str],
+                                     comp_freq: str,
+                                     lambda_factor: Union[None, float],
+                                     riskfree_rate: float) \
+        -> Tuple[list, list, list]:
+    """
+    `get_historical_sharpe_ratio` for every period pair at once. The
+    pairs are resolved once, the rates of return and volatilities of
+    all windows come from the price array and the prefix sums / EWMA
+    engine of the series, and the Sharpe ratios from those. Pairs that
+    do not resolve to a usable window go through
+    `get_historical_sharpe_ratio`.
+
+    :param main_df: Pandas DataFrame sorted by Date
+    :param period_start: list of Period Start
+    :param period_end: list of Period End
+    :param norm_freq: Normalisation frequency
+    :param comp_freq: Compounding frequency
+    :param lambda_factor: decay factor Lambda or None
+    :param riskfree_rate: risk free rate
+    :return: (Sharpe ratio list, rate of return list, volatility list)
+    """
+    # Resolve all period pairs in one pass
+    batch = resolve_batch(period_start, period_end, main_df)
+
+    rate_of_return_list = get_historical_returns_many(
+        main_df, period_start, period_end, norm_freq, comp_freq, batch)
+    batch_volatility = volatility_many(main_df, batch.lo, batch.hi,
+                                       lambda_factor)
+
+    sharpe_ratio_list = []
+    volatility_list = []
+    for i, (start_date, end_date) in enumerate(zip(period_start,
+                                                   period_end)):
+        rate_of_return = rate_of_return_list[i]
+        volatility_val = batch_volatility[i]
+
+        if isinstance(rate_of_return, str) or rate_of_return is None \
+                or np.isnan(volatility_val):
+            try:
+                sharpe_ratio, rate_of_return, volatility_val = \
+                    get_historical_sharpe_ratio(main_df, start_date,
+                                                end_date, norm_freq,
+                                                comp_freq, lambda_factor,
+                                                riskfree_rate,
+                                                batch_pair(batch, i))
+            except (Exception,):
+                sharpe_ratio = rate_of_return = volatility_val = None
+        else:
+            sharpe_ratio = np.round((rate_of_return - riskfree_rate) /
+                                    volatility_val, 6)
+
+        sharpe_ratio_list.append(sharpe_ratio)
+        rate_of_return_list[i] = rate_of_return
+        volatility_list.append(volatility_val)
+
+    return sharpe_ratio_list, rate_of_return_list, volatility_list
+
+
+def historical_sharpe_ratio(maven_asset_code: Union[str, list],
+                            price_type: Union[str, list],
                             currency: str, period_start: list,
                             period_end: list,
                             normalization_freq: Union[None, str] = '1Y',
                             compounding_freq: str = '1Y',
                             lambda_factor: Union[None, float] = None,
-                            riskfree_rate: float = 0
+                            riskfree_rate: float = 0,
+                            main_df: Union[pd.DataFrame, None] = None
                             ) -> dict:
     """
     :param compounding_freq:
@@ -92,18 +159,33 @@ def historical_sharpe_ratio(maven_asset_code: str, price_type: str,
     :param riskfree_rate:
     :param lambda_factor:
     :param currency:
-    :param maven_asset_code: Asset Code str
-    :param price_type: Price Type str
+    :param maven_asset_code: Asset Code str or list of Asset Code
+    :param price_type: Price Type str (or list, one per Asset Code)
     :param period_start: Period Start str
     :param period_end: Period End str
-    :return:
+    :param main_df: Pandas DataFrame already read for the asset
+    :return: result dict, or dict of result dicts keyed by
+             'Asset Code - Price Type' when a list is passed
     """
     # NotImplementedError for currency (will be removed later)
     if currency is not None:
         raise NotImplementedError('ERROR: Currency is not supported')
 
-    # read data
-    main_df = read_data(maven_asset_code, price_type)
+    # Evaluate a list of assets from a single bulk read
+    if isinstance(maven_asset_code, list):
+        return {key: historical_sharpe_ratio(code, pt, currency,
+                                             period_start, period_end,
+                                             normalization_freq,
+                                             compounding_freq,
+                                             lambda_factor,
+                                             riskfree_rate, main_df=df)
+                for key, (code, pt, df) in
+                read_frames_many(maven_asset_code, price_type).items()}
+
+    # read data. Only the date window needed by the periods is read
+    if main_df is None:
+        main_df = read_data_window(maven_asset_code, price_type, period_start,
+                                   period_end)
 
     list_it = iter([period_start, period_end])
     list_lens = len(next(list_it))
@@ -111,26 +193,11 @@ def historical_sharpe_ratio(maven_asset_code: str, price_type: str,
         raise ValueError('ERROR: Ensure all passed list are '
                          'of same length!')
 
-    volatility_list = []
-    rate_of_return_list = []
-    sharpe_ratio_list = []
-    for start_date, end_date in zip(period_start, period_end):
-        try:
-            sharpe_ratio, rate_of_return, volatility_val = \
-                get_historical_sharpe_ratio(main_df, start_date,
-                                            end_date,
-                                            normalization_freq,
-                                            compounding_freq,
-                                            lambda_factor,
-                                            riskfree_rate)
-            sharpe_ratio_list.append(sharpe_ratio)
-            rate_of_return_list.append(rate_of_return)
-            volatility_list.append(volatility_val)
-
-        except (Exception,):
-            sharpe_ratio_list.append(None)
-            rate_of_return_list.append(None)
-            volatility_list.append(None)
+    sharpe_ratio_list, rate_of_return_list, volatility_list = \
+        get_historical_sharpe_ratio_many(main_df, period_start,
+                                         period_end, normalization_freq,
+                                         compounding_freq, lambda_factor,
+                                         riskfree_rate)
 
     result_dict = {'Sharpe Ratio': sharpe_ratio_list,
                    'Rate of Return': rate_of_return_list,
@@ -1,65 +1,195 @@
-from typing import Union
+from collections import namedtuple
+
+from functools import partial
+
+from typing import Tuple, Union
 
 import pandas as pd
 
 import numpy as np
 
-from Functions.date_parser import parse_dates
+from Functions.date_parser import batch_pair, resolve_batch, resolve_dates
 
-from Functions.data_reader import read_data
+from Functions.data_reader import read_data_window, read_frames_many
 
-from Functions.mvn_historical_returns import get_historical_returns
+from Functions.ewma import ewma_window_means
 
+from Functions.mvn_historical_returns import get_historical_returns, \
+    get_historical_returns_many
 
-def get_historical_sortino_ratio(main_df: pd.DataFrame,
-                                period_start: Union[str],
-                                period_end: Union[str, None],
-                                norm_freq: Union[None, str],
-                                comp_freq: str,
-                                lambda_factor: Union[None, float],
-                                riskfree_rate: float):
-    # Return error when start date is None
-    if period_start is None:
-        sortino_ratio, rate_of_return, downside_volatility = \
-            "ERROR: Start Date is required"
-        return sortino_ratio, rate_of_return, downside_volatility
+from Functions.mvn_historical_volatility import VOL_TOLERANCE
 
-    # using defaults where passed value is none
-    period_end = 'Latest' if period_end is None else period_end
+from Functions.prefix_sums import prefix_sum, range_sum
 
-    # Get parsed start and end dates
-    start_date, end_date = parse_dates(period_start, period_end,
-                                       main_df)
-    if isinstance(start_date, str):
-        sortino_ratio, rate_of_return, downside_volatility = start_date
-        return sortino_ratio, rate_of_return, downside_volatility
+from Functions.series_cache import frame_extra
 
-    if pd.isnull(start_date):
-        sortino_ratio = rate_of_return = downside_volatility = \
-            "ERROR: No data found prior to start date"
-        return sortino_ratio, rate_of_return, downside_volatility
+# Squared negative log returns of a series (in order) and the running
+# count of negative returns, the return k being
+# log(Price[k + 1] / Price[k])
+DownsideSquares = namedtuple('DownsideSquares', ['squares', 'counts'])
 
-    try:
-        rate_of_return = get_historical_returns(main_df, period_start,
-                                                period_end, norm_freq,
-                                                comp_freq)
-    except (Exception,):
-        rate_of_return = None
+# Running count of the negative log returns of a series and prefix
+# sums of their centered values (zero for the other returns)
+DownsideSums = namedtuple('DownsideSums',
+                          ['center', 'counts', 'sums', 'squares',
+                           'finite'])
 
-    if isinstance(rate_of_return, str):
-        sortino_ratio, downside_volatility = rate_of_return
-        return sortino_ratio, rate_of_return, downside_volatility
 
-    if rate_of_return is None:
-        sortino_ratio, downside_volatility = None
-        return sortino_ratio, rate_of_return, downside_volatility
+def downside_squares(prices: np.ndarray) -> DownsideSquares:
+    """
+    :param prices: Price array of a series
+    :return: DownsideSquares of the series
+    """
+    with np.errstate(all='ignore'):
+        performance = np.log(prices[1:] / prices[:-1])
+
+    negative = performance < 0
+    squares = performance[negative] ** 2
+    counts = np.concatenate([[0], np.cumsum(negative)])
+    squares.flags.writeable = False
+    counts.flags.writeable = False
+
+    return DownsideSquares(squares, counts)
+
 
+def downside_sums(prices: np.ndarray,
+                  compensated: bool = False) -> DownsideSums:
+    """
+    :param prices: Price array of a series
+    :param compensated: use compensated prefix sums
+    :return: DownsideSums of the series
+    """
+    with np.errstate(all='ignore'):
+        performance = np.log(prices[1:] / prices[:-1])
+
+    finite = bool(np.isfinite(performance).all())
+    negative = performance < 0
+
+    # Centered on the mean negative return so window sums stay small
+    center = performance[negative].mean() if finite and negative.any() \
+        else 0.0
+    deviation = np.where(negative, performance - center, 0.0)
 
+    counts = np.concatenate([[0], np.cumsum(negative)])
+    counts.flags.writeable = False
+
+    return DownsideSums(center, counts,
+                        prefix_sum(deviation, compensated),
+                        prefix_sum(deviation ** 2, compensated), finite)
+
+
+def window_downside_volatilities(downside: DownsideSums, lo: np.ndarray,
+                                 hi: np.ndarray) -> np.ndarray:
+    """
+    :param downside: DownsideSums of the series
+    :param lo: first row of each window
+    :param hi: end row of each window (exclusive), hi - lo > 1
+    :return: annualised volatility of the negative returns of the rows
+             lo:hi without Lambda, NaN where there are none or the
+             prefix sums are not precise enough
+    """
+    lo = np.asarray(lo, dtype=np.int64)
+    hi = np.asarray(hi, dtype=np.int64)
+
+    # Rows lo:hi hold the returns lo .. hi - 2 of the series
+    count = downside.counts[hi - 1] - downside.counts[lo]
+    sums, sums_error = range_sum(downside.sums, lo, hi - 1)
+    squares, squares_error = range_sum(downside.squares, lo, hi - 1)
+
+    with np.errstate(all='ignore'):
+        deviation = squares - sums * sums / count
+        deviation_error = squares_error + \
+            (2 * np.abs(sums) + sums_error) * sums_error / count
+
+        downside_volatility = np.sqrt(deviation * 252 / count)
+        precise = (count > 0) & (deviation > 2 * deviation_error) & \
+            (252 * deviation_error / (count * downside_volatility) <=
+             VOL_TOLERANCE)
+
+    # A single return deviates by exactly zero from its mean
+    downside_volatility = np.where(count == 1, 0.0, downside_volatility)
+    precise |= count == 1
+
+    return np.where(precise, np.round(downside_volatility, 6), np.nan)
+
+
+def ewma_downside_volatility(downside: DownsideSquares, lo: np.ndarray,
+                             hi: np.ndarray,
+                             lambda_factor: float) -> np.ndarray:
+    """
+    :param downside: DownsideSquares of the series
+    :param lo: first row of each window
+    :param hi: end row of each window (exclusive), hi > lo
+    :param lambda_factor: decay factor Lambda
+    :return: annualised Lambda volatility of the negative returns of
+             every window, NaN where there are none
+    """
+    # Rows lo:hi hold the returns lo .. hi - 2 of the series
+    first = downside.counts[np.asarray(lo)]
+    end = downside.counts[np.asarray(hi) - 1]
+
+    variance = ewma_window_means(downside.squares, first, end,
+                                 lambda_factor)
+
+    return np.round(np.sqrt(variance * 252), 6)
+
+
+def downside_volatility_many(main_df: pd.DataFrame, lo: np.ndarray,
+                             hi: np.ndarray,
+                             lambda_factor: Union[None, float],
+                             compensated: bool = False) -> np.ndarray:
+    """
+    Downside volatility of many windows of a frame from the prefix sums
+    (no Lambda) or the EWMA engine (Lambda) of its series.
+
+    :param main_df: Pandas DataFrame sorted by Date
+    :param lo: first row of each window
+    :param hi: end row of each window (exclusive)
+    :param lambda_factor: decay factor Lambda or None
+    :param compensated: compensated prefix sums for the downside
+                        volatility without Lambda
+    :return: annualised volatility of the negative returns of every
+             window, NaN where it has to be computed directly
+             (`get_downside_volatility`)
+    """
+    lo = np.asarray(lo, dtype=np.int64)
+    hi = np.asarray(hi, dtype=np.int64)
+
+    downside_volatility = np.full(len(lo), np.nan)
+    usable = hi - lo > 1
+    if not usable.any():
+        return downside_volatility
+
+    if lambda_factor is None:
+        downside, offset = frame_extra(
+            main_df, 'downside_sums_compensated' if compensated
+            else 'downside_sums',
+            partial(downside_sums, compensated=compensated))
+        if downside.finite:
+            downside_volatility[usable] = window_downside_volatilities(
+                downside, offset + lo[usable], offset + hi[usable])
+    else:
+        downside, offset = frame_extra(main_df, 'downside_squares',
+                                       downside_squares)
+        downside_volatility[usable] = ewma_downside_volatility(
+            downside, offset + lo[usable], offset + hi[usable],
+            lambda_factor)
+
+    return downside_volatility
+
+
+def get_downside_volatility(main_df: pd.DataFrame, lo: int, hi: int,
+                            lambda_factor: Union[None, float]) -> float:
+    """
+    :param main_df: Pandas DataFrame
+    :param lo: first row of the window
+    :param hi: end row of the window (exclusive)
+    :param lambda_factor: decay factor Lambda or None
+    :return: annualised volatility of the negative log returns
+    """
     # Compute downside performance
     # Filter data
-    main_df = main_df.set_index('Date')
-    main_df = main_df[(main_df.index >= start_date) &
-                      (main_df.index <= end_date)]
+    main_df = main_df.iloc[lo:hi].set_index('Date')
 
     # Order by date
     main_df = main_df.sort_values(by='Date')
@@ -96,20 +226,142 @@ def get_historical_sortino_ratio(main_df: pd.DataFrame,
             ), 6
         )
 
+    return downside_volatility
+
+
+def get_historical_sortino_ratio(main_df: pd.DataFrame,
+                                period_start: Union[str],
+                                period_end: Union[str, None],
+                                norm_freq: Union[None, str],
+                                comp_freq: str,
+                                lambda_factor: Union[None, float],
+                                riskfree_rate: float,
+                                resolved: Union[tuple, None] = None):
+    # Return error when start date is None
+    if period_start is None:
+        sortino_ratio, rate_of_return, downside_volatility = \
+            "ERROR: Start Date is required"
+        return sortino_ratio, rate_of_return, downside_volatility
+
+    # using defaults where passed value is none
+    period_end = 'Latest' if period_end is None else period_end
+
+    # Get parsed start and end dates
+    start_date, end_date, lo, hi = resolve_dates(
+        period_start, period_end, main_df) if resolved is None \
+        else resolved
+    if isinstance(start_date, str):
+        sortino_ratio, rate_of_return, downside_volatility = start_date
+        return sortino_ratio, rate_of_return, downside_volatility
+
+    if pd.isnull(start_date):
+        sortino_ratio = rate_of_return = downside_volatility = \
+            "ERROR: No data found prior to start date"
+        return sortino_ratio, rate_of_return, downside_volatility
+
+    try:
+        rate_of_return = get_historical_returns(main_df, period_start,
+                                                period_end, norm_freq,
+                                                comp_freq, resolved)
+    except (Exception,):
+        rate_of_return = None
+
+    if isinstance(rate_of_return, str):
+        sortino_ratio, downside_volatility = rate_of_return
+        return sortino_ratio, rate_of_return, downside_volatility
+
+    if rate_of_return is None:
+        sortino_ratio, downside_volatility = None
+        return sortino_ratio, rate_of_return, downside_volatility
+
+    # Downside volatility from the prefix sums / EWMA engine
+    downside_volatility = downside_volatility_many(main_df, [lo], [hi],
+                                                   lambda_factor)[0]
+    if np.isnan(downside_volatility):
+        downside_volatility = get_downside_volatility(main_df, lo, hi,
+                                                      lambda_factor)
+
     sortino_ratio = np.round((rate_of_return - riskfree_rate)
                              / downside_volatility, 6)
 
     return sortino_ratio, rate_of_return, downside_volatility
 
 
-def historical_sortino_ratio(maven_asset_code: str, price_type: str,
+def get_historical_sortino_ratio_many(main_df: pd.DataFrame,
+                                      period_start: list,
+                                      period_end: list,
+                                      norm_freq: Union[None, str],
+                                      comp_freq: str,
+                                      lambda_factor: Union[None, float],
+                                      riskfree_rate: float) \
+        -> Tuple[list, list, list]:
+    """
+    `get_historical_sortino_ratio` for every period pair at once. The
+    pairs are resolved once and the rates of return and downside
+    volatilities of all windows come from the price array and the
+    prefix sums / EWMA engine of the series. Pairs that do not resolve
+    to a usable window go through `get_historical_sortino_ratio`.
+
+    :param main_df: Pandas DataFrame sorted by Date
+    :param period_start: list of Period Start
+    :param period_end: list of Period End
+    :param norm_freq: Normalisation frequency
+    :param comp_freq: Compounding frequency
+    :param lambda_factor: decay factor Lambda or None
+    :param riskfree_rate: risk free rate
+    :return: (Sortino ratio list, rate of return list, downside
+             volatility list)
+    """
+    # Resolve all period pairs in one pass
+    batch = resolve_batch(period_start, period_end, main_df)
+
+    rate_of_return_list = get_historical_returns_many(
+        main_df, period_start, period_end, norm_freq, comp_freq, batch)
+    batch_volatility = downside_volatility_many(main_df, batch.lo,
+                                                batch.hi, lambda_factor)
+
+    sortino_ratio_list = []
+    downside_volatility_list = []
+    for i, (start_date, end_date) in enumerate(zip(period_start,
+                                                   period_end)):
+        rate_of_return = rate_of_return_list[i]
+        downside_volatility = batch_volatility[i]
+
+        if isinstance(rate_of_return, str) or rate_of_return is None \
+                or np.isnan(downside_volatility):
+            try:
+                sortino_ratio, rate_of_return, downside_volatility = \
+                    get_historical_sortino_ratio(main_df, start_date,
+                                                 end_date, norm_freq,
+                                                 comp_freq,
+                                                 lambda_factor,
+                                                 riskfree_rate,
+                                                 batch_pair(batch, i))
+            except (Exception,):
+                sortino_ratio = rate_of_return = downside_volatility = \
+                    None
+        else:
+            sortino_ratio = np.round((rate_of_return - riskfree_rate)
+                                     / downside_volatility, 6)
+
+        sortino_ratio_list.append(sortino_ratio)
+        rate_of_return_list[i] = rate_of_return
+        downside_volatility_list.append(downside_volatility)
+
+    return sortino_ratio_list, rate_of_return_list, \
+        downside_volatility_list
+
+
+def historical_sortino_ratio(maven_asset_code: Union[str, list],
+                             price_type: Union[str, list],
                              currency: str, period_start: list,
                              period_end: list,
                              normalization_freq: Union[
                                  None, str] = '1Y',
                              compounding_freq: str = '1Y',
                              lambda_factor: Union[None, float] = None,
-                             riskfree_rate: float = 0
+                             riskfree_rate: float = 0,
+                             main_df: Union[pd.DataFrame, None] = None
                              ) -> dict:
     """
     :param compounding_freq:
@@ -117,18 +369,33 @@ def historical_sortino_ratio(maven_asset_code: str, price_type: str,
     :param riskfree_rate:
     :param lambda_factor:
     :param currency:
-    :param maven_asset_code: Asset Code str
-    :param price_type: Price Type str
+    :param maven_asset_code: Asset Code str or list of Asset Code
+    :param price_type: Price Type str (or list, one per Asset Code)
     :param period_start: Period Start str
     :param period_end: Period End str
-    :return:
+    :param main_df: Pandas DataFrame already read for the asset
+    :return: result dict, or dict of result dicts keyed by
+             'Asset Code - Price Type' when a list is passed
     """
     # NotImplementedError for currency (will be removed later)
     if currency is not None:
         raise NotImplementedError('ERROR: Currency is not supported')
 
-    # read data
-    main_df = read_data(maven_asset_code, price_type)
+    # Evaluate a list of assets from a single bulk read
+    if isinstance(maven_asset_code, list):
+        return {key: historical_sortino_ratio(code, pt, currency,
+                                              period_start, period_end,
+                                              normalization_freq,
+                                              compounding_freq,
+                                              lambda_factor,
+                                              riskfree_rate, main_df=df)
+                for key, (code, pt, df) in
+                read_frames_many(maven_asset_code, price_type).items()}
+
+    # read data. Only the date window needed by the periods is read
+    if main_df is None:
+        main_df = read_data_window(maven_asset_code, price_type, period_start,
+                                   period_end)
 
     list_it = iter([period_start, period_end])
     list_lens = len(next(list_it))
@@ -136,26 +403,11 @@ def historical_sortino_ratio(maven_asset_code: str, price_type: str,
         raise ValueError('ERROR: Ensure all passed list are '
                          'of same length!')
 
-    downside_volatility_list = []
-    rate_of_return_list = []
-    sortino_ratio_list = []
-    for start_date, end_date in zip(period_start, period_end):
-        try:
-            sortino_ratio, rate_of_return, downside_volatility = \
-                get_historical_sortino_ratio(main_df, start_date,
-                                             end_date,
-                                             normalization_freq,
-                                             compounding_freq,
-                                             lambda_factor,
-                                             riskfree_rate)
-            sortino_ratio_list.append(sortino_ratio)
-            rate_of_return_list.append(rate_of_return)
-            downside_volatility_list.append(downside_volatility)
-
-        except (Exception,):
-            sortino_ratio_list.append(None)
-            rate_of_return_list.append(None)
-            downside_volatility_list.append(None)
+    sortino_ratio_list, rate_of_return_list, downside_volatility_list = \
+        get_historical_sortino_ratio_many(main_df, period_start,
+                                          period_end, normalization_freq,
+                                          compounding_freq, lambda_factor,
+                                          riskfree_rate)
 
     result_dict = {'Sortino Ratio': sortino_ratio_list,
                    'Rate of Return': rate_of_return_list,
@@ -179,8 +431,8 @@ def historical_sortino_ratio(maven_asset_code: str, price_type: str,
 # comp_freq = '1Y'
 # riskfree_rate = 0
 
-results = historical_sortino_ratio('SPY US', 'PR', None,['1Y','2W','6M','2Q','95D','Inception'],
-                                  [None, None, None, None, None, None],
-                                  lambda_factor = 0.9,
-                                  riskfree_rate=0.05
-                                  )
+# results = historical_sortino_ratio('SPY US', 'PR', None,['1Y','2W','6M','2Q','95D','Inception'],
+#                                   [None, None, None, None, None, None],
+#                                   lambda_factor = 0.9,
+#                                   riskfree_rate=0.05
+#                                   )
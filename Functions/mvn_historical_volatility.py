@@ -1,18 +1,193 @@
+from collections import namedtuple
+
+from functools import partial
+
 from typing import Union
 
 import pandas as pd
 
 import numpy as np
 
-from Functions.date_parser import parse_dates
+from Functions.date_parser import batch_pair, resolve_batch, resolve_dates
+
+from Functions.data_reader import read_data_window, read_frames_many
+
+from Functions.ewma import ewma_window_means
+
+from Functions.prefix_sums import prefix_sum, range_sum
+
+from Functions.series_cache import frame_extra
+
+# Largest error accepted on a volatility computed from prefix sums,
+# windows with less precision are computed directly
+VOL_TOLERANCE = 1e-10
+
+# Prefix sums of the centered log returns of a series, the return k
+# being log(Price[k + 1] / Price[k])
+ReturnSums = namedtuple('ReturnSums',
+                        ['center', 'sums', 'squares', 'finite'])
+
+# Squared log returns of a series and the running count of non finite
+# ones, windows holding any are computed directly
+SquaredReturns = namedtuple('SquaredReturns', ['squares', 'non_finite'])
+
+
+def log_return_sums(prices: np.ndarray,
+                    compensated: bool = False) -> ReturnSums:
+    """
+    :param prices: Price array of a series
+    :param compensated: use compensated prefix sums
+    :return: ReturnSums of the series
+    """
+    with np.errstate(all='ignore'):
+        performance = np.log(prices[1:] / prices[:-1])
+
+    finite = bool(np.isfinite(performance).all())
+
+    # Centered on the series mean so window sums stay small
+    center = performance.mean() if finite and len(performance) else 0.0
+    deviation = performance - center
+
+    return ReturnSums(center, prefix_sum(deviation, compensated),
+                      prefix_sum(deviation ** 2, compensated), finite)
+
+
+def squared_returns(prices: np.ndarray) -> SquaredReturns:
+    """
+    :param prices: Price array of a series
+    :return: SquaredReturns of the series
+    """
+    with np.errstate(all='ignore'):
+        squares = np.log(prices[1:] / prices[:-1]) ** 2
+
+    non_finite = np.concatenate([[0], np.cumsum(~np.isfinite(squares))])
+    squares.flags.writeable = False
+    non_finite.flags.writeable = False
+
+    return SquaredReturns(squares, non_finite)
+
+
+def ewma_volatility(squared: SquaredReturns, lo: np.ndarray,
+                    hi: np.ndarray, lambda_factor: float) -> np.ndarray:
+    """
+    :param squared: SquaredReturns of the series
+    :param lo: first row of each window
+    :param hi: end row of each window (exclusive)
+    :param lambda_factor: decay factor Lambda
+    :return: annualised Lambda volatility of every window, NaN where
+             the window has no or non finite returns
+    """
+    lo = np.asarray(lo, dtype=np.int64)
+    hi = np.asarray(hi, dtype=np.int64)
+
+    # Rows lo:hi hold the returns lo .. hi - 2 of the series
+    usable = (hi - lo > 1) & \
+        (squared.non_finite[np.maximum(hi - 1, 0)] ==
+         squared.non_finite[lo])
+
+    variance = np.full(len(lo), np.nan)
+    variance[usable] = ewma_window_means(squared.squares, lo[usable],
+                                         hi[usable] - 1, lambda_factor)
+
+    return np.round(np.sqrt(variance * 252), 6)
+
 
-from Functions.data_reader import read_data
+def window_volatilities(return_sums: ReturnSums, lo: np.ndarray,
+                         hi: np.ndarray) -> np.ndarray:
+    """
+    :param return_sums: ReturnSums of the series
+    :param lo: first row of each window
+    :param hi: end row of each window (exclusive), hi - lo > 1
+    :return: annualised volatility of the rows lo:hi without Lambda,
+             NaN where the prefix sums are not precise enough
+    """
+    lo = np.asarray(lo, dtype=np.int64)
+    hi = np.asarray(hi, dtype=np.int64)
+
+    # Rows lo:hi hold the returns lo .. hi - 2 of the series
+    count = hi - lo - 1
+    sums, sums_error = range_sum(return_sums.sums, lo, hi - 1)
+    squares, squares_error = range_sum(return_sums.squares, lo, hi - 1)
+
+    deviation = squares - sums * sums / count
+    deviation_error = squares_error + \
+        (2 * np.abs(sums) + sums_error) * sums_error / count
+
+    with np.errstate(all='ignore'):
+        volatility_val = np.sqrt(deviation * 252 / count)
+        precise = (deviation > 2 * deviation_error) & \
+            (252 * deviation_error / (count * volatility_val) <=
+             VOL_TOLERANCE)
+
+    # A single return deviates by exactly zero from its mean
+    volatility_val = np.where(count == 1, 0.0, volatility_val)
+    precise |= count == 1
+
+    return np.where(precise, np.round(volatility_val, 6), np.nan)
+
+
+def window_volatility(return_sums: ReturnSums, lo: int,
+                      hi: int) -> Union[float, None]:
+    """
+    :param return_sums: ReturnSums of the series
+    :param lo: first row of the window
+    :param hi: end row of the window (exclusive)
+    :return: annualised volatility of the rows lo:hi without Lambda,
+             None if the prefix sums are not precise enough
+    """
+    volatility_val = window_volatilities(return_sums, [lo], [hi])[0]
+
+    return None if np.isnan(volatility_val) else volatility_val
+
+
+def volatility_many(main_df: pd.DataFrame, lo: np.ndarray,
+                    hi: np.ndarray, lambda_factor: Union[None, float],
+                    compensated: bool = False) -> np.ndarray:
+    """
+    Volatility of many windows of a frame from the prefix sums (no
+    Lambda) or the EWMA engine (Lambda) of its series.
+
+    :param main_df: Pandas DataFrame sorted by Date
+    :param lo: first row of each window
+    :param hi: end row of each window (exclusive)
+    :param lambda_factor: decay factor Lambda or None
+    :param compensated: compensated prefix sums for the volatility
+                        without Lambda
+    :return: annualised volatility of every window, NaN where it has
+             to be computed directly (`get_historical_volatility`)
+    """
+    lo = np.asarray(lo, dtype=np.int64)
+    hi = np.asarray(hi, dtype=np.int64)
+
+    volatility_val = np.full(len(lo), np.nan)
+    usable = hi - lo > 1
+    if not usable.any():
+        return volatility_val
+
+    if lambda_factor is None:
+        return_sums, offset = frame_extra(
+            main_df, 'log_return_sums_compensated' if compensated
+            else 'log_return_sums',
+            partial(log_return_sums, compensated=compensated))
+        if return_sums.finite:
+            volatility_val[usable] = window_volatilities(
+                return_sums, offset + lo[usable], offset + hi[usable])
+    else:
+        squared, offset = frame_extra(main_df, 'squared_returns',
+                                      squared_returns)
+        volatility_val[usable] = ewma_volatility(
+            squared, offset + lo[usable], offset + hi[usable],
+            lambda_factor)
+
+    return volatility_val
 
 
 def get_historical_volatility(main_df: pd.DataFrame,
                               period_start: Union[str],
                               period_end: Union[str, None],
-                              lambda_factor: Union[None, float]):
+                              lambda_factor: Union[None, float],
+                              resolved: Union[tuple, None] = None,
+                              compensated: bool = False):
     # Return error when start date is None
     if period_start is None:
         rate_of_return = "ERROR: Start Date is required"
@@ -22,8 +197,9 @@ def get_historical_volatility(main_df: pd.DataFrame,
     period_end = 'Latest' if period_end is None else period_end
 
     # Get parsed start and end dates
-    start_date, end_date = parse_dates(period_start, period_end,
-                                       main_df)
+    start_date, end_date, lo, hi = resolve_dates(
+        period_start, period_end, main_df) if resolved is None \
+        else resolved
 
     if isinstance(start_date, str):
         volatility_val = start_date
@@ -33,10 +209,29 @@ def get_historical_volatility(main_df: pd.DataFrame,
         volatility_val = "ERROR: No data found prior to start date"
         return volatility_val
 
+    # Volatility without Lambda from the prefix sums of the series
+    if lambda_factor is None and hi - lo > 1:
+        return_sums, offset = frame_extra(
+            main_df, 'log_return_sums_compensated' if compensated
+            else 'log_return_sums',
+            partial(log_return_sums, compensated=compensated))
+        volatility_val = window_volatility(
+            return_sums, offset + lo, offset + hi) \
+            if return_sums.finite else None
+        if volatility_val is not None:
+            return volatility_val
+
+    # Volatility with Lambda from the EWMA engine
+    if lambda_factor is not None and hi - lo > 1:
+        squared, offset = frame_extra(main_df, 'squared_returns',
+                                      squared_returns)
+        volatility_val = ewma_volatility(squared, [offset + lo],
+                                         [offset + hi], lambda_factor)[0]
+        if not np.isnan(volatility_val):
+            return volatility_val
+
     # Filter data
-    main_df = main_df.set_index('Date')
-    main_df = main_df[(main_df.index >= start_date) &
-                      (main_df.index <= end_date)]
+    main_df = main_df.iloc[lo:hi].set_index('Date')
 
     # Order by date
     main_df = main_df.sort_values(by='Date')
@@ -71,26 +266,43 @@ def get_historical_volatility(main_df: pd.DataFrame,
     return volatility_val
 
 
-def historical_volatility(maven_asset_code: str, price_type: str,
+def historical_volatility(maven_asset_code: Union[str, list],
+                          price_type: Union[str, list],
                           currency: str, period_start: list,
                           period_end: list,
-                          lambda_factor: Union[None, float] = None
-                          ) -> dict:
+                          lambda_factor: Union[None, float] = None,
+                          main_df: Union[pd.DataFrame, None] = None,
+                          compensated: bool = False) -> dict:
     """
     :param lambda_factor:
     :param currency:
-    :param maven_asset_code: Asset Code str
-    :param price_type: Price Type str
+    :param maven_asset_code: Asset Code str or list of Asset Code
+    :param price_type: Price Type str (or list, one per Asset Code)
     :param period_start: Period Start str
     :param period_end: Period End str
-    :return:
+    :param main_df: Pandas DataFrame already read for the asset
+    :param compensated: compensated prefix sums for the volatility
+                        without Lambda (long series)
+    :return: result dict, or dict of result dicts keyed by
+             'Asset Code - Price Type' when a list is passed
     """
     # NotImplementedError for currency (will be removed later)
     if currency is not None:
         raise NotImplementedError('ERROR: Currency is not supported')
 
-    # read data
-    main_df = read_data(maven_asset_code, price_type)
+    # Evaluate a list of assets from a single bulk read
+    if isinstance(maven_asset_code, list):
+        return {key: historical_volatility(code, pt, currency,
+                                           period_start, period_end,
+                                           lambda_factor, main_df=df,
+                                           compensated=compensated)
+                for key, (code, pt, df) in
+                read_frames_many(maven_asset_code, price_type).items()}
+
+    # read data. Only the date window needed by the periods is read
+    if main_df is None:
+        main_df = read_data_window(maven_asset_code, price_type, period_start,
+                                   period_end)
 
     list_it = iter([period_start, period_end])
     list_lens = len(next(list_it))
@@ -98,13 +310,28 @@ def historical_volatility(maven_asset_code: str, price_type: str,
         raise ValueError('ERROR: Ensure all passed list are '
                          'of same length!')
 
+    # Resolve all period pairs in one pass
+    batch = resolve_batch(period_start, period_end, main_df)
+
+    # Volatility of every window from the prefix sums / EWMA engine
+    batch_list = volatility_many(main_df, batch.lo, batch.hi,
+                                 lambda_factor, compensated)
+
     volatility_list = []
-    for start_date, end_date in zip(period_start, period_end):
+    for i, (start_date, end_date) in enumerate(zip(period_start,
+                                                   period_end)):
+        if not np.isnan(batch_list[i]):
+            volatility_list.append(batch_list[i])
+            continue
+
         try:
             volatility_val = get_historical_volatility(main_df,
                                                        start_date,
                                                        end_date,
-                                                       lambda_factor)
+                                                       lambda_factor,
+                                                       batch_pair(batch,
+                                                                  i),
+                                                       compensated)
             volatility_list.append(volatility_val)
 
         except (Exception,):
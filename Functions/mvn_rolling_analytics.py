@@ -0,0 +1,216 @@
+"""
+
+Rolling returns, volatility, Sharpe and Sortino series
+
+`rolling_analytics` evaluates one window tenor across the whole
+history of a series, e.g. the 1Y volatility on every date since
+inception, instead of one call per (start, end) pair.
+
+Windows end on every `step`-th row counted back from the latest date
+and start on the last row on or before end date - window, the rows
+`parse_dates` resolves for (window, end date). Every window costs a
+few lookups into the prefix sums of the series (see
+Functions/prefix_sums.py), so the whole history is O(n). Windows the
+prefix sums cannot give precisely enough (too flat, non finite
+returns) are computed directly like the single window functions.
+
+Returns are normalised with `parse_frequency` and volatilities
+annualised with 252 days, as in the single window functions. With a
+Lambda the volatilities come from the sliding sums of the EWMA engine
+(see Functions/ewma.py), also O(n) for the whole history.
+"""
+from functools import partial
+
+from typing import Tuple, Union
+
+import pandas as pd
+
+import numpy as np
+
+from Functions.date_parser import ResolvedDates, date_index, shift_dates
+
+from Functions.data_reader import read_data, read_frames_many
+
+from Functions.mvn_historical_returns import window_returns
+
+from Functions.mvn_historical_sortino_ratio import \
+    downside_squares, downside_sums, ewma_downside_volatility, \
+    get_downside_volatility, window_downside_volatilities
+
+from Functions.mvn_historical_volatility import \
+    ewma_volatility, get_historical_volatility, log_return_sums, \
+    squared_returns, window_volatilities
+
+from Functions.normalization_parser import parse_frequency
+
+from Functions.series_cache import frame_extra
+
+from Functions.tenor import parse_tenor, tenor_shift
+
+
+def rolling_windows(index: np.ndarray, window: str,
+                    step: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    :param index: sorted int64 (ns) dates of the series
+    :param window: window tenor e.g. '1Y'
+    :param step: rows between two window ends
+    :return: (first row, end row (exclusive)) of every window holding
+             at least one return, oldest first
+    """
+    try:
+        tenor = parse_tenor(window)
+    except (Exception,):
+        tenor = None
+    if tenor is None:
+        raise ValueError('ERROR: Window is not a tenor ' + str(window))
+
+    if step < 1:
+        raise ValueError('ERROR: Step must be at least 1')
+
+    # Window ends counted back from the latest row
+    last = np.arange(len(index) - 1, -1, -step)[::-1]
+
+    months, days = tenor_shift(tenor)
+    start, ok = shift_dates(index[last], np.full(len(last), months),
+                            np.full(len(last), days))
+
+    # Last row on or before the start date, from its first duplicate
+    first = np.searchsorted(index, start, side='right') - 1
+    ok &= (first >= 0) & (index[np.maximum(first, 0)] < index[last])
+    first = np.searchsorted(index, index[np.maximum(first, 0)],
+                            side='left')
+
+    return first[ok], last[ok] + 1
+
+
+def get_rolling_analytics(main_df: pd.DataFrame, window: str,
+                          step: int,
+                          norm_freq: Union[None, str],
+                          comp_freq: str,
+                          lambda_factor: Union[None, float],
+                          riskfree_rate: float) -> pd.DataFrame:
+    """
+    :param main_df: Pandas DataFrame sorted by Date
+    :param window: window tenor e.g. '1Y'
+    :param step: rows between two window ends
+    :param norm_freq: Normalisation frequency
+    :param comp_freq: Compounding frequency
+    :param lambda_factor: decay factor Lambda or None
+    :param riskfree_rate: risk free rate
+    :return: Pandas DataFrame, one row per window end Date
+    """
+    # Get parsed days for normalisation and compounding frequency
+    norm_days, comp_days = parse_frequency(norm_freq, comp_freq)
+    if isinstance(norm_days, str):
+        raise ValueError(norm_days)
+
+    index = date_index(main_df)
+    lo, hi = rolling_windows(index, window, step)
+
+    # Rate of return between the first and last row of every window
+    days_diff = (index[hi - 1] - index[lo]).astype('timedelta64[ns]') \
+        .astype('timedelta64[D]').astype(np.int64)
+    prices = main_df['Price'].to_numpy(dtype=np.float64)
+    rate_of_return = window_returns(prices, lo, hi - 1, days_diff,
+                                    norm_days, comp_days)
+
+    if lambda_factor is None:
+        return_sums, offset = frame_extra(
+            main_df, 'log_return_sums_compensated',
+            partial(log_return_sums, compensated=True))
+        volatility_val = window_volatilities(return_sums, offset + lo,
+                                             offset + hi)
+
+        downside, offset = frame_extra(
+            main_df, 'downside_sums_compensated',
+            partial(downside_sums, compensated=True))
+        downside_volatility = window_downside_volatilities(
+            downside, offset + lo, offset + hi)
+        # Windows without negative returns have no downside volatility
+        direct = np.isnan(downside_volatility) & \
+            (downside.counts[offset + hi - 1] !=
+             downside.counts[offset + lo])
+    else:
+        squared, offset = frame_extra(main_df, 'squared_returns',
+                                      squared_returns)
+        volatility_val = ewma_volatility(squared, offset + lo,
+                                         offset + hi, lambda_factor)
+
+        downside, offset = frame_extra(main_df, 'downside_squares',
+                                       downside_squares)
+        downside_volatility = ewma_downside_volatility(
+            downside, offset + lo, offset + hi, lambda_factor)
+        direct = np.zeros(len(lo), dtype=bool)
+
+    # Windows the engines cannot give are computed directly
+    for i in np.flatnonzero(np.isnan(volatility_val)):
+        volatility_val[i] = get_historical_volatility(
+            main_df, window, None, lambda_factor,
+            ResolvedDates(pd.Timestamp(index[lo[i]]),
+                          pd.Timestamp(index[hi[i] - 1]),
+                          lo[i], hi[i]))
+    for i in np.flatnonzero(direct):
+        downside_volatility[i] = get_downside_volatility(
+            main_df, lo[i], hi[i], lambda_factor)
+
+    with np.errstate(all='ignore'):
+        sharpe_ratio = np.round((rate_of_return - riskfree_rate) /
+                                volatility_val, 6)
+        sortino_ratio = np.round((rate_of_return - riskfree_rate) /
+                                 downside_volatility, 6)
+
+    return pd.DataFrame({'Date': main_df['Date'].to_numpy()[hi - 1],
+                         'Start Date': main_df['Date'].to_numpy()[lo],
+                         'Rate of Return': rate_of_return,
+                         'Volatility': volatility_val,
+                         'Sharpe Ratio': sharpe_ratio,
+                         'Downside Volatility': downside_volatility,
+                         'Sortino Ratio': sortino_ratio})
+
+
+def rolling_analytics(maven_asset_code: Union[str, list],
+                      price_type: Union[str, list],
+                      currency: str, window: str = '1Y',
+                      step: int = 1,
+                      normalization_freq: Union[None, str] = '1Y',
+                      compounding_freq: str = '1Y',
+                      lambda_factor: Union[None, float] = None,
+                      riskfree_rate: float = 0,
+                      main_df: Union[pd.DataFrame, None] = None
+                      ) -> Union[pd.DataFrame, dict]:
+    """
+    :param maven_asset_code: Asset Code str or list of Asset Code
+    :param price_type: Price Type str (or list, one per Asset Code)
+    :param currency:
+    :param window: window tenor e.g. '1Y'
+    :param step: rows between two window ends, 1 for every date
+    :param normalization_freq:
+    :param compounding_freq:
+    :param lambda_factor:
+    :param riskfree_rate:
+    :param main_df: Pandas DataFrame already read for the asset
+    :return: Pandas DataFrame with Date, Start Date, Rate of Return,
+             Volatility, Sharpe Ratio, Downside Volatility and Sortino
+             Ratio per window end, or dict of them keyed by
+             'Asset Code - Price Type' when a list is passed
+    """
+    # NotImplementedError for currency (will be removed later)
+    if currency is not None:
+        raise NotImplementedError('ERROR: Currency is not supported')
+
+    # Evaluate a list of assets from a single bulk read
+    if isinstance(maven_asset_code, list):
+        return {key: rolling_analytics(code, pt, currency, window, step,
+                                       normalization_freq,
+                                       compounding_freq, lambda_factor,
+                                       riskfree_rate, main_df=df)
+                for key, (code, pt, df) in
+                read_frames_many(maven_asset_code, price_type).items()}
+
+    # read data, rolling windows cover the whole history
+    if main_df is None:
+        main_df = read_data(maven_asset_code, price_type)
+
+    return get_rolling_analytics(main_df, window, step,
+                                 normalization_freq, compounding_freq,
+                                 lambda_factor, riskfree_rate)
@@ -1,30 +1,21 @@
-import re
-
 from typing import Union
 
+from Functions.tenor import parse_tenor
+
 
 def parse_frequency(norm_freq: Union[None, str],
                     comp_freq: Union[None, str])\
         -> Union[float, str]:
-    # allowed offsets D: Daily, M: Monthly, W: Weekly, Y: Yearly
-    offset_chars = set('DWQMY')
+    # allowed offsets D: Daily, W: Weekly, M: Monthly, Q: Quarterly,
+    # Y: Yearly, parsed by Functions/tenor.py
 
     # Generate days for Normalisation Frequency
     try:
+        norm_tenor = None if norm_freq is None else parse_tenor(norm_freq)
         if norm_freq is None:
             norm_days = None
-        elif any((c in offset_chars) for c in norm_freq):
-            value = int(re.findall(r'\d+', norm_freq)[0])
-            if 'D' in norm_freq:
-                norm_days = value
-            elif 'W' in norm_freq:
-                norm_days = value * (365.25 / 52)
-            elif 'M' in norm_freq:
-                norm_days = value * (365.25 / 12)
-            elif 'Q' in norm_freq:
-                norm_days = value * (365.25 / 4)
-            else:
-                norm_days = value * 365.25
+        elif norm_tenor is not None:
+            norm_days = norm_tenor.days
         else:
             norm_days = 'ERROR: Normalisation frequency is incorrect'
             comp_days = 'ERROR: Normalisation frequency is incorrect'
@@ -35,18 +26,9 @@ def parse_frequency(norm_freq: Union[None, str],
 
     # Generate days for Compounding Frequency
     try:
-        if any((c in offset_chars) for c in comp_freq):
-            value = int(re.findall(r'\d+', comp_freq)[0])
-            if 'D' in comp_freq:
-                comp_days = value
-            elif 'W' in comp_freq:
-                comp_days = value * (365.25 / 52)
-            elif 'M' in comp_freq:
-                comp_days = value * (365.25 / 12)
-            elif 'Q' in comp_freq:
-                comp_days = value * (365.25 / 4)
-            else:
-                comp_days = value * 365.25
+        comp_tenor = parse_tenor(comp_freq)
+        if comp_tenor is not None:
+            comp_days = comp_tenor.days
         else:
             norm_days = 'ERROR: Compounding frequency is incorrect'
             comp_days = 'ERROR: Compounding frequency is incorrect'
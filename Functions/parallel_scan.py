@@ -0,0 +1,115 @@
+"""
+
+Chunked prefix scans over long series
+
+A running maximum of a long array is split into one block per worker.
+The blocks are scanned at the same time in a thread pool (NumPy
+releases the GIL inside ufunc loops), the carry of every block (the
+maximum of everything before it) is stitched in serially from the
+block ends, and a second parallel pass folds each carry into its
+block. max is exact, so the result equals the serial
+np.maximum.accumulate element for element, NaN included.
+
+Scans only go parallel above PARALLEL_SCAN_ROWS rows and with more than
+one CPU (`parallel_scan`), shorter series (every daily series so far)
+keep the serial scan as the pool would only add overhead. The scan of
+each block can be swapped for a compiled loop releasing the GIL (the
+Numba path of `drawdown_kernel`, see Functions/kernels.py), the carry
+fold stays the same.
+
+Running products are not split: stitching a block carry multiplies in
+a different order than the serial product and changes the last bits,
+so np.cumprod stays serial to keep the results of the drawdowns and the
+proxy extensions unchanged.
+"""
+import os
+
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+
+from typing import Callable, Union
+
+import numpy as np
+
+# Rows from which a scan is split over the workers
+PARALLEL_SCAN_ROWS = int(os.environ.get('TS_PARALLEL_SCAN_ROWS',
+                                        1 << 20))
+
+# Threads of the scan pool, one block each
+SCAN_WORKERS = int(os.environ.get('TS_SCAN_WORKERS',
+                                  os.cpu_count() or 1))
+
+_executor = None
+_lock = threading.Lock()
+
+
+def _pool() -> ThreadPoolExecutor:
+    # Created on the first parallel scan and shared afterwards
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=SCAN_WORKERS,
+                    thread_name_prefix='prefix-scan')
+
+    return _executor
+
+
+def scan_blocks(size: int, count: int) -> np.ndarray:
+    """
+    :param size: number of rows
+    :param count: number of blocks
+    :return: block bounds, block k being rows bounds[k]:bounds[k + 1]
+    """
+    return np.linspace(0, size, max(min(count, size), 1) + 1) \
+        .astype(np.int64)
+
+
+def parallel_scan(size: int) -> bool:
+    """
+    :param size: number of rows
+    :return: True if a scan of size rows is split over the pool
+    """
+    return size >= PARALLEL_SCAN_ROWS and SCAN_WORKERS > 1
+
+
+def running_maximum(values: np.ndarray,
+                    block_scan: Union[Callable, None] = None) -> \
+        np.ndarray:
+    """
+    :param values: array
+    :param block_scan: function(values, out) writing the running maximum
+                       of a block to out, np.maximum.accumulate if None
+    :return: np.maximum.accumulate(values), scanned in blocks over the
+             pool for long arrays
+    """
+    values = np.asarray(values)
+    if not parallel_scan(len(values)):
+        return np.maximum.accumulate(values)
+
+    if block_scan is None:
+        def block_scan(block_values, out):
+            np.maximum.accumulate(block_values, out=out)
+
+    bounds = scan_blocks(len(values), SCAN_WORKERS)
+    maxima = np.empty_like(values)
+
+    def scan(block):
+        lo, hi = bounds[block], bounds[block + 1]
+        block_scan(values[lo:hi], maxima[lo:hi])
+
+    list(_pool().map(scan, range(len(bounds) - 1)))
+
+    # Carry of each block from the block ends before it
+    carries = np.maximum.accumulate(maxima[bounds[1:-1] - 1])
+
+    def stitch(block):
+        lo, hi = bounds[block + 1], bounds[block + 2]
+        np.maximum(carries[block], maxima[lo:hi], out=maxima[lo:hi])
+
+    list(_pool().map(stitch, range(len(carries))))
+
+    return maxima
+
@@ -0,0 +1,100 @@
+"""
+
+Prefix sums for constant time range sums over a price series
+
+`prefix_sum` is built once per series (see `frame_extra` in
+Functions/series_cache.py) and `range_sum` then gives the sum of any
+row range from two lookups, together with a bound of its rounding
+error so callers can fall back to a direct computation when a window
+is too small or too flat for the difference of two large prefix sums
+to be accurate.
+
+The bounds are worst case, not estimates: a running sum of k values is
+off by at most gamma(k) = k * EPS / (1 - k * EPS) times the sum of their
+absolute values, whatever the order of the roundings. For long plain
+prefix sums this is loose enough to send most windows to the fallback,
+so series from COMPENSATED_ROWS values on always get compensated sums.
+
+With `compensated=True` the rounding error of every addition is
+recovered exactly (TwoSum) and accumulated separately, giving close to
+double-double accuracy for century long series.
+"""
+from collections import namedtuple
+
+from typing import Tuple
+
+import numpy as np
+
+EPS = np.finfo(np.float64).eps
+
+# Values from which prefix sums are always compensated
+COMPENSATED_ROWS = 1 << 10
+
+# total[k] is the sum of the first k values, error[k] its rounding
+# error (compensated only) and absolute[k] the sum of the first k
+# absolute values (None when all values are non negative)
+PrefixSum = namedtuple('PrefixSum', ['total', 'error', 'absolute'])
+
+
+def _gamma(count):
+    # Worst case relative error of a running sum of count values
+    return count * EPS / (1 - count * EPS)
+
+
+def _prefix(values: np.ndarray) -> np.ndarray:
+    prefix = np.concatenate([[0.0], np.cumsum(values)])
+    prefix.flags.writeable = False
+    return prefix
+
+
+def prefix_sum(values: np.ndarray,
+               compensated: bool = False) -> PrefixSum:
+    """
+    :param values: float array
+    :param compensated: keep the rounding error of every addition
+                        (always from COMPENSATED_ROWS values on)
+    :return: PrefixSum of values
+    """
+    values = np.asarray(values, dtype=np.float64)
+    compensated = compensated or len(values) >= COMPENSATED_ROWS
+    total = _prefix(values)
+
+    error = None
+    if compensated:
+        # Exact error of total[k] = total[k - 1] + values[k - 1]
+        previous = total[:-1]
+        added = total[1:] - previous
+        error = _prefix((previous - (total[1:] - added)) +
+                        (values - added))
+
+    absolute = None if (values >= 0).all() else _prefix(np.abs(values))
+
+    return PrefixSum(total, error, absolute)
+
+
+def range_sum(prefix: PrefixSum, lo: int, hi: int) -> Tuple[float,
+                                                             float]:
+    """
+    :param prefix: PrefixSum of the values
+    :param lo: first position
+    :param hi: end position (exclusive)
+    :return: (sum of values lo:hi, bound of its rounding error)
+    """
+    absolute = prefix.total if prefix.absolute is None \
+        else prefix.absolute
+
+    value = prefix.total[hi] - prefix.total[lo]
+    if prefix.error is None:
+        bound = _gamma(hi) * absolute[hi] + _gamma(lo) * absolute[lo] + \
+            EPS * abs(value)
+    else:
+        # error[k] is a plain running sum of the exact rounding errors,
+        # themselves at most gamma(k) times the absolute values
+        difference = abs(value)
+        error = prefix.error[hi] - prefix.error[lo]
+        value += error
+        bound = EPS * (difference + abs(error) + abs(value)) + \
+            _gamma(hi) ** 2 * absolute[hi] + \
+            _gamma(lo) ** 2 * absolute[lo]
+
+    return value, bound
@@ -0,0 +1,316 @@
+"""
+
+Memory bounded LRU cache of price series read from time_series
+
+Entries are keyed by (Asset Code, Price Type) and hold read-only Date
+and Price arrays together with the data version they were read at
+(catalog max date and row count). A lookup with a different version
+drops the entry, so series updated in the DB are re-read.
+
+Date windows read from the DB are cached the same way under
+(Asset Code, Price Type, start, end), and `get_window` serves any
+window from a cached full series or a cached window covering it.
+
+Least recently used entries are evicted once the cached arrays exceed
+`CACHE_BUDGET_BYTES`. `extras` on each entry holds indexes derived from
+the series so they are built once per cached series.
+"""
+import threading
+
+import weakref
+
+from collections import OrderedDict, namedtuple
+
+from typing import Callable, Tuple, Union
+
+import numpy as np
+
+import pandas as pd
+
+# Default byte budget for cached Date and Price arrays
+CACHE_BUDGET_BYTES = 256 * 1024 ** 2
+
+CachedSeries = namedtuple('CachedSeries',
+                          ['dates', 'prices', 'version', 'nbytes',
+                           'extras'])
+
+_entries = OrderedDict()
+_budget = CACHE_BUDGET_BYTES
+_used = 0
+_stats = {'hits': 0, 'misses': 0, 'evictions': 0, 'invalidations': 0}
+_lock = threading.Lock()
+
+# Indexes built for frames which are not views of a cached series,
+# keyed by id(frame) and dropped with the frame
+_frame_extras = {}
+
+
+def _evict(key):
+    global _used
+    _used -= _entries.pop(key).nbytes
+
+
+def set_cache_budget(budget_bytes: int):
+    """
+    :param budget_bytes: maximum bytes held by cached arrays
+    """
+    global _budget
+
+    with _lock:
+        _budget = budget_bytes
+        while _used > _budget and _entries:
+            _evict(next(iter(_entries)))
+            _stats['evictions'] += 1
+
+
+def get_series(code: str, price_type: str,
+               version: tuple) -> Union[CachedSeries, None]:
+    """
+    :param code: Asset Code String
+    :param price_type: Price Type String
+    :param version: (max_date, row_count) the entry must match
+    :return: CachedSeries or None on a miss
+    """
+    key = (code, price_type)
+    with _lock:
+        cached = _entries.get(key)
+        if cached is not None and cached.version != version:
+            _evict(key)
+            _stats['invalidations'] += 1
+            cached = None
+
+        if cached is None:
+            _stats['misses'] += 1
+            return None
+
+        _entries.move_to_end(key)
+        _stats['hits'] += 1
+
+    return cached
+
+
+def peek_series(code: str, price_type: str, version: tuple) -> bool:
+    """
+    :param code: Asset Code String
+    :param price_type: Price Type String
+    :param version: (max_date, row_count) the entry must match
+    :return: True if a current entry is cached (stats untouched)
+    """
+    cached = _entries.get((code, price_type))
+    return cached is not None and cached.version == version
+
+
+def _covers(key: tuple, start: Union[pd.Timestamp, None],
+            end: Union[pd.Timestamp, None]) -> bool:
+    # Full series, or window from an earlier start to a later end (the
+    # as-of row of start is then in the window too)
+    if len(key) == 2:
+        return True
+
+    window_start, window_end = key[2:]
+    return (window_start is None or
+            (start is not None and window_start <= start)) and \
+        (window_end is None or (end is not None and end <= window_end))
+
+
+def get_window(code: str, price_type: str, version: tuple,
+               start: Union[pd.Timestamp, None],
+               end: Union[pd.Timestamp, None]) -> \
+        Union[CachedSeries, None]:
+    """
+    :param code: Asset Code String
+    :param price_type: Price Type String
+    :param version: (max_date, row_count) the entry must match
+    :param start: window start, the last row on or before it included
+    :param end: window end (inclusive)
+    :return: cached full series or window holding the rows from start
+             to end, None if none covers them
+    """
+    with _lock:
+        for key, cached in reversed(list(_entries.items())):
+            if key[:2] != (code, price_type):
+                continue
+            if cached.version != version:
+                _evict(key)
+                _stats['invalidations'] += 1
+            elif _covers(key, start, end):
+                _entries.move_to_end(key)
+                _stats['hits'] += 1
+                return cached
+
+    return None
+
+
+def put_window(code: str, price_type: str, version: tuple,
+               start: Union[pd.Timestamp, None],
+               end: Union[pd.Timestamp, None],
+               data_frame: pd.DataFrame) -> CachedSeries:
+    """
+    :param code: Asset Code String
+    :param price_type: Price Type String
+    :param version: (max_date, row_count) of the series read
+    :param start: window start the rows were read for
+    :param end: window end the rows were read for
+    :param data_frame: Pandas DataFrame with Date and Price columns
+    :return: CachedSeries of the window
+    """
+    return _put((code, price_type, start, end), version, data_frame)
+
+
+def put_series(code: str, price_type: str, version: tuple,
+               data_frame: pd.DataFrame) -> CachedSeries:
+    """
+    :param code: Asset Code String
+    :param price_type: Price Type String
+    :param version: (max_date, row_count) of the series read
+    :param data_frame: Pandas DataFrame with Date and Price columns
+    :return: CachedSeries
+    """
+    return _put((code, price_type), version, data_frame)
+
+
+def _put(key: tuple, version: tuple,
+         data_frame: pd.DataFrame) -> CachedSeries:
+    global _used
+
+    dates = data_frame['Date'].to_numpy(dtype='datetime64[ns]',
+                                        copy=True)
+    prices = data_frame['Price'].to_numpy(dtype=np.float64, copy=True)
+    dates.flags.writeable = False
+    prices.flags.writeable = False
+
+    cached = CachedSeries(dates, prices, version,
+                          dates.nbytes + prices.nbytes, {})
+
+    # Larger than the whole budget, serve without caching
+    if cached.nbytes > _budget:
+        return cached
+
+    with _lock:
+        # A full series covers every window cached for it
+        for other in [other for other in _entries
+                      if other[:2] == key[:2] and
+                      (other == key or len(key) == 2)]:
+            _evict(other)
+
+        _entries[key] = cached
+        _used += cached.nbytes
+
+        while _used > _budget:
+            _evict(next(iter(_entries)))
+            _stats['evictions'] += 1
+
+    return cached
+
+
+def _extra_nbytes(value) -> int:
+    # Arrays, or tuples of arrays, count against the cache budget
+    if isinstance(value, tuple):
+        return sum(_extra_nbytes(v) for v in value)
+
+    return getattr(value, 'nbytes', 0)
+
+
+def series_extra(code: str, price_type: str, version: tuple, name: str,
+                 build: Callable):
+    """
+    Index derived from a cached series, built on first use and kept
+    (and evicted) with the entry.
+
+    :param code: Asset Code String
+    :param price_type: Price Type String
+    :param version: (max_date, row_count) the entry must match
+    :param name: name of the index in the entry extras
+    :param build: function of the Price array building the index
+    :return: index, None if the series is not cached at version
+    """
+    global _used
+
+    key = (code, price_type)
+    with _lock:
+        cached = _entries.get(key)
+        if cached is None or cached.version != version:
+            return None
+        if name in cached.extras:
+            return cached.extras[name]
+
+    value = build(cached.prices)
+
+    with _lock:
+        if _entries.get(key) is cached and name not in cached.extras:
+            cached.extras[name] = value
+            nbytes = _extra_nbytes(value)
+            _entries[key] = cached._replace(nbytes=cached.nbytes + nbytes)
+            _used += nbytes
+
+            while _used > _budget:
+                _evict(next(iter(_entries)))
+                _stats['evictions'] += 1
+
+    return value
+
+
+def frame_extra(data_frame: pd.DataFrame, name: str,
+                build: Callable) -> Tuple[object, int]:
+    """
+    Index derived from the series a `read_data` frame views. Frames
+    served from the cache share the index of the cached series, other
+    frames get one built on their own Price column and kept while the
+    frame is alive.
+
+    :param data_frame: Pandas DataFrame with Date and Price columns
+    :param name: name of the index
+    :param build: function of the Price array building the index
+    :return: (index, row offset of the frame in the indexed series)
+    """
+    series = data_frame.attrs.get('series')
+    if series is not None and \
+            data_frame.attrs.get('rows') == data_frame.shape[0]:
+        code, price_type, version, offset = series
+        value = series_extra(code, price_type, version, name, build)
+        if value is not None:
+            return value, offset
+
+    key = id(data_frame)
+    ref, extras = _frame_extras.get(key, (None, None))
+    if ref is None or ref() is not data_frame or \
+            extras.get('rows') != data_frame.shape[0]:
+        ref = weakref.ref(data_frame,
+                          lambda _, key=key: _frame_extras.pop(key, None))
+        extras = {'rows': data_frame.shape[0]}
+        _frame_extras[key] = (ref, extras)
+
+    if name not in extras:
+        extras[name] = build(data_frame['Price'].to_numpy(
+            dtype=np.float64))
+
+    return extras[name], 0
+
+
+def to_frame(cached: CachedSeries, lo: int = 0,
+             hi: Union[int, None] = None) -> pd.DataFrame:
+    """
+    :param cached: CachedSeries
+    :param lo: first row position
+    :param hi: end row position (exclusive)
+    :return: Pandas DataFrame viewing the read-only cached arrays
+    """
+    return pd.DataFrame({'Date': cached.dates[lo:hi],
+                         'Price': cached.prices[lo:hi]}, copy=False)
+
+
+def cache_stats() -> dict:
+    """
+    :return: hit/miss/eviction/invalidation counters and bytes used
+    """
+    with _lock:
+        return dict(_stats, entries=len(_entries), used_bytes=_used,
+                    budget_bytes=_budget)
+
+
+def clear_cache():
+    global _used
+
+    with _lock:
+        _entries.clear()
+        _used = 0
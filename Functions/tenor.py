@@ -0,0 +1,77 @@
+"""
+
+Tenor grammar shared by the date and frequency parsers
+
+A tenor is a number followed by one of the units
+
+- D: Daily, W: Weekly, M: Monthly, Q: Quarterly, Y: Yearly
+
+e.g. '1Y', '95D', '3Q'. A spec counts as a tenor when it contains any
+of the unit letters, the value is its first run of digits and the unit
+is picked in the order D, W, M, Q, Y.
+
+Parsed tenors are immutable and memoized, so repeated specs cost a
+dict lookup.
+"""
+import re
+
+from collections import namedtuple
+
+from functools import lru_cache
+
+from typing import Tuple, Union
+
+from dateutil.relativedelta import relativedelta
+
+TENOR_UNITS = 'DWMQY'
+
+# Days per unit used for normalisation / compounding frequencies
+UNIT_DAYS = {'D': 1, 'W': 365.25 / 52, 'M': 365.25 / 12,
+             'Q': 365.25 / 4, 'Y': 365.25}
+
+# (months, days) per unit used for calendar offsets
+UNIT_SHIFT = {'D': (0, 1), 'W': (0, 7), 'M': (1, 0), 'Q': (3, 0),
+              'Y': (12, 0)}
+
+_value_re = re.compile(r'\d+')
+
+_unit_re = re.compile(f'[{TENOR_UNITS}]')
+
+Tenor = namedtuple('Tenor', ['value', 'unit', 'days'])
+
+
+@lru_cache(maxsize=1024)
+def parse_tenor(spec: str) -> Union[Tenor, None]:
+    """
+    :param spec: tenor string e.g. '1Y'
+    :return: Tenor, None if spec has no unit letter (not a tenor)
+    """
+    if _unit_re.search(spec) is None:
+        return None
+
+    value = _value_re.search(spec)
+    if value is None:
+        raise ValueError('ERROR: Tenor has no value ' + spec)
+    value = int(value.group())
+
+    unit = next(u for u in TENOR_UNITS if u in spec)
+
+    return Tenor(value, unit, value * UNIT_DAYS[unit])
+
+
+def tenor_shift(tenor: Tenor) -> Tuple[int, int]:
+    """
+    :param tenor: Tenor
+    :return: (months, days) the tenor spans on the calendar
+    """
+    months, days = UNIT_SHIFT[tenor.unit]
+    return months * tenor.value, days * tenor.value
+
+
+def tenor_delta(tenor: Tenor) -> relativedelta:
+    """
+    :param tenor: Tenor
+    :return: relativedelta spanning the tenor
+    """
+    months, days = tenor_shift(tenor)
+    return relativedelta(months=months, days=days)
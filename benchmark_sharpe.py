@@ -0,0 +1,389 @@
+"""
+
+Micro-benchmark of the Sharpe ratio paths on a synthetic series
+
+- baseline: frozen copy of `get_historical_sharpe_ratio` as it was
+    before the batch paths (and of the `parse_dates`,
+    `get_historical_returns` and `get_historical_volatility` it calls),
+    per period pair, each call parsing the dates and filtering the
+    frame for the Sharpe ratio, again for the return and again for the
+    volatility
+- fused: `get_historical_sharpe_ratio_many`, dates resolved once and
+    every window computed from the price array / prefix sums
+
+Usage: python benchmark_sharpe.py [number of period pairs]
+"""
+import re
+
+import sys
+
+import time
+
+import warnings
+
+from typing import Union
+
+import pandas as pd
+
+import numpy as np
+
+from dateutil.parser import parse
+
+from dateutil.relativedelta import relativedelta
+
+from Functions.mvn_historical_sharpe_ratio import \
+    get_historical_sharpe_ratio_many
+
+from Functions.normalization_parser import parse_frequency
+
+TENORS = ['2W', '1M', '3M', '6M', '3Q', '1Y', '3Y', '5Y', '10Y',
+          'Inception']
+
+
+# Frozen copies of the pre-batch single pair path, kept here so the
+# benchmark keeps measuring against it as the modules change
+
+
+def baseline_parse_dates(period_start: str,
+                         period_end: Union[str, None],
+                         data_frame: pd.DataFrame) -> Union[pd.Timestamp,
+                                                            str]:
+    # allowed offsets D: Daily, M: Monthly, W: Weekly, Y: Yearly
+    offset_chars = set('DWQMY')
+
+    # Parse and deal with Period End Date as Period Start
+    # depends on Period End
+    try:
+        if period_end == 'Latest':
+            end_date = data_frame.Date.max()
+        elif any((c in offset_chars) for c in period_end):
+            end_date = data_frame.Date.max()
+            value = int(re.findall(r'\d+', period_end)[0])
+            if 'D' in period_end:
+                end_date = end_date - relativedelta(days=value)
+            elif 'W' in period_end:
+                end_date = end_date - relativedelta(weeks=value)
+            elif 'M' in period_end:
+                end_date = end_date - relativedelta(months=value)
+            elif 'Q' in period_end:
+                end_date = end_date - relativedelta(months=3*value)
+            else:
+                end_date = end_date - relativedelta(years=value)
+        else:
+            end_date = pd.Timestamp(parse(period_end, fuzzy=False))
+
+    except (Exception,):
+        start_date = 'ERROR: Period End date is not correct'
+        end_date = 'ERROR: Period End date is not correct'
+        return start_date, end_date
+
+    # check if price on end date exists else use last available price
+    if end_date not in data_frame.Date.values:
+        if max(data_frame.Date.values) < end_date:
+            start_date = 'ERROR: No data found on or after end date'
+            end_date = 'ERROR: No data found on or after end date'
+            return start_date, end_date
+        else:
+            end_date = data_frame.loc[data_frame['Date'] <= end_date,
+                                      'Date'].max()
+
+    # Parse and deal with Period Start Date
+    try:
+        if period_start == 'Inception':
+            start_date = data_frame.Date.min()
+        elif any((c in offset_chars) for c in period_start):
+            start_date = end_date
+            value = int(re.findall(r'\d+', period_start)[0])
+            if 'D' in period_start:
+                start_date = start_date - relativedelta(days=value)
+            elif 'W' in period_start:
+                start_date = start_date - relativedelta(weeks=value)
+            elif 'M' in period_start:
+                start_date = start_date - relativedelta(months=value)
+            elif 'Q' in period_start:
+                start_date = start_date - relativedelta(months=3*value)
+            else:
+                start_date = start_date - relativedelta(years=value)
+        else:
+            start_date = pd.Timestamp(parse(period_start, fuzzy=False))
+
+    except (Exception,):
+        start_date = 'ERROR: Period Start date is not correct'
+        end_date = 'ERROR: Period Start date is not correct'
+        return start_date, end_date
+
+    # check if price on start date exists else use previous available
+    # price
+    if start_date not in data_frame.Date.values:
+        start_date = data_frame.loc[data_frame['Date']
+                                    <= start_date, 'Date'].max()
+
+    if start_date >= end_date:
+        start_date = 'ERROR: Period Start date is greater than End date'
+        end_date = 'ERROR: Period Start date is greater than End date'
+
+    return start_date, end_date
+
+
+def baseline_returns(main_df: pd.DataFrame, period_start: Union[str],
+                     period_end: Union[str, None],
+                     norm_freq: Union[str, None],
+                     comp_freq: Union[str, None]):
+    # Return error when start date is None
+    if period_start is None:
+        rate_of_return = "ERROR: Start Date is required"
+        return rate_of_return
+
+    # using defaults where passed value is none
+    period_end = 'Latest' if period_end is None else period_end
+
+    # Get parsed start and end dates
+    start_date, end_date = baseline_parse_dates(period_start, period_end,
+                                                main_df)
+
+    if isinstance(start_date, str):
+        rate_of_return = start_date
+        return rate_of_return
+
+    if pd.isnull(start_date):
+        rate_of_return = "ERROR: No data found prior to start date"
+        return rate_of_return
+
+    # Get parsed days for normalisation and compounding frequency
+    norm_days, comp_days = parse_frequency(norm_freq, comp_freq)
+
+    if isinstance(norm_days, str) and norm_days != 'NA':
+        rate_of_return = norm_days
+        return rate_of_return
+
+    # Filter data
+    main_df = main_df.set_index('Date')
+    main_df = main_df[(main_df.index >= start_date) &
+                      (main_df.index <= end_date)]
+
+    # days diff between start and end date
+    days_diff = (end_date - start_date).days
+
+    if norm_freq is None:
+        rate_of_return = (main_df.values[-1] / main_df.values[0]) - 1
+        rate_of_return = (np.round(rate_of_return, 6))[0]
+    else:
+        rate_of_return = (((main_df.values[-1] / main_df.values[0]) **
+                           (comp_days / days_diff) - 1) *
+                          (norm_days / comp_days))
+        rate_of_return = (np.round(rate_of_return, 6))[0]
+
+    return rate_of_return
+
+
+def baseline_volatility(main_df: pd.DataFrame, period_start: Union[str],
+                        period_end: Union[str, None],
+                        lambda_factor: Union[None, float]):
+    # Return error when start date is None
+    if period_start is None:
+        rate_of_return = "ERROR: Start Date is required"
+        return rate_of_return
+
+    # using defaults where passed value is none
+    period_end = 'Latest' if period_end is None else period_end
+
+    # Get parsed start and end dates
+    start_date, end_date = baseline_parse_dates(period_start, period_end,
+                                                main_df)
+
+    if isinstance(start_date, str):
+        volatility_val = start_date
+        return volatility_val
+
+    if pd.isnull(start_date):
+        volatility_val = "ERROR: No data found prior to start date"
+        return volatility_val
+
+    # Filter data
+    main_df = main_df.set_index('Date')
+    main_df = main_df[(main_df.index >= start_date) &
+                      (main_df.index <= end_date)]
+
+    # Order by date
+    main_df = main_df.sort_values(by='Date')
+
+    # Compute performance
+    main_df['Performance'] = np.log(main_df.Price / main_df.
+                                    Price.shift())
+    main_df = main_df[1:]
+
+    # Calculate volatility with Lambda
+    if lambda_factor is None:
+        main_df['Vol'] = (main_df['Performance'] -
+                          main_df['Performance'].mean()) ** 2
+
+        volatility_val = np.sqrt(((main_df['Vol'].sum() * 252)
+                                  / main_df.shape[0]))
+
+        volatility_val = np.round(volatility_val, 6)
+
+    # Calculate volatility without Lambda
+    else:
+        main_df = main_df.sort_values(by='Date', ascending=False)
+        main_df['Weight'] = (1 - lambda_factor) * lambda_factor \
+                            ** np.arange(len(main_df))
+        volatility_val = np.round(
+            np.sqrt(
+                ((main_df['Weight'] * main_df['Performance'] ** 2).sum()
+                 * 252) / (main_df['Weight'].sum())
+            ), 6
+        )
+
+    return volatility_val
+
+
+def baseline_sharpe_ratio(main_df: pd.DataFrame,
+                          period_start: Union[str],
+                          period_end: Union[str, None],
+                          norm_freq: Union[None, str],
+                          comp_freq: str,
+                          lambda_factor: Union[None, float],
+                          riskfree_rate: float):
+    # Return error when start date is None
+    if period_start is None:
+        sharpe_ratio, rate_of_return, volatility_val = \
+            "ERROR: Start Date is required"
+        return sharpe_ratio, rate_of_return, volatility_val
+
+    # using defaults where passed value is none
+    period_end = 'Latest' if period_end is None else period_end
+
+    # Get parsed start and end dates
+    start_date, end_date = baseline_parse_dates(period_start, period_end,
+                                                main_df)
+    if isinstance(start_date, str):
+        sharpe_ratio, rate_of_return, volatility_val = start_date
+        return sharpe_ratio, rate_of_return, volatility_val
+
+    if pd.isnull(start_date):
+        sharpe_ratio = rate_of_return = volatility_val = \
+            "ERROR: No data found prior to start date"
+        return sharpe_ratio, rate_of_return, volatility_val
+
+    try:
+        rate_of_return = baseline_returns(main_df, period_start,
+                                          period_end, norm_freq,
+                                          comp_freq)
+    except (Exception,):
+        rate_of_return = None
+
+    if isinstance(rate_of_return, str):
+        sharpe_ratio, volatility_val = rate_of_return
+        return sharpe_ratio, rate_of_return, volatility_val
+
+    if rate_of_return is None:
+        sharpe_ratio, volatility_val = None
+        return sharpe_ratio, rate_of_return, volatility_val
+
+    try:
+        volatility_val = baseline_volatility(
+            main_df, period_start, period_end, lambda_factor)
+
+    except (Exception,):
+        volatility_val = None
+
+    if isinstance(volatility_val, str):
+        sharpe_ratio, rate_of_return = volatility_val
+        return sharpe_ratio, rate_of_return, volatility_val
+
+    if volatility_val is None:
+        sharpe_ratio, rate_of_return = None
+        return sharpe_ratio, rate_of_return, volatility_val
+
+    sharpe_ratio = np.round((rate_of_return - riskfree_rate) /
+                            volatility_val, 6)
+
+    return sharpe_ratio, rate_of_return, volatility_val
+
+
+def synthetic_frame(start: str = '1927-12-30',
+                    end: str = '2022-12-30',
+                    seed: int = 0) -> pd.DataFrame:
+    """
+    :param start: first date
+    :param end: last date
+    :param seed: random seed
+    :return: Pandas DataFrame of business day Date and Price (random
+             walk of the log price)
+    """
+    dates = pd.bdate_range(start, end)
+    returns = np.random.RandomState(seed).normal(0.0003, 0.011,
+                                                 len(dates))
+    return pd.DataFrame({'Date': dates,
+                         'Price': 10 * np.exp(np.cumsum(returns))})
+
+
+def period_pairs(main_df: pd.DataFrame, count: int,
+                 seed: int = 1) -> tuple:
+    """
+    :param main_df: Pandas DataFrame with a Date column
+    :param count: number of period pairs
+    :param seed: random seed
+    :return: (period start list, period end list), tenors back from
+             random end dates
+    """
+    state = np.random.RandomState(seed)
+    ends = main_df['Date'].iloc[state.randint(len(main_df) // 2,
+                                              len(main_df), count)]
+    period_start = [TENORS[i] for i in state.randint(0, len(TENORS),
+                                                     count)]
+    period_end = [d.strftime('%Y-%m-%d') for d in ends]
+    return period_start, period_end
+
+
+def best_of(func, repeat: int = 3) -> float:
+    """
+    :param func: function without arguments
+    :param repeat: number of runs
+    :return: fastest run in seconds
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def _same(a, b) -> bool:
+    return a == b or (pd.isnull(a) and pd.isnull(b))
+
+
+if __name__ == '__main__':
+    warnings.simplefilter('ignore')
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    main_df = synthetic_frame()
+    period_start, period_end = period_pairs(main_df, count)
+
+    for lambda_factor in [None, 0.94]:
+        def baseline():
+            return [baseline_sharpe_ratio(main_df, start, end, '1Y',
+                                          '1Y', lambda_factor, 0.01)
+                    for start, end in zip(period_start, period_end)]
+
+        def fused():
+            return get_historical_sharpe_ratio_many(main_df,
+                                                    period_start,
+                                                    period_end, '1Y',
+                                                    '1Y', lambda_factor,
+                                                    0.01)
+
+        # Both paths must agree on every value
+        expected = list(zip(*baseline()))
+        mismatches = sum(not _same(a, b)
+                         for old, new in zip(expected, fused())
+                         for a, b in zip(old, new))
+
+        baseline_time = best_of(baseline, 1)
+        fused_time = best_of(fused)
+        print(f'Lambda {lambda_factor}: {count} pairs over '
+              f'{len(main_df)} rows, baseline {baseline_time:.3f}s, '
+              f'fused {fused_time:.4f}s '
+              f'({baseline_time / fused_time:.0f}x), '
+              f'{mismatches} mismatches')
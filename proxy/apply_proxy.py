@@ -4,18 +4,30 @@ import numpy as np
 
 from mvn_historical_drawdowns import read_data
 
-from db_connection import create_connection, odbc_engine
+from Functions.connection_pool import pooled_connection
 
-from dateutil.relativedelta import relativedelta
+from Functions.tenor import parse_tenor, tenor_delta
 
-import re
+from Functions.kernels import cumprod_kernel
 
 
 def write_data(df):
-    engine = create_connection()
     tsql_chunksize = 2097 // len(df.columns)
     tsql_chunksize = 1000 if tsql_chunksize > 1000 else tsql_chunksize
-    df.to_sql('time_series_proxy_220122', engine, if_exists='append', index=False, chunksize=tsql_chunksize)
+    with pooled_connection() as engine:
+        df.to_sql('time_series_proxy_220122', engine, if_exists='append', index=False, chunksize=tsql_chunksize)
+
+
+def extend_prices(ratios):
+    # Running product of the first price and the price ratios of the
+    # extension (NaN ratios skipped as by Series.cumprod)
+    return pd.Series(cumprod_kernel(ratios.to_numpy(dtype=np.float64)),
+                     index=ratios.index)
+
+
+def read_sql(sql_str):
+    with pooled_connection() as engine:
+        return pd.read_sql(sql_str, engine)
 
 
 def read_local_file(file_path):
@@ -50,33 +62,33 @@ def read_dependency(asset_type, price_type, proxy_level):
     source_type_list = []
     source_price_list = []
     proxy_level_list = [proxy_level]
-    cnxn = odbc_engine()
-    cursor = cnxn.cursor()
-
-    while proxy_level >= 1:
-        sql_str = '''
-        SELECT Source_Type, Source_Price from dependency_graph 
-        WHERE Proxy_Level = {} and Asset_Type = '{}' and Price_Type = '{}'
-        '''.format(proxy_level_list[-1], asset_type_list[-1], price_type_list[-1])
-
-        rows = cursor.execute(sql_str)
-        for row in rows.fetchall():
-            if row[0] is None and row[1] is None:
-                source_type_list.append(asset_type)
-                source_price_list.append(price_type)
-                if proxy_level >= 1:
-                    asset_type_list.append(asset_type)
-                    price_type_list.append(price_type)
-            else:
-                source_type_list.append(row[0])
-                source_price_list.append(row[1])
-                if proxy_level >= 1:
-                    asset_type_list.append(row[0])
-                    price_type_list.append(row[1])
-
-        proxy_level = proxy_level - 1
-        if proxy_level >= 1:
-            proxy_level_list.append(proxy_level)
+    with pooled_connection('odbc') as cnxn:
+        cursor = cnxn.cursor()
+
+        while proxy_level >= 1:
+            sql_str = '''
+            SELECT Source_Type, Source_Price from dependency_graph 
+            WHERE Proxy_Level = {} and Asset_Type = '{}' and Price_Type = '{}'
+            '''.format(proxy_level_list[-1], asset_type_list[-1], price_type_list[-1])
+
+            rows = cursor.execute(sql_str)
+            for row in rows.fetchall():
+                if row[0] is None and row[1] is None:
+                    source_type_list.append(asset_type)
+                    source_price_list.append(price_type)
+                    if proxy_level >= 1:
+                        asset_type_list.append(asset_type)
+                        price_type_list.append(price_type)
+                else:
+                    source_type_list.append(row[0])
+                    source_price_list.append(row[1])
+                    if proxy_level >= 1:
+                        asset_type_list.append(row[0])
+                        price_type_list.append(row[1])
+
+            proxy_level = proxy_level - 1
+            if proxy_level >= 1:
+                proxy_level_list.append(proxy_level)
 
     asset_type_list = asset_type_list[:-1]
     price_type_list = price_type_list[:-1]
@@ -111,22 +123,18 @@ def parse_check_overlap_period(min_date, max_date, min_period, max_period, div_m
     :return: Boolean
     '''
 
-    value_min = int(re.findall(r'\d+', min_period)[0])
-    value_max = int(re.findall(r'\d+', max_period)[0])
+    tenor_min = parse_tenor(min_period)
+    tenor_max = parse_tenor(max_period)
 
-    if 'M' in min_period:
-        overlap_min_end_date = min_date + relativedelta(months=value_min)
-    elif 'Y' in min_period:
-        overlap_min_end_date = min_date + relativedelta(years=value_min)
+    if tenor_min is not None:
+        overlap_min_end_date = min_date + tenor_delta(tenor_min)
     else:
         raise ValueError("Minimum overlap period is not correct")
 
-    if 'M' in max_period:
-        overlap_max_end_date = min_date + relativedelta(months=value_max)
-    elif 'Y' in max_period:
-        overlap_max_end_date = min_date + relativedelta(years=value_max)
+    if tenor_max is not None:
+        overlap_max_end_date = min_date + tenor_delta(tenor_max)
     else:
-        raise ValueError("Minimum overlap period is not correct")
+        raise ValueError("Maximum overlap period is not correct")
 
     # Check if min date is less than max date
     if overlap_min_end_date > overlap_max_end_date:
@@ -261,21 +269,21 @@ def proxy_two_extend_gtr(asset_code, price_type, min_period='1Y', max_period='3Y
                                 AND Price_Type IN ('GTR', 'PR') and Proxy_Level = {}''' \
         .format(l1_at, l1_pl)
 
-    df = pd.read_sql(level_one_sql, create_connection())
+    df = read_sql(level_one_sql)
 
     # Create level 1 GTR series if does not exists
     if df[(df['Asset_Code'] == l1_at) & (df['Price_Type'] == 'GTR')].shape[0] == 0:
         apply_proxy_level_1(asset_code=l1_at, price_type='GTR')
 
         # Update df with data
-        df = pd.read_sql(level_one_sql, create_connection())
+        df = read_sql(level_one_sql)
 
     # Create level 1 PR series if does not exists
     if df[(df['Asset_Code'] == l1_at) & (df['Price_Type'] == 'PR')].shape[0] == 0:
         apply_proxy_level_1(asset_code=l1_at, price_type='PR')
 
         # Update df with data
-        df = pd.read_sql(level_one_sql, create_connection())
+        df = read_sql(level_one_sql)
 
     if source_level == 2:
         # Use PR series level 2 data if available for passed asset and price type (TBC)
@@ -284,7 +292,7 @@ def proxy_two_extend_gtr(asset_code, price_type, min_period='1Y', max_period='3Y
             .format(asset_code)
 
         # Append level 2 PR data if exists
-        df = pd.concat([pd.read_sql(level_two_sql, create_connection()), df])
+        df = pd.concat([read_sql(level_two_sql), df])
 
     # Slice relevant columns for process
     df = df[['Date', 'Price', 'Asset_Code', 'Price_Type']]
@@ -384,10 +392,9 @@ def proxy_two_extend_gtr(asset_code, price_type, min_period='1Y', max_period='3Y
         extended_df['div_yield'] = extended_df['div_yield'].shift()
 
         # Apply price extension formula
-        extended_df['Price'] = (
+        extended_df['Price'] = extend_prices(
             extended_df['Price'].combine_first(1 / ((extended_df['PR'].shift() / extended_df['PR']) +
-                                                    (extended_df['div_yield'] * extended_df['Days'])))
-                .cumprod())
+                                                    (extended_df['div_yield'] * extended_df['Days']))))
 
         # restructure df to be passed on to DB
         extended_df['Asset_Code'] = asset_code
@@ -448,28 +455,28 @@ def proxy_two_extend_gtr_pr(asset_code, price_type, min_period='1Y', max_period=
                             AND Price_Type IN ('NTR', 'PR','GTR') and Proxy_Level = {}''' \
         .format(l1_at, l1_pl)
 
-    df = pd.read_sql(level_one_sql, create_connection())
+    df = read_sql(level_one_sql)
 
     # Create level 1 GTR series if does not exists
     if df[(df['Asset_Code'] == l1_at) & (df['Price_Type'] == 'GTR')].shape[0] == 0:
         apply_proxy_level_1(asset_code=l1_at, price_type='GTR')
 
         # Update df with data
-        df = pd.read_sql(level_one_sql, create_connection())
+        df = read_sql(level_one_sql)
 
     # Create level 1 PR series if does not exists
     if df[(df['Asset_Code'] == l1_at) & (df['Price_Type'] == 'PR')].shape[0] == 0:
         apply_proxy_level_1(asset_code=l1_at, price_type='PR')
 
         # Update df with data
-        df = pd.read_sql(level_one_sql, create_connection())
+        df = read_sql(level_one_sql)
 
     # Create level 1 NTR series if does not exists
     if df[(df['Asset_Code'] == l1_at) & (df['Price_Type'] == 'NTR')].shape[0] == 0:
         apply_proxy_level_1(asset_code=l1_at, price_type=l1_pt)
 
         # Update df with data
-        df = pd.read_sql(level_one_sql, create_connection())
+        df = read_sql(level_one_sql)
     if source_level == 2:
         # Check if for the asset type level 2 proxy data exist when price type is PR or GTR
         level_two_sql = ''' SELECT * FROM time_series_proxy_220122 WHERE Asset_Code = '{}'
@@ -477,7 +484,7 @@ def proxy_two_extend_gtr_pr(asset_code, price_type, min_period='1Y', max_period=
             .format(asset_code)
 
         # add level 2 data if available.
-        df = pd.concat([pd.read_sql(level_two_sql, create_connection()), df])
+        df = pd.concat([read_sql(level_two_sql), df])
 
     df = df[['Date', 'Price', 'Asset_Code', 'Price_Type']]
 
@@ -586,10 +593,10 @@ def proxy_two_extend_gtr_pr(asset_code, price_type, min_period='1Y', max_period=
         extended_df['tax_rate'] = extended_df['tax_rate'].shift()
 
         # apply price extension formula
-        extended_df['Price'] = (extended_df['Price'].combine_first(1 / (
+        extended_df['Price'] = extend_prices(extended_df['Price'].combine_first(1 / (
                 ((extended_df['GTR'].shift()) / (extended_df['GTR'])) -
                 (((extended_df['GTR'].shift()) / (extended_df['GTR'])) -
-                 ((extended_df['PR'].shift()) / (extended_df['PR']))) * extended_df['tax_rate'])).cumprod())
+                 ((extended_df['PR'].shift()) / (extended_df['PR']))) * extended_df['tax_rate'])))
 
         # restructure df to be passed on to DB
         extended_df['Asset_Code'] = asset_code
@@ -624,21 +631,21 @@ def proxy_two_extend_gtr_pr(asset_code, price_type, tax_rate, source_level = 2):
                                 AND Price_Type IN ('PR','GTR') and Proxy_Level = {}''' \
         .format('SPX', 1)
 
-    df = pd.read_sql(level_one_sql, create_connection())
+    df = read_sql(level_one_sql)
 
     # Create level 1 GTR series if does not exists
     if df[(df['Asset_Code'] == l1_at) & (df['Price_Type'] == 'GTR')].shape[0] == 0:
         apply_proxy_level_1(asset_code=l1_at, price_type='GTR')
 
         # Update df with data
-        df = pd.read_sql(level_one_sql, create_connection())
+        df = read_sql(level_one_sql)
 
     # Create level 1 PR series if does not exists
     if df[(df['Asset_Code'] == l1_at) & (df['Price_Type'] == 'PR')].shape[0] == 0:
         apply_proxy_level_1(asset_code=l1_at, price_type='PR')
 
         # Update df with data
-        df = pd.read_sql(level_one_sql, create_connection())
+        df = read_sql(level_one_sql)
 
     if source_level == 2:
         # Check if for the asset type level 2 proxy data exist when price type is PR or GTR
@@ -647,7 +654,7 @@ def proxy_two_extend_gtr_pr(asset_code, price_type, tax_rate, source_level = 2):
             .format('SPX')
 
         # add level 2 data if available.
-        df = pd.concat([pd.read_sql(level_two_sql, create_connection()), df])
+        df = pd.concat([read_sql(level_two_sql), df])
 
     df = df[['Date', 'Price', 'Asset_Code', 'Price_Type']]
 
@@ -679,10 +686,10 @@ def proxy_two_extend_gtr_pr(asset_code, price_type, tax_rate, source_level = 2):
     # add NTR first value as price
     extended_df = extended_df.join(gtr_series[gtr_series.index == gtr_series.index.min()]['Price'])
 
-    extended_df['Price'] = (extended_df['Price'].combine_first(
+    extended_df['Price'] = extend_prices(extended_df['Price'].combine_first(
             ((extended_df['GTR']) / (extended_df['GTR'].shift())) -
             (((extended_df['GTR']) / (extended_df['GTR'].shift())) -
-             ((extended_df['PR']) / (extended_df['PR'].shift()))) * tax_rate).cumprod())
+             ((extended_df['PR']) / (extended_df['PR'].shift()))) * tax_rate))
 
     # restructure df to be passed on to DB
     extended_df['Asset_Code'] = asset_code
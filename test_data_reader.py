@@ -0,0 +1,65 @@
+import os
+
+import pandas as pd
+
+import pytest
+
+from Functions import db_backend
+
+from Functions.data_reader import read_data, read_data_window
+
+from Functions.mvn_historical_returns import get_historical_returns
+
+from Functions.series_cache import clear_cache
+
+# Needs the SQLite database built with `python -m Functions.db_backend`
+pytestmark = pytest.mark.skipif(
+    not os.path.exists(db_backend.SQLITE_PATH),
+    reason='SQLite time series database not built')
+
+
+@pytest.fixture
+def fetched_rows(monkeypatch):
+    # Rows of every price query sent to the database
+    monkeypatch.setenv('TS_DB_BACKEND', 'sqlite')
+    clear_cache()
+
+    rows = []
+    read_sql = pd.read_sql
+
+    def counting_read_sql(sql, conn, *args, **kwargs):
+        data_frame = read_sql(sql, conn, *args, **kwargs)
+        if list(data_frame.columns) == ['Date', 'Price']:
+            rows.append(data_frame.shape[0])
+        return data_frame
+
+    monkeypatch.setattr(pd, 'read_sql', counting_read_sql)
+    yield rows
+    clear_cache()
+
+
+def test_two_weeks_of_spx2_reads_only_the_window(fetched_rows):
+    main_df = read_data_window('SPX2', 'PR', ['2W'], [None])
+
+    # Ten business days and the as-of row, not the 23k rows since 1927
+    assert 0 < sum(fetched_rows) <= 15
+    assert main_df.shape[0] == sum(fetched_rows)
+
+    # Same return as from the full history
+    fetched_rows.clear()
+    clear_cache()
+    expected = get_historical_returns(read_data('SPX2', 'PR'), '2W',
+                                      'Latest', '1Y', '1Y')
+    assert sum(fetched_rows) > 20000
+    assert get_historical_returns(main_df, '2W', 'Latest', '1Y',
+                                  '1Y') == expected
+
+
+def test_cached_history_is_not_read_again(fetched_rows):
+    read_data('SPX2', 'PR')
+    fetched_rows.clear()
+
+    main_df = read_data_window('SPX2', 'PR', ['2W'], [None])
+
+    assert fetched_rows == []
+    assert main_df.shape[0] > 20000